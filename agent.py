@@ -1,32 +1,5 @@
-import os
-from mistralai import Mistral
-import discord
+# The bot and the API share one agent implementation, so a process running both (run_all.py)
+# needs only one connection pool, response cache and rate limiter. Kept for existing imports.
+from backend.app.agent import MISTRAL_MODEL, SYSTEM_PROMPT, MistralAgent
 
-MISTRAL_MODEL = "mistral-large-latest"
-SYSTEM_PROMPT = "You are a helpful assistant."
-
-
-class MistralAgent:
-    def __init__(self):
-        MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
-
-        self.client = Mistral(api_key=MISTRAL_API_KEY)
-
-    # Handle discord and non-discord messages
-    async def run_command(self, message):
-        # The simplest form of an agent
-        # Send the message's content to Mistral's API and return Mistral's response
-        if isinstance(message, discord.Message):
-            content = message.content
-        else:
-            content = message
-
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": content},
-        ]
-        response = await self.client.chat.complete_async(
-            model=MISTRAL_MODEL,
-            messages=messages,
-        )
-        return response.choices[0].message.content
+__all__ = ["MISTRAL_MODEL", "SYSTEM_PROMPT", "MistralAgent"]
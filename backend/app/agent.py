@@ -1,26 +1,78 @@
 import os
+import time
 from mistralai import Mistral
+from .llm_cache import ResponseCache
+from .llm_scheduler import LLMScheduler, Priority, estimate_tokens
+from .hedging import Hedger, MISTRAL_HEDGE
+from .metrics import LLM_FIRST_TOKEN_SECONDS, LLM_REQUEST_SECONDS, record_usage
 
 MISTRAL_MODEL = "mistral-large-latest"
 SYSTEM_PROMPT = "You are a helpful assistant."
 
 
 class MistralAgent:
-    def __init__(self):
-        MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
-        print(f"MISTRAL_API_KEY loaded: {MISTRAL_API_KEY is not None}")
-        if MISTRAL_API_KEY:
-            print(f"MISTRAL_API_KEY starts with: {MISTRAL_API_KEY[:5]}...")
+    def __init__(self, cache: ResponseCache | None = None, scheduler: LLMScheduler | None = None,
+                 hedger: Hedger | None = None):
+        self._client = None
+        # Responses for repeated requests, see llm_cache.py for the key helpers
+        self.cache = cache if cache is not None else ResponseCache()
+        # Concurrency cap, rate limits, priorities and retries for every Mistral call
+        self.scheduler = scheduler if scheduler is not None else LLMScheduler()
+        # Opt-in (MISTRAL_HEDGE=1) hedged requests to cut tail latency
+        self.hedger = hedger if hedger is not None else (Hedger() if MISTRAL_HEDGE else None)
 
-        self.client = Mistral(api_key=MISTRAL_API_KEY)
+    @property
+    def client(self) -> Mistral:
+        # Created on first use, so importing (or building) the app reads no keys and opens no connections
+        if self._client is None:
+            MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+            print(f"MISTRAL_API_KEY loaded: {MISTRAL_API_KEY is not None}")
+            if MISTRAL_API_KEY:
+                print(f"MISTRAL_API_KEY starts with: {MISTRAL_API_KEY[:5]}...")
+            # MISTRAL_SERVER_URL points the client at another endpoint, e.g. the benchmarks' local stand-in
+            self._client = Mistral(api_key=MISTRAL_API_KEY, server_url=os.getenv("MISTRAL_SERVER_URL") or None)
+        return self._client
+
+    async def _complete(self, prompt_messages: list[dict], priority: Priority, validate=None, **kwargs) -> str:
+        async def call(model):
+            start = time.perf_counter()
+            response = await self.scheduler.submit(
+                lambda: self.client.chat.complete_async(model=model, messages=prompt_messages, **kwargs),
+                priority=priority,
+                tokens=estimate_tokens(prompt_messages),
+            )
+            # Completed calls only: a failed call or a cancelled hedge loser would skew the latencies
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, model, "complete")
+            record_usage(response)
+            return response.choices[0].message.content
+
+        if self.hedger is None:
+            return await call(MISTRAL_MODEL)
+        return await self.hedger.run(call, MISTRAL_MODEL, validate=validate)
+
+    async def run_command(self, message: str, cache_key: str | None = None, structured: bool = True,
+                          priority: Priority = Priority.INTERACTIVE, validate=None):
+        # Pass a cache_key to reuse the response for an identical (canonicalized) request
+        # structured=False returns plain text instead of the chat JSON object
+        # With hedging enabled, validate(text) decides which hedged response is usable
+        if cache_key is not None and not structured:
+            # Plain-text responses are cached separately from the JSON ones
+            cache_key = f"{cache_key}:text"
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
 
-    async def run_command(self, message: str):
         # Send the message content to Mistral's API and return Mistral's response
         prompt_messages = [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": message},
         ]
 
+        if not structured:
+            response = await self._complete(prompt_messages, priority, validate)
+            return self._store(cache_key, response)
+
         # Add instructions for JSON output with location and points of interest
         prompt_messages.append({
             "role": "user",
@@ -38,9 +90,67 @@ class MistralAgent:
             """
         })
 
-        response = await self.client.chat.complete_async(
-            model=MISTRAL_MODEL,
-            messages=prompt_messages,
+        response = await self._complete(
+            prompt_messages,
+            priority,
+            validate,
             response_format={"type": "json_object"} # Request JSON object output
         )
-        return response.choices[0].message.content
+        return self._store(cache_key, response)
+
+    def discard(self, cache_key: str, structured: bool = True):
+        # Drop a cached response, e.g. one the caller could not parse
+        self.cache.discard(cache_key if structured else f"{cache_key}:text")
+
+    def _store(self, cache_key: str | None, result: str):
+        if cache_key is not None and result:
+            self.cache.set(cache_key, result)
+        return result
+
+    async def stream_command(self, message: str, cache_key: str | None = None,
+                             priority: Priority = Priority.INTERACTIVE, validate=None):
+        # Stream a plain-text response (no JSON wrapper) as it is generated
+        # The scheduler admits (and retries) opening the stream and holds a slot until it ends
+        # With hedging enabled the whole response is needed to pick a winner, so it arrives in one piece
+        if self.hedger is not None:
+            yield await self.run_command(message, cache_key=cache_key, structured=False, priority=priority,
+                                         validate=validate)
+            return
+
+        if cache_key is not None:
+            # Plain-text responses are cached separately from the JSON ones run_command returns
+            cache_key = f"{cache_key}:text"
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        prompt_messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": message},
+        ]
+        start = time.perf_counter()
+        events = self.scheduler.stream(
+            lambda: self.client.chat.stream_async(model=MISTRAL_MODEL, messages=prompt_messages),
+            priority=priority,
+            tokens=estimate_tokens(prompt_messages),
+        )
+        parts = []
+        try:
+            async for event in events:
+                delta = event.data.choices[0].delta.content if event.data.choices else None
+                if isinstance(delta, str) and delta:
+                    if not parts:
+                        LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, MISTRAL_MODEL)
+                    parts.append(delta)
+                    yield delta
+                # The last chunk carries the token usage
+                record_usage(event.data)
+        finally:
+            # Frees the scheduler slot right away when the caller stops reading early
+            await events.aclose()
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, MISTRAL_MODEL, "stream")
+
+        result = "".join(parts)
+        if cache_key is not None and result:
+            self.cache.set(cache_key, result)
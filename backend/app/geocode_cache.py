@@ -0,0 +1,199 @@
+import asyncio
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+
+import httpx
+
+from .http_client import HTTPClient
+from .llm_scheduler import Priority
+from .rate_limit import TokenBucket
+from .tasks import Coalescer, shared
+
+GEOCODE_CACHE_PATH = os.getenv(
+    "GEOCODE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "geocode_cache.sqlite3"),
+)
+MEMORY_CACHE_SIZE = 10_000
+# Places don't move, but "not found" answers are retried after a day
+NOT_FOUND_TTL = 24 * 60 * 60
+# Nominatim usage policy: at most 1 request per second
+NOMINATIM_REQUESTS_PER_SECOND = 1.0
+# Seconds a batch waits for any one location (lookups queue behind the rate limit and behind
+# interactive lookups; one still queued when this passes is dropped without using a request)
+GEOCODE_ITEM_TIMEOUT = float(os.getenv("GEOCODE_ITEM_TIMEOUT", 10))
+
+
+def normalize_location(location: str) -> str:
+    # "  PARIS_france " and "paris, France" share one cache entry
+    text = unicodedata.normalize("NFKC", location).casefold().replace("_", " ")
+    text = re.sub(r"[^\w\s,]", " ", text)
+    text = re.sub(r"\s*,\s*", ", ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" ,")
+
+
+class GeocodeCache:
+    """Two-tier geocode cache: an in-memory LRU over an on-disk SQLite table.
+
+    Values are ``{"latitude": ..., "longitude": ...}`` dicts, or ``None`` for a
+    remembered "location not found".
+    """
+
+    def __init__(self, path: str | None = GEOCODE_CACHE_PATH, memory_size: int = MEMORY_CACHE_SIZE):
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                " key TEXT PRIMARY KEY, latitude REAL, longitude REAL, fetched_at REAL NOT NULL)"
+            )
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, value: dict | None, fetched_at: float):
+        self._memory[key] = (value, fetched_at)
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _expired(value: dict | None, fetched_at: float) -> bool:
+        return value is None and time.time() - fetched_at > NOT_FOUND_TTL
+
+    def get(self, key: str) -> tuple[bool, dict | None]:
+        """Return ``(found_in_cache, value)``."""
+        entry = self._memory.get(key)
+        if entry is not None and not self._expired(*entry):
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT latitude, longitude, fetched_at FROM geocode WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                latitude, longitude, fetched_at = row
+                value = None if latitude is None else {"latitude": latitude, "longitude": longitude}
+                if not self._expired(value, fetched_at):
+                    self._remember(key, value, fetched_at)
+                    self.disk_hits += 1
+                    return True, value
+
+        self.misses += 1
+        return False, None
+
+    def set(self, key: str, value: dict | None):
+        fetched_at = time.time()
+        self._remember(key, value, fetched_at)
+        if self._db is not None:
+            latitude = value["latitude"] if value else None
+            longitude = value["longitude"] if value else None
+            self._db.execute(
+                "INSERT OR REPLACE INTO geocode (key, latitude, longitude, fetched_at) VALUES (?, ?, ?, ?)",
+                (key, latitude, longitude, fetched_at),
+            )
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class Geocoder:
+    """Cached, rate-limited Nominatim lookups with coalescing of concurrent identical queries.
+
+    Interactive lookups (``geocode``) are sent before background and batch ones
+    (``geocode_many``) whenever both are waiting for the rate limit.
+    """
+
+    def __init__(self, http_client: HTTPClient, url: str, cache: GeocodeCache | None = None,
+                 rate_limiter: TokenBucket | None = None):
+        self.http_client = http_client
+        self.url = url
+        self.cache = cache if cache is not None else GeocodeCache()
+        self.rate_limiter = rate_limiter or TokenBucket(NOMINATIM_REQUESTS_PER_SECOND)
+        self.upstream_requests = 0
+        self.coalesced = 0
+        self.expired = 0
+        # One per priority; an interactive lookup doesn't wait on a queued background one
+        self._inflight = {Priority.INTERACTIVE: Coalescer(), Priority.BULK: Coalescer()}
+
+    async def geocode(self, location: str, priority: Priority = Priority.INTERACTIVE,
+                      queue_timeout: float | None = None) -> dict | None:
+        """Return ``{"latitude", "longitude"}`` or ``None`` if the location is unknown.
+
+        Raises ``httpx.HTTPError`` if the upstream request fails; failures are not cached.
+        A lookup still waiting for the rate limit after ``queue_timeout`` seconds is dropped
+        with ``asyncio.TimeoutError``.
+        """
+        key = normalize_location(location)
+        if not key:
+            return None
+
+        cached, value = self.cache.get(key)
+        if cached:
+            return value
+
+        task = self._inflight[Priority.INTERACTIVE].get(key)
+        if task is None and priority == Priority.BULK:
+            task = self._inflight[Priority.BULK].get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = self._inflight[priority].start(key, lambda: self._fetch(key, priority, queue_timeout))
+        return await shared(task)
+
+    async def geocode_many(self, locations: list[str], timeout: float = GEOCODE_ITEM_TIMEOUT) -> list[dict]:
+        """Geocode many locations concurrently, one result per location in order.
+
+        Each result has ``location`` and ``status`` ("ok", "not_found", "timeout" or "error"),
+        plus ``latitude``/``longitude`` when found. These are background lookups: they go after
+        interactive ones, and one still queued at ``timeout`` is dropped. Lookups that time out
+        after being sent keep running and are cached, so a retry usually finds them.
+        """
+        async def one(location):
+            try:
+                value = await asyncio.wait_for(self.geocode(location, Priority.BULK, queue_timeout=timeout), timeout)
+            except asyncio.TimeoutError:
+                return {"location": location, "status": "timeout"}
+            except httpx.HTTPError as e:
+                print(f"Error fetching geocode data for {location!r}: {e}")
+                return {"location": location, "status": "error"}
+            if value is None:
+                return {"location": location, "status": "not_found"}
+            return {"location": location, "status": "ok", **value}
+
+        return list(await asyncio.gather(*(one(location) for location in locations)))
+
+    async def _fetch(self, key: str, priority: Priority, queue_timeout: float | None) -> dict | None:
+        try:
+            await asyncio.wait_for(self.rate_limiter.acquire(priority=priority), queue_timeout)
+        except asyncio.TimeoutError:
+            self.expired += 1
+            raise
+        self.upstream_requests += 1
+        data = await self.http_client.get_json(self.url, params={"q": key, "format": "json", "limit": 1})
+        value = {"latitude": float(data[0]["lat"]), "longitude": float(data[0]["lon"])} if data else None
+        self.cache.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.cache.hits,
+            "disk_hits": self.cache.disk_hits,
+            "misses": self.cache.misses,
+            "coalesced": self.coalesced,
+            "upstream_requests": self.upstream_requests,
+            "expired": self.expired,
+            "queued": self.rate_limiter.queue_depth,
+        }
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+# Opt-in: MISTRAL_HEDGE=1 enables hedged requests, optionally to a cheaper/faster model
+MISTRAL_HEDGE = os.getenv("MISTRAL_HEDGE", "").lower() in ("1", "true", "yes")
+MISTRAL_FALLBACK_MODEL = os.getenv("MISTRAL_FALLBACK_MODEL") or None
+# Fire the hedge once the primary is slower than this percentile of recent latencies
+MISTRAL_HEDGE_PERCENTILE = float(os.getenv("MISTRAL_HEDGE_PERCENTILE", 95))
+# Seconds; when the primary model's typical latency exceeds it, use the fallback model outright
+MISTRAL_LATENCY_BUDGET = float(os.getenv("MISTRAL_LATENCY_BUDGET", 0)) or None
+
+LATENCY_WINDOW = 200
+# Samples older than this are dropped, so the histogram follows a model that slows down or recovers
+LATENCY_MAX_AGE = float(os.getenv("MISTRAL_LATENCY_MAX_AGE", 5 * 60))
+# While degraded, one call per this many seconds still goes to the primary model (hedged) as a probe
+MISTRAL_PROBE_INTERVAL = float(os.getenv("MISTRAL_PROBE_INTERVAL", 30))
+# Until enough samples exist, hedge after a fixed delay
+MIN_SAMPLES = 20
+DEFAULT_HEDGE_DELAY = 10.0
+
+
+def is_json_array(text: str) -> bool:
+    # Validator for list responses; tolerates Markdown fences around the array
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end <= start:
+        return False
+    try:
+        return isinstance(json.loads(text[start:end + 1]), list)
+    except json.JSONDecodeError:
+        return False
+
+
+class LatencyHistogram:
+    """Rolling window of recent call latencies (seconds), at most ``max_age`` seconds old."""
+
+    def __init__(self, window: int = LATENCY_WINDOW, max_age: float = LATENCY_MAX_AGE):
+        self.max_age = max_age
+        # (recorded at, seconds)
+        self.samples = deque(maxlen=window)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.max_age
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def record(self, seconds: float):
+        self.samples.append((time.monotonic(), seconds))
+
+    def __len__(self):
+        self._prune()
+        return len(self.samples)
+
+    def percentile(self, percentile: float) -> float | None:
+        self._prune()
+        if not self.samples:
+            return None
+        ordered = sorted(seconds for _, seconds in self.samples)
+        index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class Hedger:
+    """Races a primary LLM call against a delayed hedge request and keeps the first valid answer."""
+
+    def __init__(self, fallback_model: str | None = MISTRAL_FALLBACK_MODEL,
+                 percentile: float = MISTRAL_HEDGE_PERCENTILE, latency_budget: float | None = MISTRAL_LATENCY_BUDGET,
+                 probe_interval: float = MISTRAL_PROBE_INTERVAL):
+        self.fallback_model = fallback_model
+        self.percentile = percentile
+        self.latency_budget = latency_budget
+        self.probe_interval = probe_interval
+        self.histograms = {}
+        self._last_probe = 0.0
+
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.degraded = 0
+        self.probes = 0
+
+    def histogram(self, model: str) -> LatencyHistogram:
+        if model not in self.histograms:
+            self.histograms[model] = LatencyHistogram()
+        return self.histograms[model]
+
+    def hedge_delay(self, model: str) -> float:
+        histogram = self.histogram(model)
+        if len(histogram) < MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        return histogram.percentile(self.percentile)
+
+    async def _timed(self, call, model: str):
+        start = time.monotonic()
+        result = await call(model)
+        # Only completed calls: a cancelled loser or a fast failure says little about the model's latency
+        self.histogram(model).record(time.monotonic() - start)
+        return result
+
+    def _degrade(self, model: str, budget: float | None) -> bool:
+        # Degrade outright when the primary's typical latency already blows the budget...
+        histogram = self.histogram(model)
+        if budget is None or not self.fallback_model or len(histogram) < MIN_SAMPLES:
+            return False
+        if histogram.percentile(50) <= budget:
+            return False
+        # ...except for a periodic probe, so a recovered primary is noticed
+        now = time.monotonic()
+        if now - self._last_probe >= self.probe_interval:
+            self._last_probe = now
+            self.probes += 1
+            return False
+        return True
+
+    async def run(self, call, model: str, validate=None):
+        """Return ``await call(model)`` for the primary model, hedged.
+
+        ``call(model)`` starts one request for the given model. ``validate(result)`` decides
+        whether a response is usable (default: truthy).
+        """
+        validate = validate or bool
+        hedge_model = self.fallback_model or model
+        budget = self.latency_budget
+
+        if self._degrade(model, budget):
+            self.degraded += 1
+            return await self._timed(call, self.fallback_model)
+
+        delay = self.hedge_delay(model)
+        if budget is not None:
+            delay = min(delay, budget)
+
+        primary = asyncio.ensure_future(self._timed(call, model))
+        pending = {primary}
+        hedge = None
+        invalid = []
+        error = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            while True:
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if validate(task.result()):
+                        if task is hedge:
+                            self.hedges_won += 1
+                        return task.result()
+                    invalid.append(task.result())
+
+                # Primary is slow, failed or invalid: fire the hedge (once)
+                if hedge is None:
+                    self.hedges_fired += 1
+                    hedge = asyncio.ensure_future(self._timed(call, hedge_model))
+                    pending.add(hedge)
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # Cancel whichever request lost the race
+            for task in pending:
+                task.cancel()
+
+        # Nothing valid arrived: prefer an invalid answer (the caller reports it) over an error
+        if invalid:
+            return invalid[-1]
+        raise error
+
+    def stats(self) -> dict:
+        return {
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "degraded": self.degraded,
+            "probes": self.probes,
+            "latency_p50": {model: h.percentile(50) for model, h in self.histograms.items()},
+            "latency_p95": {model: h.percentile(95) for model, h in self.histograms.items()},
+            "latency_p99": {model: h.percentile(99) for model, h in self.histograms.items()},
+        }
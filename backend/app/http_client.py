@@ -0,0 +1,89 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from .metrics import UPSTREAM_IN_FLIGHT, UPSTREAM_REQUEST_SECONDS
+
+USER_AGENT = "TravelAIApp/1.0"
+
+# Connection pool shared by every upstream call (Nominatim, Overpass, OpenWeatherMap)
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 30.0
+
+# Default per-request timeouts in seconds
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 15.0
+
+# Maximum number of simultaneous requests to any single host
+PER_HOST_LIMIT = 10
+
+
+class HTTPClient:
+    """Shared async HTTP client with keep-alive pooling and per-host concurrency limits."""
+
+    def __init__(self, per_host_limit: int = PER_HOST_LIMIT, host_limits: dict | None = None,
+                 connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT):
+        self.per_host_limit = per_host_limit
+        # Optional overrides, e.g. {"nominatim.openstreetmap.org": 2}
+        self.host_limits = dict(host_limits or {})
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._client = None
+        self._semaphores = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool is bound to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": USER_AGENT},
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+            )
+        return self._client
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.host_limits.get(host, self.per_host_limit))
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    async def get(self, url: str, params: dict | None = None, headers: dict | None = None,
+                  timeout: float | None = None) -> httpx.Response:
+        client = self._get_client()
+        request_timeout = self.timeout if timeout is None else httpx.Timeout(timeout)
+        host = urlsplit(url).hostname or ""
+        outcome = "error"
+        UPSTREAM_IN_FLIGHT.inc(host)
+        start = time.perf_counter()
+        try:
+            async with self._host_semaphore(host):
+                response = await client.get(url, params=params, headers=headers, timeout=request_timeout)
+            response.raise_for_status() # Raise an exception for bad status codes
+            outcome = "ok"
+        except httpx.TimeoutException:
+            outcome = "timeout"
+            raise
+        except httpx.HTTPStatusError as e:
+            outcome = str(e.response.status_code)
+            raise
+        finally:
+            UPSTREAM_IN_FLIGHT.dec(host)
+            UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - start, host, outcome)
+        return response
+
+    async def get_json(self, url: str, params: dict | None = None, headers: dict | None = None,
+                       timeout: float | None = None):
+        response = await self.get(url, params=params, headers=headers, timeout=timeout)
+        return response.json()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
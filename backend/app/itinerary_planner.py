@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+import re
+from datetime import date
+
+from .llm_cache import ResponseCache, itinerary_cache_key
+
+# Maximum number of day-detail calls in flight per itinerary
+PLANNER_CONCURRENCY = int(os.getenv("ITINERARY_PLANNER_CONCURRENCY", 7))
+# Extra attempts per day (and for the skeleton) before giving up on it
+PLANNER_RETRIES = int(os.getenv("ITINERARY_PLANNER_RETRIES", 2))
+DEFAULT_TRIP_DAYS = 5
+MAX_TRIP_DAYS = 14
+
+_DATE_RANGE = re.compile(r"(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\s*(?:-|to)\s*(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?")
+_DURATION = re.compile(r"(\d+)\s*(day|night|week)", re.IGNORECASE)
+
+
+def estimate_trip_days(dates: str) -> int | None:
+    """Best-effort trip length from strings like "3/10-3/16", "3/10/2025 - 3/16/2025" or "5 days"."""
+    match = _DATE_RANGE.search(dates)
+    if match:
+        start_month, start_day, start_year, end_month, end_day, end_year = match.groups()
+        # A leap year keeps 2/29 valid when no year is given; "25" means 2025
+        start_year = int(start_year) if start_year else 2024
+        start_year = start_year + 2000 if start_year < 100 else start_year
+        end_year = int(end_year) if end_year else start_year
+        end_year = end_year + 2000 if end_year < 100 else end_year
+        try:
+            start = date(start_year, int(start_month), int(start_day))
+            end = date(end_year, int(end_month), int(end_day))
+        except ValueError:
+            return None
+        if end < start:
+            # e.g. 12/28-1/3 wraps into the next year
+            end = end.replace(year=end.year + 1)
+        return min((end - start).days + 1, MAX_TRIP_DAYS)
+
+    match = _DURATION.search(dates)
+    if match:
+        count, unit = int(match.group(1)), match.group(2).lower()
+        days = count * 7 if unit == "week" else count + (1 if unit == "night" else 0)
+        return max(1, min(days, MAX_TRIP_DAYS))
+    return None
+
+
+def _extract_json_array(text: str):
+    # Tolerate Markdown fences or prose around the array
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end <= start:
+        raise ValueError("No JSON array in skeleton response")
+    return json.loads(text[start:end + 1])
+
+
+class ItineraryPlanner:
+    """Builds an itinerary as a short day skeleton plus per-day details generated concurrently.
+
+    ``complete`` is an async callable ``complete(prompt, cache_key=...) -> str`` returning plain
+    text, e.g. ``MistralAgent.run_command``. Each day is cached separately, so retrying a
+    finalize after one day failed only regenerates that day. The validated skeleton is kept
+    in ``cache`` (the agent's ResponseCache) so a retry reuses the same day titles.
+    """
+
+    def __init__(self, complete, cache: ResponseCache | None = None, concurrency: int = PLANNER_CONCURRENCY,
+                 retries: int = PLANNER_RETRIES):
+        self.complete = complete
+        self.cache = cache
+        self.concurrency = concurrency
+        self.retries = retries
+
+    async def skeleton(self, trip: dict) -> list[dict]:
+        days = estimate_trip_days(str(trip.get("dates", ""))) or DEFAULT_TRIP_DAYS
+        prompt = (
+            f"Outline a day-by-day plan of exactly {days} days for the following trip. "
+            "Spread the listed activities sensibly across the days. "
+            "Return ONLY a raw JSON array, no Markdown or extra text, with this structure:\n"
+            '[{"day": 1, "title": "Short day title", "focus": "One sentence on what the day covers"}, ...]\n'
+            f"Trip Details:\n{json.dumps(trip, indent=2)}"
+        )
+        cache_key = f"{itinerary_cache_key(trip)}:skeleton"
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return json.loads(cached)
+
+        for attempt in range(self.retries + 1):
+            # Not cached by the agent: only a validated outline is worth keeping
+            response = await self.complete(prompt, cache_key=None)
+            try:
+                outline = _extract_json_array(response)
+                outline = [day for day in outline if isinstance(day, dict) and day.get("title")]
+                if outline:
+                    outline = outline[:MAX_TRIP_DAYS]
+                    if self.cache is not None:
+                        self.cache.set(cache_key, json.dumps(outline))
+                    return outline
+            except (ValueError, json.JSONDecodeError):
+                pass
+            print(f"Invalid itinerary skeleton (attempt {attempt + 1})")
+        raise ValueError("Could not generate an itinerary skeleton")
+
+    async def plan_day(self, trip: dict, outline: list[dict], index: int) -> str:
+        day = outline[index]
+        overview = "\n".join(f"Day {i + 1}: {d['title']} - {d.get('focus', '')}" for i, d in enumerate(outline))
+        prompt = (
+            f"You are writing one day of a {len(outline)}-day travel itinerary.\n"
+            f"Trip Details:\n{json.dumps(trip, indent=2)}\n"
+            f"Overall plan:\n{overview}\n\n"
+            f"Write a detailed and descriptive schedule for Day {index + 1} only ({day['title']}), "
+            "with morning, afternoon and evening activities, dining and transportation. "
+            f"Start with the heading \"Day {index + 1}: {day['title']}\"."
+        )
+        cache_key = f"{itinerary_cache_key(trip)}:day{index + 1}:{day['title']}"
+
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.complete(prompt, cache_key=cache_key)
+                if response and response.strip():
+                    return response.replace("\n\n\n", "\n").strip()
+            except Exception as e:
+                print(f"Error generating day {index + 1} (attempt {attempt + 1}): {e}")
+        return f"Day {index + 1}: {day['title']}\nDetails for this day could not be generated. {day.get('focus', '')}".strip()
+
+    async def stream(self, trip: dict):
+        """Yield each day's text in order as soon as it and every earlier day are ready."""
+        outline = await self.skeleton(trip)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(index):
+            async with semaphore:
+                return await self.plan_day(trip, outline, index)
+
+        tasks = [asyncio.ensure_future(bounded(index)) for index in range(len(outline))]
+        try:
+            for index, task in enumerate(tasks):
+                text = await task
+                yield text if index == 0 else f"\n\n{text}"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def plan(self, trip: dict) -> str:
+        return "".join([part async for part in self.stream(trip)])
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 60 * 60))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+
+def _normalize_text(value) -> str:
+    text = str(value).casefold().replace("_", " ")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+# "1,500", "1 500.00", "1500", "1.5k"; thousands separators only between groups of three digits
+_BUDGET_NUMBER = re.compile(r"(\d{1,3}(?:[, ]\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)(\s*k\b)?", re.IGNORECASE)
+_BUDGET_RANGE_SEPARATOR = re.compile(r"[\s$€£¥]*(?:-|–|—|to)[\s$€£¥]*", re.IGNORECASE)
+
+
+def budget_numbers(budget) -> tuple[Decimal, ...] | None:
+    """``(amount,)`` or ``(low, high)`` for a budget that is one number or a clear range
+    ("about 1500 EUR", "$1,000 - 2,000"); ``None`` for anything else ("1000 or 2000", "cheap")."""
+    text = str(budget)
+    matches = list(_BUDGET_NUMBER.finditer(text))
+    if len(matches) == 2 and not _BUDGET_RANGE_SEPARATOR.fullmatch(text[matches[0].end():matches[1].start()]):
+        return None
+    if not 1 <= len(matches) <= 2:
+        return None
+    numbers = []
+    for match in matches:
+        number = Decimal(re.sub(r"[, ]", "", match.group(1)))
+        numbers.append(number * 1000 if match.group(2) else number)
+    return tuple(sorted(numbers))
+
+
+def _normalize_budget(budget) -> str:
+    # "$1,500" / "1500" / "1 500.00" all become "1500", "1000-2000" stays "1000-2000"; exact, so
+    # budgets that differ in any digit never share a key
+    numbers = budget_numbers(budget)
+    if numbers is None:
+        return _normalize_text(budget)
+    return "-".join(f"{number.normalize():f}" for number in numbers)
+
+
+def _digest(kind: str, canonical) -> str:
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return f"{kind}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+def recommendation_cache_key(preferences) -> str:
+    # Who submitted a preference doesn't change the recommendations, only the set of preferences does
+    canonical = sorted(
+        (
+            _normalize_text(pref["location"]),
+            _normalize_budget(pref["budget"]),
+            _normalize_text(pref["dates"]),
+            _normalize_text(pref["mode"]),
+        )
+        for pref in preferences
+    )
+    return _digest("recommendations", canonical)
+
+
+def itinerary_cache_key(trip: dict) -> str:
+    return _digest("itinerary", trip)
+
+
+class ResponseCache:
+    """TTL + LRU cache for LLM responses with an approximate memory cap and hit/miss counters."""
+
+    def __init__(self, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at, _ = entry
+        if time.monotonic() > expires_at:
+            self.discard(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        self.discard(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
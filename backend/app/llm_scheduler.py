@@ -0,0 +1,206 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import os
+import random
+from enum import IntEnum
+
+import httpx
+
+from .rate_limit import TokenBucket
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 60))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", 500_000))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+# Backoff for 429/5xx: full jitter between 0 and min(MAX, BASE * 2**attempt) seconds
+LLM_BACKOFF_BASE = 0.5
+LLM_BACKOFF_MAX = 20.0
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0 # A user is waiting on this answer (/chat, itineraries)
+    BULK = 1 # Recommendation batches and background work
+
+
+# Seconds a request may take end to end (queueing, rate limiting, retries) by default
+DEFAULT_TIMEOUTS = {
+    Priority.INTERACTIVE: float(os.getenv("LLM_INTERACTIVE_TIMEOUT", 60)),
+    Priority.BULK: float(os.getenv("LLM_BULK_TIMEOUT", 180)),
+}
+
+
+def is_retryable(error: Exception) -> bool:
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def _retry_after(error: Exception) -> float | None:
+    # Honour Retry-After when the API sends one with a 429
+    response = getattr(error, "raw_response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LLMScheduler:
+    """Admission control in front of the LLM client.
+
+    Requests wait for one of ``max_concurrency`` slots in priority order (FIFO within a
+    priority), then for the requests-per-minute and tokens-per-minute buckets. 429/5xx
+    failures are retried with jittered exponential backoff, all within the request's deadline.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        # Buckets allow a burst of ten seconds' worth of traffic
+        self.request_bucket = TokenBucket(requests_per_minute / 60, capacity=max(1.0, requests_per_minute / 6))
+        self.token_bucket = TokenBucket(tokens_per_minute / 60, capacity=max(1.0, tokens_per_minute / 6))
+        self._active = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, waiter in self._waiters if not waiter.done())
+
+    async def _acquire_slot(self, priority: Priority, timeout: float):
+        if self._active < self.max_concurrency and not self.queue_depth:
+            self._active += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), waiter))
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            # The slot may have been handed over just as we gave up
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            else:
+                waiter.cancel()
+            raise
+
+    def _release_slot(self):
+        self._active -= 1
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self._active += 1
+                waiter.set_result(None)
+                break
+
+    def _record_wait(self, seconds: float):
+        self.wait_count += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def backoff_delay(self, attempt: int, error: Exception | None = None) -> float:
+        retry_after = _retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+    async def submit(self, call, priority: Priority = Priority.INTERACTIVE, timeout: float | None = None,
+                     tokens: int = 0, hold: bool = False):
+        """Run ``await call()`` under the scheduler and return its result.
+
+        ``tokens`` is the estimated prompt + completion size charged to the tokens-per-minute
+        bucket. Raises ``asyncio.TimeoutError`` once the deadline passes. With ``hold=True`` a
+        successful call keeps its concurrency slot; the caller gives it back with ``_release_slot``
+        (see ``stream``).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout if timeout is not None else DEFAULT_TIMEOUTS[priority])
+        self.submitted += 1
+
+        attempt = 0
+        while True:
+            queued_at = loop.time()
+            try:
+                await self._acquire_slot(priority, max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self.failed += 1
+                raise
+
+            held = False
+            try:
+                await asyncio.wait_for(self.request_bucket.acquire(), max(0.0, deadline - loop.time()))
+                await asyncio.wait_for(self.token_bucket.acquire(tokens or 1), max(0.0, deadline - loop.time()))
+                self._record_wait(loop.time() - queued_at)
+                result = await asyncio.wait_for(call(), max(0.0, deadline - loop.time()))
+                self.completed += 1
+                held = hold
+                return result
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self.failed += 1
+                raise
+            except Exception as e:
+                delay = self.backoff_delay(attempt, e)
+                if not is_retryable(e) or attempt >= self.max_retries or loop.time() + delay >= deadline:
+                    self.failed += 1
+                    raise
+                print(f"LLM request failed ({e}), retrying in {delay:.1f}s")
+            finally:
+                if not held:
+                    self._release_slot()
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def stream(self, open_stream, priority: Priority = Priority.INTERACTIVE, timeout: float | None = None,
+                     tokens: int = 0):
+        """Yield the items of the async iterator ``await open_stream()`` returns.
+
+        Opening is admitted (and retried) like ``submit``; the concurrency slot is then held
+        until the stream is exhausted or the generator is closed, so streamed generations
+        count against ``max_concurrency`` for as long as they run.
+        """
+        stream = await self.submit(open_stream, priority=priority, timeout=timeout, tokens=tokens, hold=True)
+        async with contextlib.AsyncExitStack() as stack:
+            stack.callback(self._release_slot)
+            if hasattr(stream, "__aexit__"):
+                # e.g. the SDK's event stream: closes the HTTP response when stopped early
+                await stack.enter_async_context(stream)
+            async for item in stream:
+                yield item
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self._active,
+            "max_concurrency": self.max_concurrency,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "wait_seconds_avg": self.wait_seconds_total / self.wait_count if self.wait_count else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+def estimate_tokens(messages: list[dict], completion_tokens: int = 1000) -> int:
+    # ~4 characters per token is close enough for rate limiting
+    return sum(len(str(message.get("content", ""))) for message in messages) // 4 + completion_tokens
@@ -6,18 +6,70 @@ load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..',
 
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, model_validator
 import socketio
 from .agent import MistralAgent # Import the MistralAgent
-import requests # Import requests
+from .http_client import HTTPClient
+from .geocode_cache import Geocoder
+from .places_index import PlacesIndex
+from .weather_cache import WeatherService
+from .poi_resolver import PoiResolver
+from .llm_cache import recommendation_cache_key, itinerary_cache_key
+from .itinerary_planner import ItineraryPlanner
+from .llm_scheduler import Priority
+from .hedging import is_json_array
+from .trip_stream import TripStreamParser, parse_trips
+from .session_store import SessionStore
+from .prompt_builder import recommendation_prompt, refinement_prompt
+from .similarity_cache import SimilarityCache
+from .speculation import SPECULATIVE_ITINERARIES, Speculator
+from .realtime import SessionBroadcaster, poi_job_room, session_room
+from .metrics import CONTENT_TYPE, JSON_PARSE_SECONDS, REGISTRY, RequestMetricsMiddleware, monitor_event_loop
+import asyncio
+import functools
+import httpx # Import httpx
 import json # Import json
 import re # Import re
-
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+import time
+
+# With several workers, SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0) relays emits between them
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+sio = socketio.AsyncServer(
+    async_mode='asgi',
+    cors_allowed_origins='*',
+    client_manager=socketio.AsyncRedisManager(SOCKETIO_MESSAGE_QUEUE) if SOCKETIO_MESSAGE_QUEUE else None,
+)
 app = FastAPI()
 
 # Instantiate the MistralAgent
 mistral_agent = MistralAgent()
+# Planner mode: day skeleton first, then every day generated concurrently
+itinerary_planner = ItineraryPlanner(functools.partial(mistral_agent.run_command, structured=False), cache=mistral_agent.cache)
+
+# Upstream API endpoints (overridable so they can point at local stand-ins)
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+OVERPASS_URL = os.getenv("OVERPASS_URL", "http://overpass-api.de/api/interpreter")
+OPENWEATHERMAP_URL = os.getenv("OPENWEATHERMAP_URL", "http://api.openweathermap.org/data/2.5/weather")
+
+# Shared non-blocking HTTP client for all upstream calls
+http_client = HTTPClient()
+
+# Cached, rate-limited (1 req/s) Nominatim lookups shared by /geocode and /chat
+geocoder = Geocoder(http_client, NOMINATIM_URL)
+
+# POIs fetched from Overpass once per area, saved to disk and queried locally
+places_index = PlacesIndex(http_client, OVERPASS_URL)
+MAX_PLACES_RADIUS_KM = 25.0
+
+# Verifies and geocodes the AI's points of interest in the background so /chat returns right away
+poi_resolver = PoiResolver(geocoder, places_index)
+MAX_GEOCODE_BATCH = 50
+
+# Current weather cached per ~2km grid cell for 10 minutes
+# You will need to add OPENWEATHERMAP_API_KEY to your .env file
+weather_service = WeatherService(http_client, OPENWEATHERMAP_URL, os.getenv("OPENWEATHERMAP_API_KEY"))
+MAX_WEATHER_BATCH = 200
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,20 +78,46 @@ app.add_middleware(
     allow_methods=["*"], # Allows all methods
     allow_headers=["*"], # Allows all headers
 )
+# Per-route latency histograms for /metrics
+app.add_middleware(RequestMetricsMiddleware)
 
 class Message(BaseModel):
     message: str
 
+@app.on_event("startup")
+async def startup_event():
+    # Keep a reference so the probe isn't garbage collected
+    app.state.loop_monitor = asyncio.ensure_future(monitor_event_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.loop_monitor.cancel()
+    await http_client.aclose()
+    geocoder.cache.close()
+    session_store.close()
+
 @app.get("/")
 def read_root():
     return {"message": "FastAPI backend is running!"}
 
+@app.get("/llm/stats")
+def llm_stats_endpoint():
+    # Scheduler queue depth, in-flight calls and wait times, response cache and hedging counters
+    return {
+        "scheduler": mistral_agent.scheduler.stats(),
+        "cache": mistral_agent.cache.stats(),
+        "hedging": mistral_agent.hedger.stats() if mistral_agent.hedger else None,
+        "speculation": speculator.stats() if speculator else None,
+        "similarity": similarity_cache.stats(),
+    }
+
 @app.post("/chat")
 async def chat_endpoint(message: Message):
     ai_response_json_str = await mistral_agent.run_command(message.message)
 
     try:
-        ai_response_data = json.loads(ai_response_json_str)
+        with JSON_PARSE_SECONDS.time("chat"):
+            ai_response_data = json.loads(ai_response_json_str)
         # Assuming the AI response is a JSON object with 'recommended_trip', 'location', and 'points_of_interest'
         recommended_trip = ai_response_data.get("recommended_trip", "No recommendation provided.")
         location_name = ai_response_data.get("location")
@@ -56,20 +134,26 @@ async def chat_endpoint(message: Message):
              except Exception as e:
                  print(f"Error getting geocode for AI location: {e}")
 
+        # Points already in the local places index get verified coordinates now; the rest are
+        # resolved in the background and collected from /geocode/jobs/{poi_job_id}
+        poi_job_id = None
+        if isinstance(points_of_interest, list) and points_of_interest:
+            points_of_interest, poi_job_id = poi_resolver.start(points_of_interest, location_name, location_coords)
 
         return {
             "response": recommended_trip,
             "location": location_name,
             "location_coords": location_coords,
-            "points_of_interest": points_of_interest
+            "points_of_interest": points_of_interest,
+            "poi_job_id": poi_job_id,
             }
 
     except json.JSONDecodeError:
         # If AI response is not valid JSON, return the raw text response
-        return {"response": ai_response_json_str, "location": None, "location_coords": None, "points_of_interest": []}
+        return {"response": ai_response_json_str, "location": None, "location_coords": None, "points_of_interest": [], "poi_job_id": None}
     except Exception as e:
         print(f"Error processing AI response: {e}")
-        return {"response": "Error processing AI response.", "location": None, "location_coords": None, "points_of_interest": []}
+        return {"response": "Error processing AI response.", "location": None, "location_coords": None, "points_of_interest": [], "poi_job_id": None}
 
 
 @sio.on('message')
@@ -77,67 +161,141 @@ async def handle_message(sid, message):
     print(f"Received message from {sid}: {message}")
     await sio.emit('message', f"Echo from backend: {message}", room=sid)
 
-# app.mount("/", app=socketio.ASGIApp(sio)) # Temporarily commented out to debug routing
+@sio.on('join_session')
+async def handle_join_session(sid, data):
+    # Planners of a session get its preference, recommendation, vote and finalize events
+    try:
+        session_id = int(data["session_id"])
+    except (KeyError, TypeError, ValueError):
+        return {"error": "session_id is required"}
+    await sio.enter_room(sid, session_room(session_id))
+    # Current tallies by trip index, so someone joining mid-vote starts in sync; deltas follow
+    return {"votes": dict(enumerate(session_store.tallies(SESSION_NAMESPACE, session_id)))}
+
+@sio.on('leave_session')
+async def handle_leave_session(sid, data):
+    try:
+        await sio.leave_room(sid, session_room(int(data["session_id"])))
+    except (KeyError, TypeError, ValueError):
+        pass
+
+@sio.on('watch_poi_job')
+async def handle_watch_poi_job(sid, data):
+    # Pushes the /chat POI job's result instead of the client polling /geocode/jobs/{id}
+    job_id = str(data.get("job_id")) if isinstance(data, dict) else None
+    job = poi_resolver.job(job_id) if job_id else None
+    if job is None:
+        return {"error": "Unknown or expired job"}
+    if job["status"] != "pending":
+        return {"job_id": job_id, **job}
+    await sio.enter_room(sid, poi_job_room(job_id))
+    return {"job_id": job_id, "status": "pending"}
+
+async def _push_poi_job(job_id: str, job: dict):
+    room = poi_job_room(job_id)
+    await sio.emit('poi_job', {"job_id": job_id, "status": job["status"],
+                               "points_of_interest": job["points_of_interest"]}, room=room)
+    await sio.close_room(room)
+
+poi_resolver.listeners.append(_push_poi_job)
+
+# Serve Socket.IO and the API on one port: run `uvicorn backend.app.main:socket_app`
+socket_app = socketio.ASGIApp(sio, other_asgi_app=app)
 
 @app.get("/geocode")
 async def geocode_endpoint(location: str):
-    nominatim_url = f"https://nominatim.openstreetmap.org/search?q={location}&format=json&limit=1"
-    headers = {'User-Agent': 'TravelAIApp/1.0'} # Add a User-Agent header
     try:
-        response = requests.get(nominatim_url, headers=headers)
-        response.raise_for_status() # Raise an exception for bad status codes
-        data = response.json()
-        if data:
-            return {"latitude": float(data[0]["lat"]), "longitude": float(data[0]["lon"])}
+        coords = await geocoder.geocode(location)
+        if coords:
+            return coords
         else:
             return {"error": "Location not found"}
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error fetching geocode data: {e}")
         return {"error": "Error fetching geocode data"}
 
+class GeocodeBatch(BaseModel):
+    locations: list[str]
+
+@app.post("/geocode/batch")
+async def geocode_batch_endpoint(batch: GeocodeBatch):
+    # Concurrent lookups under the Nominatim rate limit; each result carries its own status
+    if len(batch.locations) > MAX_GEOCODE_BATCH:
+        return {"error": f"At most {MAX_GEOCODE_BATCH} locations per request"}
+    return {"results": await geocoder.geocode_many(batch.locations)}
+
+@app.get("/geocode/jobs/{job_id}")
+async def geocode_job_endpoint(job_id: str):
+    # Status ("pending", "done" or "error") and points of interest of a /chat POI resolution job
+    job = poi_resolver.job(job_id)
+    if job is None:
+        return {"error": "Unknown or expired job"}
+    return job
+
 @app.get("/places")
-async def get_places_endpoint(location: str):
-    # This is a simplified example. A real implementation would need more sophisticated querying
-    # based on the location and potentially the type of places (e.g., restaurants, attractions)
-    overpass_url = "http://overpass-api.de/api/interpreter"
-    overpass_query = f"""
-    [out:json];
-    node["name"="{location}"]["tourism"](around:10000);
-    out;
-    """
-    headers = {'User-Agent': 'TravelAIApp/1.0'} # Add a User-Agent header
+async def get_places_endpoint(location: str | None = None, lat: float | None = None, lon: float | None = None,
+                              radius_km: float = 2.0, type: str | None = None, limit: int = 20):
+    # Nearest POIs around a location name or a lat/lon, optionally filtered by comma-separated types
+    # (e.g. "museum,restaurant" or "tourism"); served from the local index after the first request
     try:
-        response = requests.get(overpass_url, params={{'data': overpass_query}}, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        return data
-    except requests.exceptions.RequestException as e:
+        if lat is None or lon is None:
+            if not location:
+                return {"error": "Provide a location or lat and lon"}
+            coords = await geocoder.geocode(location)
+            if not coords:
+                return {"error": "Location not found"}
+            lat, lon = coords["latitude"], coords["longitude"]
+        radius_km = min(max(radius_km, 0.0), MAX_PLACES_RADIUS_KM)
+        await places_index.ensure_area(lat, lon, radius_km)
+    except httpx.HTTPError as e:
         print(f"Error fetching places data: {e}")
         return {"error": "Error fetching places data"}
 
+    types = [t.strip() for t in type.split(",") if t.strip()] if type else None
+    places = places_index.nearby(lat, lon, radius_km, types=types, limit=min(limit, 100))
+    return {"latitude": lat, "longitude": lon, "places": places}
+
 @app.get("/weather")
 async def get_weather_endpoint(lat: float, lon: float):
-    # You will need to add OPENWEATHERMAP_API_KEY to your .env file
-    openweathermap_api_key = os.getenv("OPENWEATHERMAP_API_KEY")
-    if not openweathermap_api_key:
+    if not weather_service.api_key:
         return {"error": "OpenWeatherMap API key not configured"}
 
-    openweathermap_url = f"http://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={openweathermap_api_key}&units=metric"
-    headers = {'User-Agent': 'TravelAIApp/1.0'} # Add a User-Agent header
-    print(f"OpenWeatherMap URL: {openweathermap_url}") # Debug print
     try:
-        response = requests.get(openweathermap_url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        return data
-    except requests.exceptions.RequestException as e:
+        return await weather_service.current(lat, lon)
+    except httpx.HTTPError as e:
         print(f"Error fetching weather data from OpenWeatherMap: {e}") # More specific error
         return {"error": "Error fetching weather data"}
 
-# In-memory storage for preferences and votes (replace with database later)
-# Keyed by a simple session identifier (e.g., a counter or user ID)
-sessions_data = {}
-session_counter = 0
+class WeatherPoint(BaseModel):
+    lat: float
+    lon: float
+
+class WeatherBatch(BaseModel):
+    points: list[WeatherPoint]
+
+@app.post("/weather/batch")
+async def get_weather_batch_endpoint(batch: WeatherBatch):
+    # Weather for many points (e.g. every stop of an itinerary) in one round-trip, in request order
+    if not weather_service.api_key:
+        return {"error": "OpenWeatherMap API key not configured"}
+    if len(batch.points) > MAX_WEATHER_BATCH:
+        return {"error": f"At most {MAX_WEATHER_BATCH} points per request"}
+
+    results = await weather_service.current_many([(point.lat, point.lon) for point in batch.points])
+    return {"results": results}
+
+# Preferences, recommended trips and votes, cached in memory and persisted to SQLite
+# With SESSION_STORE=shared every worker reads and writes the same database directly,
+# so the app can run as `uvicorn backend.app.main:socket_app --workers N`
+session_store = SessionStore()
+SESSION_NAMESPACE = "web"
+
+# Compact per-session Socket.IO events; bursts of votes are coalesced into one emit per room
+broadcaster = SessionBroadcaster(sio)
+
+# Past recommendations by preference vector: near-identical sessions are served from it,
+# similar ones get a short prompt refining the stored trips
+similarity_cache = SimilarityCache()
 
 class Preference(BaseModel):
     session_id: int # Use a session ID to link preferences
@@ -149,106 +307,303 @@ class Preference(BaseModel):
 
 class Vote(BaseModel):
     session_id: int
-    user: str
-    trip_name: str
+    user: str # One ballot per user; voting again moves it
+    trip_index: int | None = None # Position in the recommendations; preferred, since trip names can repeat
+    trip_name: str | None = None
+
+    @model_validator(mode="after")
+    def _names_a_trip(self):
+        if self.trip_index is None and self.trip_name is None:
+            raise ValueError("A vote needs a trip_index or a trip_name")
+        return self
+
+class VoteBatch(BaseModel):
+    votes: list[Vote]
+
+MAX_VOTE_BATCH = 1000
+
+@app.get("/sessions/stats")
+def session_stats_endpoint():
+    # Live (cached) sessions, approximate bytes held, evictions and reloads for this worker
+    return {**session_store.stats(), "broadcast": broadcaster.stats()}
+
+@app.post("/sessions")
+async def create_session_endpoint():
+    # Session IDs come from the store, so they are unique across workers
+    return {"session_id": session_store.create_session(SESSION_NAMESPACE)}
 
 @app.post("/submit_preference")
 async def submit_preference_endpoint(preference: Preference):
-    global sessions_data
-    session_id = preference.session_id
+    # Only ids from POST /sessions; writing to any other id would create a session the counter
+    # could later hand out again
+    if not session_store.exists(SESSION_NAMESPACE, preference.session_id):
+        return {"error": f"Unknown session {preference.session_id}; create one with POST /sessions"}
+    session_store.add_preference(SESSION_NAMESPACE, preference.session_id, preference.dict())
+    await broadcaster.emit('preference', preference.session_id, preference.dict(exclude={"session_id"}))
+    return {"message": "Preference submitted successfully"}
 
-    if session_id not in sessions_data:
-        sessions_data[session_id] = {"preferences": [], "recommended_trips": None, "votes": {}}
+def _store_recommendations(session_id: int, trips: list[dict]):
+    # Store recommended trips and initialize votes for the session
+    session_store.set_trips(SESSION_NAMESPACE, session_id, trips)
+    if speculator:
+        speculator.reset((SESSION_NAMESPACE, session_id))
 
-    sessions_data[session_id]["preferences"].append(preference.dict())
-    return {"message": "Preference submitted successfully"}
+def _remember_recommendations(preferences: list[dict], trips: list[dict], similar, elapsed: float):
+    # A refined answer is stored at the cost of the full one it stands in for
+    if similar:
+        similarity_cache.record_refinement(similar, elapsed)
+        elapsed = max(elapsed, similar.latency)
+    similarity_cache.add(preferences, trips, elapsed)
 
 @app.get("/get_recommendations/{session_id}")
 async def get_recommendations_endpoint(session_id: int):
-    global sessions_data
-    if session_id not in sessions_data or not sessions_data[session_id]["preferences"]:
+    preferences = session_store.preferences(SESSION_NAMESPACE, session_id)
+    if not preferences:
         return {"error": "No preferences submitted for this session"}
 
-    preferences = sessions_data[session_id]["preferences"]
-    prompt = "Based on the following travel preferences, suggest a few trip options that balances everyone's inputs. Make sure the activity list is descriptive."
-
-    for pref in preferences:
-        prompt += f"- {pref['user']} wants to travel to {pref['location']} on a {pref['mode']} trip with a budget of {pref['budget']} during {pref['dates']}.\n"
-
-    # Request JSON output for recommendations as well
-    prompt += """
-    Please format the response in JSON format with a list of trip options:
-    [
-      {
-          "name": "Trip Name",
-          "dates": "Trip Dates",
-          "trip_style": "Trip Style",
-          "budget": "Budget",
-          "activities": ["Activity 1", "Activity 2", "Activity 3"]
-      },
-      ...
-    ]
-    """
+    similar = similarity_cache.lookup(preferences)
+    if similar and similar.serve:
+        _store_recommendations(session_id, similar.trips)
+        await broadcaster.emit('recommendations', session_id, {"trips": similar.trips})
+        return {"recommendations": similar.trips}
+    prompt = refinement_prompt(preferences, similar.trips) if similar else recommendation_prompt(preferences)
 
+    cache_key = recommendation_cache_key(preferences)
     try:
-        ai_response_json_str = await mistral_agent.run_command(prompt)
-        trips = json.loads(ai_response_json_str)
-
-        # Store recommended trips and initialize votes for the session
-        sessions_data[session_id]["recommended_trips"] = trips
-        sessions_data[session_id]["votes"] = {trip["name"]: 0 for trip in trips}
-
+        start = time.perf_counter()
+        ai_response = await mistral_agent.run_command(prompt, cache_key=cache_key, structured=False,
+                                                      priority=Priority.BULK, validate=is_json_array)
+        elapsed = time.perf_counter() - start
+        # Tolerates Markdown fences and text around the array
+        with JSON_PARSE_SECONDS.time("recommendations"):
+            trips, rejected = parse_trips(ai_response)
+        if rejected or not trips:
+            # Don't serve the same broken response on retry
+            mistral_agent.discard(cache_key, structured=False)
+        if not trips:
+            return {"error": "AI response is not valid JSON for recommendations."}
+
+        _remember_recommendations(preferences, trips, similar, elapsed)
+        _store_recommendations(session_id, trips)
+        await broadcaster.emit('recommendations', session_id, {"trips": trips})
         return {"recommendations": trips}
 
-    except json.JSONDecodeError:
-        return {"error": "AI response is not valid JSON for recommendations."}
     except Exception as e:
         print(f"Error getting recommendations: {e}")
         return {"error": "Error getting recommendations from AI."}
 
+@app.get("/get_recommendations/{session_id}/stream")
+async def get_recommendations_stream_endpoint(session_id: int):
+    # Server-Sent Events: a "trip" event per recommendation as soon as it is complete, then "done" (or "error")
+    preferences = session_store.preferences(SESSION_NAMESPACE, session_id)
+
+    async def event_stream():
+        if not preferences:
+            yield _sse_event({"error": "No preferences submitted for this session"}, event="error")
+            return
+
+        similar = similarity_cache.lookup(preferences)
+        if similar and similar.serve:
+            for trip in similar.trips:
+                yield _sse_event(trip, event="trip")
+            _store_recommendations(session_id, similar.trips)
+            await broadcaster.emit('recommendations', session_id, {"trips": similar.trips})
+            yield _sse_event({"count": len(similar.trips), "rejected": 0}, event="done")
+            return
+        prompt = refinement_prompt(preferences, similar.trips) if similar else recommendation_prompt(preferences)
+
+        cache_key = recommendation_cache_key(preferences)
+        parser = TripStreamParser()
+        try:
+            start = time.perf_counter()
+            chunks = mistral_agent.stream_command(prompt, cache_key=cache_key,
+                                                  priority=Priority.BULK, validate=is_json_array)
+            async for chunk in chunks:
+                with JSON_PARSE_SECONDS.time("recommendations_stream"):
+                    trips = parser.feed(chunk)
+                for trip in trips:
+                    yield _sse_event(trip, event="trip")
+        except Exception as e:
+            print(f"Error streaming recommendations: {e}")
+            yield _sse_event({"error": "Error getting recommendations from AI."}, event="error")
+            return
+
+        if parser.rejected or not parser.trips:
+            mistral_agent.discard(cache_key, structured=False)
+        if not parser.trips:
+            yield _sse_event({"error": "AI response is not valid JSON for recommendations."}, event="error")
+            return
+
+        _remember_recommendations(preferences, parser.trips, similar, time.perf_counter() - start)
+        _store_recommendations(session_id, parser.trips)
+        await broadcaster.emit('recommendations', session_id, {"trips": parser.trips})
+        yield _sse_event({"count": len(parser.trips), "rejected": parser.rejected}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _trip_index(vote: Vote, trips: list[dict]) -> int | None:
+    # The vote's trip index, or the first trip with its name
+    if vote.trip_index is not None:
+        return vote.trip_index if 0 <= vote.trip_index < len(trips) else None
+    return next((index for index, trip in enumerate(trips) if trip["name"] == vote.trip_name), None)
+
+def _votes_cast(session_id: int, changed: dict[int, int]):
+    for index, count in changed.items():
+        broadcaster.vote(session_id, index, count)
+    if speculator and changed:
+        speculator.observe((SESSION_NAMESPACE, session_id), session_store.leaderboard(SESSION_NAMESPACE, session_id),
+                           session_store.trips(SESSION_NAMESPACE, session_id))
+
 @app.post("/vote_trip")
 async def vote_trip_endpoint(vote: Vote):
-    global sessions_data
     session_id = vote.session_id
-    trip_name = vote.trip_name
 
-    if session_id not in sessions_data or not sessions_data[session_id]["recommended_trips"]:
+    trips = session_store.trips(SESSION_NAMESPACE, session_id)
+    if not trips:
         return {"error": "No recommended trips available to vote on for this session."}
 
-    if trip_name not in sessions_data[session_id]["votes"]:
-        return {"error": f"Trip '{trip_name}' not found in recommendations for this session."}
-
-    sessions_data[session_id]["votes"][trip_name] += 1
-    return {"message": f"Vote for '{trip_name}' recorded successfully."}
+    index = _trip_index(vote, trips)
+    if index is None:
+        trip = vote.trip_name if vote.trip_index is None else vote.trip_index
+        return {"error": f"Trip '{trip}' not found in recommendations for this session."}
+    # One ballot per user: a repeat vote for the same trip changes nothing, a different trip moves it
+    _votes_cast(session_id, session_store.cast_vote(SESSION_NAMESPACE, session_id, vote.user, index))
+    return {"message": f"Vote for '{trips[index]['name']}' recorded successfully.", "trip_index": index}
+
+@app.post("/vote_trip/batch")
+async def vote_trip_batch_endpoint(batch: VoteBatch):
+    # Many ballots (e.g. relayed from a chat platform) applied per session in one transaction
+    if len(batch.votes) > MAX_VOTE_BATCH:
+        return {"error": f"At most {MAX_VOTE_BATCH} votes per request"}
+
+    results = []
+    ballots = {}
+    for vote in batch.votes:
+        trips = session_store.trips(SESSION_NAMESPACE, vote.session_id)
+        index = _trip_index(vote, trips) if trips else None
+        if index is None:
+            results.append({"status": "rejected"})
+            continue
+        ballots.setdefault(vote.session_id, []).append((vote.user, index))
+        results.append({"status": "ok", "trip_index": index})
+    for session_id, session_ballots in ballots.items():
+        _votes_cast(session_id, session_store.cast_votes(SESSION_NAMESPACE, session_id, session_ballots))
+    return {"results": results}
+
+def _select_winning_trip(session_id: int):
+    # Returns (trip index, trip, error) for the trip with the most votes in the session
+    board = session_store.leaderboard(SESSION_NAMESPACE, session_id)
+    leader, _ = board.leader() if board else (None, 0)
+    if leader is None:
+        return None, None, "No votes have been cast for this session."
+    return leader, session_store.trips(SESSION_NAMESPACE, session_id)[leader], None
+
+def _itinerary_prompt(trip: dict) -> str:
+    trip_json = json.dumps(trip, indent=2)
+    return f"Generate a detailed and descriptive travel itinerary for the following trip. Ensure a daily schedule based on the details provided.\nTrip Details:\n{trip_json}"
+
+async def _speculate_itinerary(trip: dict) -> str:
+    # Plain text under the streamed endpoint's cache key, so finalizing finds it in the cache
+    return await mistral_agent.run_command(_itinerary_prompt(trip), cache_key=itinerary_cache_key(trip),
+                                           structured=False, priority=Priority.BULK)
+
+# Opt-in (SPECULATIVE_ITINERARIES=1): generate the leading trip's itinerary while votes come in
+speculator = Speculator(_speculate_itinerary) if SPECULATIVE_ITINERARIES else None
+if speculator:
+    # An evicted (idle) session won't be finalized from memory; its speculation goes with it
+    session_store.eviction_listeners.append(speculator.reset)
 
 @app.get("/finalize_trip/{session_id}")
-async def finalize_trip_endpoint(session_id: int):
-    global sessions_data
-    if session_id not in sessions_data or not sessions_data[session_id]["votes"]:
-        return {"error": "No votes have been cast for this session."}
-
-    votes = sessions_data[session_id]["votes"]
-    if not any(votes.values()):
-         return {"error": "No votes have been cast for this session."}
-
-    best_trip_name = max(votes, key=votes.get)
-    recommended_trips = sessions_data[session_id]["recommended_trips"]
-    selected_trip_data = next((trip for trip in recommended_trips if trip["name"] == best_trip_name), None)
-
-    if not selected_trip_data:
-        return {"error": "Selected trip details not found."}
+async def finalize_trip_endpoint(session_id: int, planner: bool = False):
+    selected_index, selected_trip_data, error = _select_winning_trip(session_id)
+    if error:
+        return {"error": error}
 
     # Generate detailed itinerary using the AI agent
-    trip_json = json.dumps(selected_trip_data, indent=2)
-    prompt = f"Generate a detailed and descriptive travel itinerary for the following trip. Ensure a daily schedule based on the details provided.\nTrip Details:\n{trip_json}"
+    prompt = _itinerary_prompt(selected_trip_data)
 
     try:
-        itinerary_response = await mistral_agent.run_command(prompt)
+        speculated = None
+        if speculator and not planner:
+            speculated = await speculator.claim((SESSION_NAMESPACE, session_id), selected_index)
+        if speculated:
+            itinerary_response = speculated
+        elif planner:
+            itinerary_response = await itinerary_planner.plan(selected_trip_data)
+        else:
+            # Plain text, like the streamed endpoint and the speculation, so all three share one cache entry
+            itinerary_response = await mistral_agent.run_command(prompt, cache_key=itinerary_cache_key(selected_trip_data),
+                                                                 structured=False)
         # Clean up response if needed (similar to bot.py)
         itinerary_text = itinerary_response.replace("\n\n\n", "\n").strip()
 
+        await broadcaster.emit('finalized', session_id, {"trip_name": selected_trip_data["name"]})
         return {"finalized_trip": selected_trip_data, "itinerary": itinerary_text}
 
     except Exception as e:
         print(f"Error generating itinerary: {e}")
         return {"error": "Error generating itinerary."}
+
+def _sse_event(data, event: str | None = None) -> str:
+    # Format one Server-Sent Event; data is JSON encoded so newlines survive
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.get("/finalize_trip/{session_id}/stream")
+async def finalize_trip_stream_endpoint(session_id: int, planner: bool = False):
+    # Server-Sent Events: one "trip" event, a default event per text delta, then "done" (or "error")
+    selected_index, selected_trip_data, error = _select_winning_trip(session_id)
+
+    async def event_stream():
+        if error:
+            yield _sse_event({"error": error}, event="error")
+            return
+
+        yield _sse_event(selected_trip_data, event="trip")
+        try:
+            if planner:
+                # Days arrive whole, in order, as soon as each one is ready
+                chunks = itinerary_planner.stream(selected_trip_data)
+            else:
+                if speculator:
+                    # Waits for a speculative run still in progress; once it's done the itinerary is cached
+                    await speculator.claim((SESSION_NAMESPACE, session_id), selected_index)
+                prompt = _itinerary_prompt(selected_trip_data)
+                chunks = mistral_agent.stream_command(prompt, cache_key=itinerary_cache_key(selected_trip_data))
+            async for delta in chunks:
+                yield _sse_event({"delta": delta})
+            await broadcaster.emit('finalized', session_id, {"trip_name": selected_trip_data["name"]})
+            yield _sse_event({}, event="done")
+        except Exception as e:
+            print(f"Error streaming itinerary: {e}")
+            yield _sse_event({"error": "Error generating itinerary."}, event="error")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Component counters and gauges, read from their stats() when /metrics is scraped
+REGISTRY.stats("llm_scheduler", "Mistral scheduler", mistral_agent.scheduler.stats)
+REGISTRY.stats("llm_cache", "Mistral response cache", mistral_agent.cache.stats)
+if mistral_agent.hedger:
+    REGISTRY.stats("llm_hedging", "Hedged Mistral requests", mistral_agent.hedger.stats)
+if speculator:
+    REGISTRY.stats("speculation", "Speculative itineraries", speculator.stats)
+REGISTRY.stats("geocode_cache", "Geocoding cache", geocoder.stats)
+REGISTRY.stats("places_index", "Local places index", places_index.stats)
+REGISTRY.stats("poi_resolver", "Background POI resolution", poi_resolver.stats)
+REGISTRY.stats("weather_cache", "Weather cache", weather_service.stats)
+REGISTRY.stats("session_store", "Session store", session_store.stats)
+REGISTRY.stats("broadcast", "Socket.IO session events", broadcaster.stats)
+REGISTRY.stats("similarity_cache", "Recommendations served or seeded from similar sessions", similarity_cache.stats)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    # Prometheus text format: latency histograms, token counts, cache hit rates and in-flight counts
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
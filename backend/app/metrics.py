@@ -0,0 +1,255 @@
+import asyncio
+import time
+from bisect import bisect_left
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# How often the event loop lag probe wakes up
+LOOP_LAG_INTERVAL = 0.5
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for labelvalues, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic count; label values are passed positionally, in ``labelnames`` order."""
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labelvalues):
+        self._values[labelvalues] = value
+
+    def inc(self, *labelvalues, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) - amount
+
+
+class _Timer:
+    __slots__ = ("histogram", "labelvalues", "start")
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+        return False
+
+
+class Histogram(_Metric):
+    """Bucketed distribution; an observation is one bisect and two increments."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues):
+        series = self._values.get(labelvalues)
+        if series is None:
+            # Per-bucket counts (the last one is +Inf), then sum
+            series = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *labelvalues) -> _Timer:
+        """``with histogram.time("label"):`` observes the block's duration in seconds."""
+        return _Timer(self, labelvalues)
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for labelvalues, series in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            labels = _labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class StatsMetric(_Metric):
+    """Every numeric value of a component's ``stats()`` dict, as ``<name>_<key>`` gauges."""
+
+    def __init__(self, name: str, documentation: str, stats):
+        super().__init__(name, documentation)
+        self.stats = stats
+
+    def render(self) -> list[str]:
+        try:
+            stats = self.stats()
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {e!r}")
+            return []
+        lines = []
+        for key, value in (stats or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                name = f"{self.name}_{key}"
+                lines += [f"# HELP {name} {self.documentation}: {key}", f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+        return lines
+
+
+class Registry:
+    """Holds metrics by name and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # Re-registering a name (e.g. a second app instance in one process) replaces the old metric
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def stats(self, name: str, documentation: str, stats) -> StatsMetric:
+        return self.register(StatsMetric(name, documentation, stats))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry shared by the API, the bot and the modules they use
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "API requests by route, until the response body is complete", ("method", "route", "status"))
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "API requests in progress")
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "llm_request_seconds", "Mistral API call latency, including scheduler queueing (kind: complete or stream)", ("model", "kind"))
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "Tokens reported by the Mistral API", ("type",))
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "llm_first_token_seconds", "Streamed Mistral calls: time until the first text arrives", ("model",))
+UPSTREAM_REQUEST_SECONDS = REGISTRY.histogram(
+    "upstream_request_seconds", "HTTP calls to Nominatim, Overpass and OpenWeatherMap", ("host", "outcome"))
+UPSTREAM_IN_FLIGHT = REGISTRY.gauge("upstream_requests_in_flight", "Upstream HTTP calls in progress", ("host",))
+JSON_PARSE_SECONDS = REGISTRY.histogram(
+    "json_parse_seconds", "Time spent parsing AI responses", ("site",),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
+DISCORD_SEND_SECONDS = REGISTRY.histogram(
+    "discord_send_seconds", "Discord message sends and edits, including rate-limit waits", ("operation",))
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer that should have fired on time",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+
+
+def record_usage(response):
+    """Count the prompt/completion tokens of a Mistral response (or final stream chunk), if reported."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    LLM_TOKENS.inc("prompt", amount=getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_TOKENS.inc("completion", amount=getattr(usage, "completion_tokens", 0) or 0)
+
+
+async def monitor_event_loop(interval: float = LOOP_LAG_INTERVAL):
+    """Sleep ``interval`` seconds at a time and record how much later than that the loop woke us."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - start - interval))
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording ``http_request_seconds`` per route template (not raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_and_record_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_record_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; unmatched paths share one series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route, str(status))
+
+
+async def start_exporter(port: int, host: str = "0.0.0.0", registry: Registry = REGISTRY):
+    """Serve ``/metrics`` from a small aiohttp server, for processes without a web app (the bot)."""
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,317 @@
+import asyncio
+import heapq
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+import httpx
+
+from .http_client import HTTPClient
+from .rate_limit import TokenBucket
+from .tasks import Coalescer
+
+PLACES_INDEX_DIR = os.getenv(
+    "PLACES_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "places"),
+)
+# POIs are fetched from Overpass one tile (TILE_DEGREES square) at a time and kept on disk
+TILE_DEGREES = 0.25
+PLACES_TILE_TTL = float(os.getenv("PLACES_TILE_TTL", 30 * 24 * 60 * 60))
+# Tiles held in memory; past this the least recently used quarter is dropped (they stay on disk)
+PLACES_MAX_TILES = int(os.getenv("PLACES_MAX_TILES", 1000))
+# Grid cell size of the in-memory index (~1km)
+CELL_DEGREES = 0.01
+# Overpass asks for at most a couple of requests at a time; stay well under it
+OVERPASS_REQUESTS_PER_SECOND = 0.5
+OVERPASS_TIMEOUT = 60
+# The server may use all of OVERPASS_TIMEOUT on the query, then needs time to send the result
+OVERPASS_READ_TIMEOUT = OVERPASS_TIMEOUT + 15
+EARTH_RADIUS_KM = 6371.0
+
+OVERPASS_TILE_QUERY = """[out:json][timeout:{timeout}];
+(
+  node["tourism"]["name"]({bbox});
+  node["historic"]["name"]({bbox});
+  node["amenity"~"^(restaurant|cafe|bar|pub|theatre|cinema|arts_centre|marketplace|place_of_worship)$"]["name"]({bbox});
+  node["leisure"~"^(park|garden|nature_reserve)$"]["name"]({bbox});
+);
+out;"""
+# First matching tag decides a POI's type, e.g. "tourism=museum"
+TYPE_TAGS = ("tourism", "historic", "amenity", "leisure")
+
+
+class OverpassError(httpx.HTTPError):
+    """Overpass answered 200 with a ``remark``: the query hit a runtime error or timeout and
+    ``elements`` is partial or empty."""
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def normalize_name(name: str) -> str:
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().casefold()
+    text = re.sub(r"^the\s+", "", re.sub(r"[^\w\s]", " ", text).strip())
+    return re.sub(r"\s+", " ", text)
+
+
+def _cell(lat: float, lon: float) -> tuple[int, int]:
+    return math.floor(lat / CELL_DEGREES), math.floor(lon / CELL_DEGREES)
+
+
+class PlacesIndex:
+    """Offline nearest-neighbour index of named tourism/amenity POIs.
+
+    POIs live in parallel arrays (latitude, longitude, type id) with names in a list, bucketed
+    by a ~1km grid of cells. Tiles are fetched from Overpass once, saved under ``directory``
+    and loaded from there on later runs, so repeat queries for a city never leave the process.
+    At most ``max_tiles`` tiles are held in memory, least recently used dropped first.
+    """
+
+    def __init__(self, http_client: HTTPClient | None, url: str, directory: str | None = PLACES_INDEX_DIR,
+                 rate_limiter: TokenBucket | None = None, max_tiles: int = PLACES_MAX_TILES):
+        self.http_client = http_client
+        self.url = url
+        self.directory = directory
+        self.max_tiles = max_tiles
+        self.rate_limiter = rate_limiter or TokenBucket(OVERPASS_REQUESTS_PER_SECOND)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.type_ids = array("H")
+        self.names = []
+        self.types = []
+        self._type_ids = {}
+        self._cells = {}
+        # Normalized name -> POI indices
+        self._by_name = {}
+        # Tile -> (first, end) POI indices, least recently used first
+        self._tiles = OrderedDict()
+        # Concurrent queries for the same area share one Overpass request per tile
+        self._inflight = Coalescer()
+
+        self.tiles_fetched = 0
+        self.tiles_loaded = 0
+        self.tiles_failed = 0
+        self.tiles_evicted = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    # Building
+
+    def add(self, lat: float, lon: float, poi_type: str, name: str):
+        type_id = self._type_ids.get(poi_type)
+        if type_id is None:
+            type_id = self._type_ids[poi_type] = len(self.types)
+            self.types.append(poi_type)
+        index = len(self.names)
+        self.latitudes.append(lat)
+        self.longitudes.append(lon)
+        self.type_ids.append(type_id)
+        self.names.append(name)
+        cell = self._cells.get(_cell(lat, lon))
+        if cell is None:
+            cell = self._cells[_cell(lat, lon)] = array("I")
+        cell.append(index)
+        self._by_name.setdefault(normalize_name(name), []).append(index)
+
+    def _add_tile(self, tile: tuple[int, int], pois: list):
+        if tile in self._tiles:
+            return
+        first = len(self.names)
+        for lat, lon, poi_type, name in pois:
+            self.add(lat, lon, poi_type, name)
+        self._tiles[tile] = (first, len(self.names))
+        if len(self._tiles) > self.max_tiles:
+            self._evict_tiles()
+
+    def _evict_tiles(self):
+        # A tile's POIs are contiguous, so the kept tiles are copied into fresh arrays; dropping
+        # a quarter at a time keeps the rebuilds rare
+        keep = list(self._tiles.items())[len(self._tiles) - max(1, self.max_tiles * 3 // 4):]
+        self.tiles_evicted += len(self._tiles) - len(keep)
+        latitudes, longitudes, type_ids, names = self.latitudes, self.longitudes, self.type_ids, self.names
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.type_ids = array("H")
+        self.names = []
+        self._cells = {}
+        self._by_name = {}
+        self._tiles = OrderedDict()
+        for tile, (first, end) in keep:
+            start = len(self.names)
+            for index in range(first, end):
+                self.add(latitudes[index], longitudes[index], self.types[type_ids[index]], names[index])
+            self._tiles[tile] = (start, len(self.names))
+
+    def _tile_path(self, tile: tuple[int, int]) -> str:
+        return os.path.join(self.directory, f"{tile[0]}_{tile[1]}.json")
+
+    def _load_tile(self, tile: tuple[int, int]) -> bool:
+        if not self.directory:
+            return False
+        try:
+            with open(self._tile_path(tile)) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+        if time.time() - data.get("fetched_at", 0) > PLACES_TILE_TTL:
+            return False
+        self._add_tile(tile, data["pois"])
+        self.tiles_loaded += 1
+        return True
+
+    async def _fetch_tile(self, tile: tuple[int, int]):
+        south, west = tile[0] * TILE_DEGREES, tile[1] * TILE_DEGREES
+        bbox = f"{south},{west},{south + TILE_DEGREES},{west + TILE_DEGREES}"
+        await self.rate_limiter.acquire()
+        data = await self.http_client.get_json(
+            self.url, params={"data": OVERPASS_TILE_QUERY.format(timeout=OVERPASS_TIMEOUT, bbox=bbox)},
+            timeout=OVERPASS_READ_TIMEOUT)
+        if data.get("remark"):
+            # Truncated: not saved, so the next query for the area tries again
+            self.tiles_failed += 1
+            raise OverpassError(f"Overpass query for tile {tile} failed: {data['remark']}")
+        pois = []
+        for element in data.get("elements", []):
+            tags = element.get("tags", {})
+            poi_type = next((f"{tag}={tags[tag]}" for tag in TYPE_TAGS if tag in tags), None)
+            if "lat" in element and "lon" in element and tags.get("name") and poi_type:
+                pois.append([element["lat"], element["lon"], poi_type, tags["name"]])
+        self.tiles_fetched += 1
+
+        if self.directory:
+            # Write then rename, so a crash never leaves a half-written tile behind
+            path = self._tile_path(tile)
+            with open(path + ".tmp", "w") as f:
+                json.dump({"fetched_at": time.time(), "pois": pois}, f, separators=(",", ":"))
+            os.replace(path + ".tmp", path)
+        self._add_tile(tile, pois)
+
+    def load_area(self, lat: float, lon: float, radius_km: float) -> bool:
+        """Index whatever tiles around the point are on disk; True if the whole area is covered.
+        Never goes to the network."""
+        covered = True
+        for tile in self._tiles_around(lat, lon, radius_km):
+            if tile in self._tiles:
+                self._tiles.move_to_end(tile)
+            elif not self._load_tile(tile):
+                covered = False
+        return covered
+
+    async def ensure_area(self, lat: float, lon: float, radius_km: float):
+        """Make sure every tile within ``radius_km`` of the point is indexed (disk, else Overpass)."""
+        fetches = []
+        for tile in self._tiles_around(lat, lon, radius_km):
+            if tile in self._tiles:
+                self._tiles.move_to_end(tile)
+                continue
+            if self._load_tile(tile):
+                continue
+            fetches.append(self._inflight.run(tile, lambda tile=tile: self._fetch_tile(tile)))
+        if fetches:
+            await asyncio.gather(*fetches)
+
+    @staticmethod
+    def _grid_around(lat: float, lon: float, radius_km: float, size: float):
+        # Every grid square (of ``size`` degrees) overlapping the radius' bounding box
+        lat_delta = radius_km / 111.0
+        lon_delta = radius_km / (111.0 * max(0.01, math.cos(math.radians(lat))))
+        for i in range(math.floor((lat - lat_delta) / size), math.floor((lat + lat_delta) / size) + 1):
+            for j in range(math.floor((lon - lon_delta) / size), math.floor((lon + lon_delta) / size) + 1):
+                yield i, j
+
+    def _tiles_around(self, lat: float, lon: float, radius_km: float):
+        return self._grid_around(lat, lon, radius_km, TILE_DEGREES)
+
+    # Queries
+
+    def _poi(self, index: int, distance: float) -> dict:
+        return {
+            "name": self.names[index],
+            "type": self.types[self.type_ids[index]],
+            "latitude": self.latitudes[index],
+            "longitude": self.longitudes[index],
+            "distance_km": round(distance, 3),
+        }
+
+    def _candidates(self, lat: float, lon: float, radius_km: float, types=None):
+        # Yields (distance_km, index) for indexed POIs within the radius
+        type_ids = None
+        if types:
+            type_ids = {self._type_ids[t] for t in types if t in self._type_ids}
+            # "museum" matches "tourism=museum"; "tourism" matches every tourism=*
+            type_ids |= {i for i, t in enumerate(self.types) if t.split("=")[-1] in types or t.split("=")[0] in types}
+        for key in self._grid_around(lat, lon, radius_km, CELL_DEGREES):
+            cell = self._cells.get(key)
+            if not cell:
+                continue
+            for index in cell:
+                if type_ids is not None and self.type_ids[index] not in type_ids:
+                    continue
+                distance = haversine_km(lat, lon, self.latitudes[index], self.longitudes[index])
+                if distance <= radius_km:
+                    yield distance, index
+
+    def nearby(self, lat: float, lon: float, radius_km: float = 2.0, types=None, limit: int = 20) -> list[dict]:
+        """Indexed POIs within ``radius_km``, optionally filtered by type, closest ``limit`` first."""
+        closest = heapq.nsmallest(limit, self._candidates(lat, lon, radius_km, types))
+        return [self._poi(index, distance) for distance, index in closest]
+
+    def find(self, name: str, lat: float, lon: float, radius_km: float = 30.0) -> dict | None:
+        """The closest indexed POI within ``radius_km`` whose name matches ``name``."""
+        wanted = normalize_name(name)
+        if not wanted:
+            return None
+        # Exact name matches come straight from the name table
+        best = None
+        for index in self._by_name.get(wanted, ()):
+            distance = haversine_km(lat, lon, self.latitudes[index], self.longitudes[index])
+            if distance <= radius_km and (best is None or distance < best[1]):
+                best = (index, distance)
+        if best is None and len(wanted) > 4:
+            # Otherwise the closest POI whose name contains, or is contained in, the wanted one
+            for distance, index in self._candidates(lat, lon, radius_km):
+                candidate = normalize_name(self.names[index])
+                if (wanted in candidate or candidate in wanted) and (best is None or distance < best[1]):
+                    best = (index, distance)
+        return self._poi(*best) if best else None
+
+    def enrich(self, points: list[dict], center: list[float] | tuple[float, float], radius_km: float = 30.0) -> list[dict]:
+        """Check AI-suggested points of interest against the index.
+
+        Points found by name near ``center`` get the indexed coordinates and type and
+        ``"verified": True``; the rest are returned unchanged with ``"verified": False``.
+        """
+        enriched = []
+        for point in points:
+            if not isinstance(point, dict) or not point.get("name"):
+                continue
+            match = self.find(str(point["name"]), center[0], center[1], radius_km)
+            if match:
+                point = {**point, "latitude": match["latitude"], "longitude": match["longitude"],
+                         "type": point.get("type") or match["type"], "verified": True}
+            else:
+                point = {**point, "verified": False}
+            enriched.append(point)
+        return enriched
+
+    def stats(self) -> dict:
+        return {
+            "pois": len(self),
+            "tiles": len(self._tiles),
+            "tiles_fetched": self.tiles_fetched,
+            "tiles_loaded": self.tiles_loaded,
+            "tiles_failed": self.tiles_failed,
+            "tiles_evicted": self.tiles_evicted,
+        }
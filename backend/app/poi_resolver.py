@@ -0,0 +1,125 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+from .geocode_cache import GEOCODE_ITEM_TIMEOUT, Geocoder
+from .places_index import PlacesIndex, haversine_km
+from .tasks import BackgroundTasks
+
+# Resolution jobs are kept this long for clients to collect
+POI_JOB_TTL = float(os.getenv("POI_JOB_TTL", 10 * 60))
+MAX_POI_JOBS = 1000
+# Search radius around the chat's location, for the places index and for sanity-checking geocodes
+POI_RADIUS_KM = 10.0
+# A geocoded POI further than this from the location matched some other place with the same name
+MAX_GEOCODE_DISTANCE_KM = 50.0
+PLACES_FETCH_TIMEOUT = 15.0
+
+
+def _has_coordinates(point: dict) -> bool:
+    latitude, longitude = point.get("latitude"), point.get("longitude")
+    if not isinstance(latitude, (int, float)) or not isinstance(longitude, (int, float)):
+        return False
+    # Models fill in 0.0/0.0 when they don't know
+    return not (latitude == 0 and longitude == 0)
+
+
+class PoiResolver:
+    """Fills in coordinates for AI-suggested points of interest without holding up the response.
+
+    ``start()`` returns the points right away, checked against whatever the places index has
+    on disk, and hands the rest to a background job: fetch the area into the places index,
+    then geocode what is still unverified. Clients poll ``job(job_id)``; async callables in
+    ``listeners`` are awaited as ``listener(job_id, job)`` when a job finishes.
+    """
+
+    def __init__(self, geocoder: Geocoder, places_index: PlacesIndex | None = None,
+                 radius_km: float = POI_RADIUS_KM, item_timeout: float = GEOCODE_ITEM_TIMEOUT):
+        self.geocoder = geocoder
+        self.places_index = places_index
+        self.radius_km = radius_km
+        self.item_timeout = item_timeout
+        self.listeners = []
+        self._jobs = OrderedDict()
+        self._tasks = BackgroundTasks()
+
+        self.jobs_started = 0
+        self.points_geocoded = 0
+        self.points_unresolved = 0
+
+    def start(self, points: list, location: str | None, center: list[float] | None) -> tuple[list[dict], str | None]:
+        """Return ``(points, job_id)``; ``job_id`` is ``None`` when nothing is left to resolve."""
+        points = [point for point in points if isinstance(point, dict) and point.get("name")]
+        if center and self.places_index is not None and self.places_index.load_area(*center, self.radius_km):
+            points = self.places_index.enrich(points, center, self.radius_km)
+        if not points or all(point.get("verified") for point in points):
+            return points, None
+
+        self._expire()
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = {"status": "pending", "points_of_interest": points, "created_at": time.monotonic()}
+        self.jobs_started += 1
+        self._tasks.spawn(self._resolve(job_id, points, location, center))
+        return points, job_id
+
+    async def _resolve(self, job_id: str, points: list[dict], location: str | None, center: list[float] | None):
+        try:
+            if center and self.places_index is not None:
+                try:
+                    await asyncio.wait_for(self.places_index.ensure_area(*center, self.radius_km),
+                                           PLACES_FETCH_TIMEOUT)
+                    points = self.places_index.enrich(points, center, self.radius_km)
+                except Exception as e:
+                    print(f"Error checking points of interest: {e!r}")
+
+            pending = [i for i, point in enumerate(points) if not point.get("verified")]
+            queries = [f"{points[i]['name']}, {location}" if location else str(points[i]["name"]) for i in pending]
+            results = await self.geocoder.geocode_many(queries, timeout=self.item_timeout)
+            points = list(points)
+            for i, result in zip(pending, results):
+                if result["status"] == "ok" and (
+                        not center or haversine_km(*center, result["latitude"], result["longitude"]) <= MAX_GEOCODE_DISTANCE_KM):
+                    points[i] = {**points[i], "latitude": result["latitude"], "longitude": result["longitude"],
+                                 "verified": True}
+                    self.points_geocoded += 1
+                else:
+                    points[i] = {**points[i], "verified": False}
+                    if not _has_coordinates(points[i]):
+                        points[i].update(latitude=None, longitude=None)
+                    self.points_unresolved += 1
+            job = {"status": "done", "points_of_interest": points}
+        except Exception as e:
+            print(f"Error resolving points of interest: {e!r}")
+            job = {"status": "error", "points_of_interest": points}
+
+        if job_id in self._jobs:
+            self._jobs[job_id].update(job)
+        for listener in self.listeners:
+            try:
+                await listener(job_id, self._jobs.get(job_id, job))
+            except Exception as e:
+                print(f"Error notifying POI listener: {e!r}")
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._jobs:
+            job_id, job = next(iter(self._jobs.items()))
+            if len(self._jobs) < MAX_POI_JOBS and now - job["created_at"] <= POI_JOB_TTL:
+                break
+            del self._jobs[job_id]
+
+    def job(self, job_id: str) -> dict | None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {"status": job["status"], "points_of_interest": job["points_of_interest"]}
+
+    def stats(self) -> dict:
+        return {
+            "jobs_started": self.jobs_started,
+            "jobs_pending": sum(1 for job in self._jobs.values() if job["status"] == "pending"),
+            "points_geocoded": self.points_geocoded,
+            "points_unresolved": self.points_unresolved,
+        }
@@ -0,0 +1,181 @@
+import difflib
+import json
+import math
+import os
+import re
+
+from .geocode_cache import normalize_location
+from .llm_cache import _normalize_text, budget_numbers
+
+# Hard cap on the estimated size of the preference section of a recommendation prompt
+PROMPT_PREFERENCE_TOKEN_BUDGET = int(os.getenv("PROMPT_PREFERENCE_TOKEN_BUDGET", 1500))
+# Locations at least this similar (with the same mode) are treated as the same destination
+NEAR_DUPLICATE_RATIO = 0.88
+# Names listed per destination before "and N others"
+MAX_NAMED_USERS = 5
+MAX_LISTED_DATES = 4
+MAX_LISTED_BUDGETS = 4
+
+RECOMMENDATION_INSTRUCTIONS = (
+    "Based on the following travel preferences, suggest a few trip options that balances everyone's inputs. "
+    "Make sure the activity list is descriptive. Destinations wanted by more people should weigh more.\n"
+)
+RECOMMENDATION_FORMAT = """Please format the response in JSON with this structure. Return ONLY a raw JSON array. Do NOT use Markdown formatting, triple backticks, or any extra text, again just the raw JSON array:
+[
+  {
+    "name": "Trip Name",
+    "dates": "Trip Dates",
+    "trip_style": "Trip Style",
+    "budget": "Budget",
+    "activities": ["Activity 1", "Activity 2", "Activity 3"]
+  },
+  ...
+]
+"""
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Fast local token estimate: one token per punctuation mark, about four characters per word piece."""
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN.findall(text))
+
+
+def _budget_range(budget) -> tuple[float, float] | None:
+    # "about 1500 EUR" -> (1500, 1500), "1000-2000" -> (1000, 2000), "1000 or 2000" -> None
+    numbers = budget_numbers(budget)
+    if numbers is None:
+        return None
+    return float(numbers[0]), float(numbers[-1])
+
+
+def _closest_location(location: str, known: list[str]) -> str | None:
+    # "Lisbon" and "Lisbon, Portugal" are the same place; "Paris, France" and "Paris, Texas" aren't
+    city = location.split(",")[0]
+    for candidate in known:
+        if candidate.split(",")[0] == city and ("," not in location or "," not in candidate):
+            return candidate
+    # Typos and spelling variants ("Barcelona" / "Barcelonna")
+    matches = difflib.get_close_matches(location, known, n=1, cutoff=NEAR_DUPLICATE_RATIO)
+    return matches[0] if matches else None
+
+
+class PreferenceGroup:
+    """All submissions for one destination and trip mode."""
+
+    __slots__ = ("location", "mode", "count", "users", "budget_low", "budget_high", "budgets", "dates")
+
+    def __init__(self, location: str, mode: str):
+        self.location = location
+        self.mode = mode
+        self.count = 0
+        # Dicts used as ordered sets
+        self.users = {}
+        self.budget_low = None
+        self.budget_high = None
+        # Budgets that aren't a number or a range, passed on as written
+        self.budgets = {}
+        self.dates = {}
+
+    def add(self, preference: dict):
+        self.count += 1
+        self.users.setdefault(preference["user"])
+        budget = _budget_range(preference["budget"])
+        if budget is not None:
+            low, high = budget
+            self.budget_low = low if self.budget_low is None else min(self.budget_low, low)
+            self.budget_high = high if self.budget_high is None else max(self.budget_high, high)
+        else:
+            text = str(preference["budget"]).strip()
+            if text:
+                self.budgets.setdefault(text.casefold(), text)
+        dates = str(preference["dates"]).strip()
+        self.dates.setdefault(dates.casefold(), dates)
+
+    def describe(self) -> str:
+        users = list(self.users)
+        who = ", ".join(users[:MAX_NAMED_USERS])
+        if len(users) > MAX_NAMED_USERS:
+            who += f" and {len(users) - MAX_NAMED_USERS} others"
+        line = f"- {self.location} ({self.mode} trip): wanted {self.count} time(s) by {who}"
+        if self.budget_low is not None:
+            low, high = self.budget_low, self.budget_high
+            line += f"; budget {low:,.0f}" if low == high else f"; budget {low:,.0f}-{high:,.0f}"
+        if self.budgets:
+            budgets = list(self.budgets.values())
+            listed = "; ".join(budgets[:MAX_LISTED_BUDGETS])
+            if len(budgets) > MAX_LISTED_BUDGETS:
+                listed += f" (+{len(budgets) - MAX_LISTED_BUDGETS} more)"
+            line += f"; budget as stated: {listed}"
+        if self.dates:
+            dates = list(self.dates.values())
+            listed = ", ".join(dates[:MAX_LISTED_DATES])
+            if len(dates) > MAX_LISTED_DATES:
+                listed += f" (+{len(dates) - MAX_LISTED_DATES} more)"
+            line += f"; dates: {listed}"
+        return line + ".\n"
+
+
+def aggregate_preferences(preferences: list[dict]) -> list[PreferenceGroup]:
+    """Collapse duplicate and near-duplicate preferences into one group per location and mode,
+    most requested first."""
+    groups = {}
+    by_mode = {}
+    for preference in preferences:
+        mode = _normalize_text(preference["mode"])
+        location = normalize_location(str(preference["location"]))
+        group = groups.get((location, mode))
+        if group is None:
+            match = _closest_location(location, by_mode.get(mode, []))
+            if match is not None:
+                group = groups[(match, mode)]
+            else:
+                group = PreferenceGroup(str(preference["location"]).strip(), mode)
+                by_mode.setdefault(mode, []).append(location)
+            groups[(location, mode)] = group
+        group.add(preference)
+
+    unique = list({id(group): group for group in groups.values()}.values())
+    return sorted(unique, key=lambda group: -group.count)
+
+
+def preference_summary(preferences: list[dict], token_budget: int = PROMPT_PREFERENCE_TOKEN_BUDGET) -> str:
+    """The aggregated preference lines, cut off at ``token_budget`` estimated tokens."""
+    summary = ""
+    tokens = 0
+    groups = aggregate_preferences(preferences)
+    for index, group in enumerate(groups):
+        line = group.describe()
+        line_tokens = count_tokens(line)
+        if tokens + line_tokens > token_budget:
+            # Least requested destinations are dropped first
+            remaining = groups[index:]
+            summary += (f"- ...and {len(remaining)} less requested option(s) from "
+                        f"{sum(group.count for group in remaining)} submission(s).\n")
+            break
+        summary += line
+        tokens += line_tokens
+    return summary
+
+
+def recommendation_prompt(preferences: list[dict], token_budget: int = PROMPT_PREFERENCE_TOKEN_BUDGET) -> str:
+    """Recommendation prompt for one session's preferences; its size grows with the number of
+    distinct destinations (up to the budget), not the number of submissions."""
+    return RECOMMENDATION_INSTRUCTIONS + preference_summary(preferences, token_budget) + RECOMMENDATION_FORMAT
+
+
+REFINEMENT_INSTRUCTIONS = (
+    "These trip options were suggested for a group with very similar travel preferences:\n"
+)
+REFINEMENT_REQUEST = (
+    "Adjust them (destinations, dates, budget, activities) to fit the following preferences instead, "
+    "keeping what already fits. Return ONLY the raw JSON array in the same structure, with no Markdown or extra text:\n"
+)
+
+
+def refinement_prompt(preferences: list[dict], trips: list[dict],
+                      token_budget: int = PROMPT_PREFERENCE_TOKEN_BUDGET) -> str:
+    """Recommendation prompt seeded with the trips recommended for a similar session; the model
+    edits those instead of planning from scratch, and the format is shown by example."""
+    return (REFINEMENT_INSTRUCTIONS + json.dumps(trips, separators=(",", ":")) + "\n"
+            + REFINEMENT_REQUEST + preference_summary(preferences, token_budget))
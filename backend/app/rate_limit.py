@@ -0,0 +1,66 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class TokenBucket:
+    """Async token-bucket limiter: ``rate`` tokens per second, bursts of up to ``capacity``.
+
+    Waiters are served in ``priority`` order (lower first), FIFO within a priority, so
+    background work queued behind the limit never holds up an interactive caller for long.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        # (priority, sequence, wake-up future or None)
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _wake_head(self):
+        if self._waiters:
+            wake = self._waiters[0][2]
+            if wake is not None and not wake.done():
+                wake.set_result(None)
+
+    async def acquire(self, tokens: float = 1.0, priority: int = 0):
+        tokens = min(tokens, self.capacity) # A request larger than the bucket waits for a full bucket
+        if not self._waiters and self.try_acquire(tokens):
+            return
+        entry = [priority, next(self._sequence), None]
+        heapq.heappush(self._waiters, entry)
+        try:
+            while True:
+                if self._waiters[0] is entry:
+                    # Only the head takes tokens, so a burst is drained at exactly ``rate``
+                    if self.try_acquire(tokens):
+                        return
+                    entry[2] = None
+                    await asyncio.sleep((tokens - self._tokens) / self.rate)
+                else:
+                    # Woken when it becomes the head
+                    entry[2] = asyncio.get_running_loop().create_future()
+                    await entry[2]
+        finally:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+            self._wake_head()
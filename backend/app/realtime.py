@@ -0,0 +1,74 @@
+import asyncio
+import os
+
+from .tasks import BackgroundTasks
+
+# Votes arriving within this many seconds of each other go out as one "votes" event per session
+VOTE_COALESCE_WINDOW = float(os.getenv("VOTE_COALESCE_WINDOW", 0.25))
+
+
+def session_room(session_id) -> str:
+    return f"session:{session_id}"
+
+
+def poi_job_room(job_id: str) -> str:
+    return f"poi:{job_id}"
+
+
+class SessionBroadcaster:
+    """Pushes small per-session deltas to everyone planning the same trip over Socket.IO.
+
+    Clients join ``session_room(session_id)``. Vote counts are buffered per session and sent
+    as a single ``votes`` event (trip index -> count, only the trips whose count changed) once
+    ``window`` seconds have passed since the first buffered vote, so a burst of votes costs one
+    emit per room.
+    """
+
+    def __init__(self, sio, window: float = VOTE_COALESCE_WINDOW):
+        self.sio = sio
+        self.window = window
+        self._pending_votes = {}
+        self._tasks = BackgroundTasks()
+
+        self.votes_received = 0
+        self.vote_events = 0
+        self.events = 0
+
+    async def emit(self, event: str, session_id, data: dict):
+        self.events += 1
+        await self.sio.emit(event, {"session_id": session_id, **data}, room=session_room(session_id))
+
+    def vote(self, session_id, trip_index: int, count: int):
+        """Record a trip's new vote count; it is sent with the rest of the window's votes."""
+        self.votes_received += 1
+        pending = self._pending_votes.get(session_id)
+        if pending is None:
+            pending = self._pending_votes[session_id] = {}
+            try:
+                asyncio.get_running_loop().call_later(self.window, self._flush_votes, session_id)
+            except RuntimeError:
+                # No event loop (e.g. a script); nobody can be listening anyway
+                del self._pending_votes[session_id]
+                return
+        # Counts are absolute, so later votes in the window simply overwrite earlier ones
+        pending[trip_index] = count
+
+    def _flush_votes(self, session_id):
+        votes = self._pending_votes.pop(session_id, None)
+        if not votes:
+            return
+        self.vote_events += 1
+        task = self._tasks.spawn(self.emit("votes", session_id, {"votes": votes}))
+        task.add_done_callback(self._emitted)
+
+    def _emitted(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error broadcasting votes: {task.exception()!r}")
+
+    def stats(self) -> dict:
+        return {
+            "votes_received": self.votes_received,
+            "vote_events": self.vote_events,
+            "events": self.events,
+            "pending_sessions": len(self._pending_votes),
+        }
@@ -0,0 +1,529 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+
+from .vote_engine import BallotBox, Leaderboard
+
+SESSION_DB_PATH = os.getenv(
+    "SESSION_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "sessions.sqlite3"),
+)
+# SESSION_STORE=shared keeps no per-process state, so several workers can share one database file
+SESSION_STORE_SHARED = os.getenv("SESSION_STORE", "").lower() == "shared"
+# Pending writes are committed together once this many queue up, or after FLUSH_INTERVAL seconds
+FLUSH_BATCH_SIZE = 200
+FLUSH_INTERVAL = 0.5
+# Cached sessions idle for longer than the TTL, or beyond the size cap (least recently used
+# first), are dropped from memory; with a database they are reloaded on next access
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", 60 * 60))
+SESSION_CACHE_MAX_SESSIONS = int(os.getenv("SESSION_CACHE_MAX_SESSIONS", 10_000))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_counters (
+    namespace TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    namespace TEXT NOT NULL,
+    session_id INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, session_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS preferences (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace TEXT NOT NULL,
+    session_id INTEGER NOT NULL,
+    user TEXT NOT NULL,
+    location TEXT NOT NULL,
+    budget TEXT NOT NULL,
+    dates TEXT NOT NULL,
+    mode TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS preferences_by_session ON preferences (namespace, session_id);
+CREATE INDEX IF NOT EXISTS preferences_by_user ON preferences (namespace, session_id, user);
+CREATE TABLE IF NOT EXISTS trips (
+    namespace TEXT NOT NULL,
+    session_id INTEGER NOT NULL,
+    trip_index INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (namespace, session_id, trip_index)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ballots (
+    namespace TEXT NOT NULL,
+    session_id INTEGER NOT NULL,
+    voter TEXT NOT NULL,
+    trip_index INTEGER NOT NULL,
+    PRIMARY KEY (namespace, session_id, voter)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS session_links (
+    namespace TEXT NOT NULL,
+    session_id INTEGER NOT NULL,
+    target_namespace TEXT NOT NULL,
+    target_id INTEGER NOT NULL,
+    PRIMARY KEY (namespace, session_id)
+) WITHOUT ROWID;
+"""
+
+PREFERENCE_FIELDS = ("user", "location", "budget", "dates", "mode")
+
+
+def _approx_size(obj) -> int:
+    # Rough deep size of the JSON-like values a session holds
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_approx_size(key) + _approx_size(value) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_approx_size(item) for item in obj)
+    return size
+
+
+class SessionState:
+    """In-memory copy of one planning session (a Discord guild or a web session)."""
+
+    __slots__ = ("preferences", "trips", "ballots", "last_access", "size")
+
+    def __init__(self, preferences=None, trips=None, ballots=None):
+        # Tuples in PREFERENCE_FIELDS order rather than one dict per preference
+        self.preferences = preferences if preferences is not None else []
+        # None until recommendations have been generated
+        self.trips = trips
+        # One ballot per voter and the leaderboard, once there are trips to vote on
+        self.ballots = BallotBox(len(trips), ballots) if trips else None
+        self.last_access = time.monotonic()
+        self.size = 0
+
+    def approx_size(self) -> int:
+        size = sys.getsizeof(self) + _approx_size(self.preferences) + _approx_size(self.trips)
+        if self.ballots is not None:
+            board = self.ballots.board
+            size += (_approx_size(self.ballots.ballots) + _approx_size(board.counts) + _approx_size(board.order)
+                     + _approx_size(board.position))
+        return size
+
+
+class SessionStore:
+    """Session state in an in-memory write-through cache over SQLite (WAL mode).
+
+    Reads are served from the cache (loaded lazily from SQLite on first access). Writes update
+    the cache immediately and are queued for SQLite, then committed in batches. Sessions are
+    keyed by ``(namespace, session_id)``, e.g. ``("discord", guild_id)`` or ``("web", 42)``.
+    Votes are one ballot per voter (see vote_engine.py), persisted so tallies survive restarts.
+    Idle sessions leave the cache after ``ttl`` seconds, and at most ``max_sessions`` are held
+    (LRU). Pass ``path=None`` for a purely in-memory store; evicted sessions are then gone.
+
+    With ``shared=True`` nothing is cached or queued: every read goes to SQLite and every write
+    commits immediately (ballots are upserted in one transaction), so any number of processes
+    pointing at the same file see one consistent state.
+    """
+
+    def __init__(self, path: str | None = SESSION_DB_PATH, batch_size: int = FLUSH_BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, shared: bool = SESSION_STORE_SHARED,
+                 ttl: float = SESSION_CACHE_TTL, max_sessions: int = SESSION_CACHE_MAX_SESSIONS):
+        if shared and not path:
+            raise ValueError("A shared session store needs a database path")
+        self.shared = shared
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+        self.loads = 0
+        # Called as ``listener((namespace, session_id))`` when a session leaves the cache
+        self.eviction_listeners = []
+        self._pending = []
+        self._flush_handle = None
+        self._last_ids = {}
+        self.flush_failures = 0
+        # (namespace, session_id) -> link target, or None when known to be unlinked; LRU, at
+        # most max_sessions entries (the table has them all)
+        self._links = OrderedDict()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # Wait up to 10s for another process's write lock instead of failing
+            self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+
+    def create_session(self, namespace: str) -> int:
+        """Allocate a new session id, unique across every process sharing the database.
+        Ids already in use (e.g. written to without being created) are skipped."""
+        if self._db is None:
+            used = max((session_id for ns, session_id in self._cache if ns == namespace), default=0)
+            session_id = self._last_ids[namespace] = max(self._last_ids.get(namespace, 0), used) + 1
+        else:
+            # Queued writes may hold sessions the table doesn't have yet
+            self.flush()
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                (used,) = self._db.execute(
+                    "SELECT COALESCE(MAX(session_id), 0) FROM sessions WHERE namespace = ?", (namespace,)).fetchone()
+                (session_id,) = self._db.execute(
+                    "INSERT INTO session_counters (namespace, last_id) VALUES (?, ?)"
+                    " ON CONFLICT (namespace) DO UPDATE SET last_id = MAX(last_id, ?) + 1 RETURNING last_id",
+                    (namespace, used + 1, used),
+                ).fetchone()
+        self._session(namespace, session_id)
+        self._write(self._touch(namespace, session_id))
+        return session_id
+
+    # Reads
+
+    def exists(self, namespace: str, session_id: int) -> bool:
+        if self.shared:
+            return self._db.execute("SELECT 1 FROM sessions WHERE namespace = ? AND session_id = ?",
+                                    (namespace, session_id)).fetchone() is not None
+        return self.get(namespace, session_id) is not None
+
+    def get(self, namespace: str, session_id: int) -> SessionState | None:
+        if self.shared:
+            return self._load(namespace, session_id)
+        key = (namespace, session_id)
+        now = time.monotonic()
+        self._evict(now)
+        state = self._cache.get(key)
+        if state is not None:
+            self._cache.move_to_end(key)
+            state.last_access = now
+        elif self._db is not None:
+            state = self._load(namespace, session_id)
+            if state is not None:
+                self.loads += 1
+                self._remember(key, state)
+        return state
+
+    # Shared mode reads only the table it needs
+
+    def preferences(self, namespace: str, session_id: int) -> list[dict]:
+        if self.shared:
+            rows = self._load_preferences((namespace, session_id))
+        else:
+            state = self.get(namespace, session_id)
+            rows = state.preferences if state else []
+        return [dict(zip(PREFERENCE_FIELDS, row)) for row in rows]
+
+    def trips(self, namespace: str, session_id: int) -> list[dict] | None:
+        if self.shared:
+            return self._load_trips((namespace, session_id)) or None
+        state = self.get(namespace, session_id)
+        return state.trips if state else None
+
+    def leaderboard(self, namespace: str, session_id: int) -> Leaderboard | None:
+        """The session's trips ranked by votes, or ``None`` before recommendations."""
+        if self.shared:
+            key = (namespace, session_id)
+            trips = self._load_trips(key)
+            return BallotBox(len(trips), self._load_ballots(key)).board if trips else None
+        state = self.get(namespace, session_id)
+        return state.ballots.board if state and state.ballots else None
+
+    def tallies(self, namespace: str, session_id: int) -> list[int]:
+        """Vote counts in trip order."""
+        board = self.leaderboard(namespace, session_id)
+        return list(board.counts) if board else []
+
+    def _load(self, namespace: str, session_id: int) -> SessionState | None:
+        self.flush()
+        key = (namespace, session_id)
+        if self._db.execute("SELECT 1 FROM sessions WHERE namespace = ? AND session_id = ?", key).fetchone() is None:
+            return None
+        return SessionState(self._load_preferences(key), self._load_trips(key) or None, self._load_ballots(key))
+
+    def _load_preferences(self, key: tuple) -> list[tuple]:
+        return self._db.execute(
+            "SELECT user, location, budget, dates, mode FROM preferences"
+            " WHERE namespace = ? AND session_id = ? ORDER BY id", key).fetchall()
+
+    def _load_trips(self, key: tuple) -> list[dict]:
+        return [
+            json.loads(data)
+            for (data,) in self._db.execute(
+                "SELECT data FROM trips WHERE namespace = ? AND session_id = ? ORDER BY trip_index", key)
+        ]
+
+    def _load_ballots(self, key: tuple) -> dict:
+        return dict(self._db.execute(
+            "SELECT voter, trip_index FROM ballots WHERE namespace = ? AND session_id = ?", key).fetchall())
+
+    # Cache
+
+    def _remember(self, key: tuple, state: SessionState):
+        self._cache[key] = state
+        self._resize(state)
+        self._evict(time.monotonic())
+
+    def _resize(self, state: SessionState, added: object = None):
+        # Keep the running byte gauge in step after a session changes; appends only count the
+        # new value instead of re-measuring the whole session
+        if self.shared:
+            # Nothing is cached; the throwaway state isn't memory the store holds on to
+            return
+        size = state.size + _approx_size(added) if added is not None else state.approx_size()
+        self._bytes += size - state.size
+        state.size = size
+
+    def evict_idle(self):
+        """Drop idle sessions now rather than on the next access (e.g. from a periodic task)."""
+        self._evict(time.monotonic())
+
+    def _evict(self, now: float):
+        # The cache is in access order, so idle sessions are always at the front
+        while self._cache:
+            key, oldest = next(iter(self._cache.items()))
+            if len(self._cache) <= self.max_sessions and now - oldest.last_access <= self.ttl:
+                break
+            del self._cache[key]
+            self._bytes -= oldest.size
+            self.evictions += 1
+            for listener in self.eviction_listeners:
+                listener(key)
+
+    # Writes
+
+    def _session(self, namespace: str, session_id: int) -> SessionState:
+        # Shared mode works on a throwaway state; only the SQL writes matter
+        state = None if self.shared else self.get(namespace, session_id)
+        if state is None:
+            state = SessionState()
+            if not self.shared:
+                self._remember((namespace, session_id), state)
+        return state
+
+    def _touch(self, namespace: str, session_id: int) -> tuple:
+        now = time.time()
+        return (
+            "INSERT INTO sessions (namespace, session_id, created_at, updated_at) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (namespace, session_id) DO UPDATE SET updated_at = excluded.updated_at",
+            (namespace, session_id, now, now),
+        )
+
+    def add_preference(self, namespace: str, session_id: int, preference: dict):
+        state = self._session(namespace, session_id)
+        row = tuple(str(preference[field]) for field in PREFERENCE_FIELDS)
+        state.preferences.append(row)
+        self._resize(state, added=row)
+        self._write(
+            self._touch(namespace, session_id),
+            ("INSERT INTO preferences (namespace, session_id, user, location, budget, dates, mode)"
+             " VALUES (?, ?, ?, ?, ?, ?, ?)", (namespace, session_id, *row)),
+        )
+
+    def clear_preferences(self, namespace: str, session_id: int, user: str | None = None):
+        # Clears one user's preferences, or everyone's when user is None
+        state = self._session(namespace, session_id)
+        if user is None:
+            state.preferences = []
+            self._write(self._touch(namespace, session_id),
+                        ("DELETE FROM preferences WHERE namespace = ? AND session_id = ?", (namespace, session_id)))
+        else:
+            state.preferences = [row for row in state.preferences if row[0] != user]
+            self._write(self._touch(namespace, session_id),
+                        ("DELETE FROM preferences WHERE namespace = ? AND session_id = ? AND user = ?",
+                         (namespace, session_id, user)))
+        self._resize(state)
+
+    def set_trips(self, namespace: str, session_id: int, trips: list[dict]):
+        # New recommendations clear every ballot
+        state = self._session(namespace, session_id)
+        state.trips = list(trips)
+        state.ballots = BallotBox(len(trips)) if trips else None
+        self._resize(state)
+        key = (namespace, session_id)
+        statements = [
+            self._touch(namespace, session_id),
+            ("DELETE FROM trips WHERE namespace = ? AND session_id = ?", key),
+            ("DELETE FROM ballots WHERE namespace = ? AND session_id = ?", key),
+        ]
+        for index, trip in enumerate(trips):
+            statements.append(("INSERT INTO trips (namespace, session_id, trip_index, data) VALUES (?, ?, ?, ?)",
+                               (namespace, session_id, index, json.dumps(trip))))
+        self._write(*statements)
+
+    def cast_vote(self, namespace: str, session_id: int, voter: str, trip_index: int) -> dict[int, int]:
+        """Put ``voter``'s one ballot on trip ``trip_index``, moving it if they voted before.
+        Returns the vote counts that changed by trip index (empty if nothing did)."""
+        return self.cast_votes(namespace, session_id, [(voter, trip_index)])
+
+    def cast_votes(self, namespace: str, session_id: int, ballots: list[tuple[str, int]]) -> dict[int, int]:
+        """Cast many ``(voter, trip_index)`` ballots at once, in one transaction; later ballots of
+        the same voter win. Ballots for trips the session doesn't have are ignored."""
+        if self.shared:
+            return self._cast_shared((namespace, session_id), ballots)
+
+        state = self._session(namespace, session_id)
+        if state.ballots is None:
+            return {}
+        changed = {}
+        statements = []
+        for voter, index in ballots:
+            voter = str(voter)
+            if not 0 <= index < len(state.ballots.board):
+                continue
+            new_voter = voter not in state.ballots.ballots
+            delta = state.ballots.cast(voter, index)
+            if not delta:
+                continue
+            changed.update(delta)
+            if new_voter:
+                self._resize(state, added=(voter, index))
+            statements.append(
+                ("INSERT INTO ballots (namespace, session_id, voter, trip_index) VALUES (?, ?, ?, ?)"
+                 " ON CONFLICT (namespace, session_id, voter) DO UPDATE SET trip_index = excluded.trip_index",
+                 (namespace, session_id, voter, index)))
+        if statements:
+            self._write(*statements)
+        return changed
+
+    def _cast_shared(self, key: tuple, ballots: list[tuple[str, int]]) -> dict[int, int]:
+        # One transaction: concurrent ballots from other workers are never lost
+        touched = set()
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            (trips,) = self._db.execute("SELECT COUNT(*) FROM trips WHERE namespace = ? AND session_id = ?",
+                                        key).fetchone()
+            for voter, index in ballots:
+                if not 0 <= index < trips:
+                    continue
+                previous = self._db.execute(
+                    "SELECT trip_index FROM ballots WHERE namespace = ? AND session_id = ? AND voter = ?",
+                    (*key, str(voter))).fetchone()
+                if previous is not None and previous[0] == index:
+                    continue
+                self._db.execute(
+                    "INSERT INTO ballots (namespace, session_id, voter, trip_index) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (namespace, session_id, voter) DO UPDATE SET trip_index = excluded.trip_index",
+                    (*key, str(voter), index))
+                touched.add(index)
+                if previous is not None:
+                    touched.add(previous[0])
+            if not touched:
+                return {}
+            counts = dict(self._db.execute(
+                "SELECT trip_index, COUNT(*) FROM ballots WHERE namespace = ? AND session_id = ? GROUP BY trip_index",
+                key).fetchall())
+        return {index: counts.get(index, 0) for index in touched}
+
+    # Links
+
+    def link(self, namespace: str, session_id: int, target_namespace: str, target_id: int):
+        """Make a session stand for another one, e.g. a Discord guild planning the same trip as
+        a web session; ``resolve`` follows the link."""
+        self._remember_link((namespace, session_id), (target_namespace, target_id))
+        self._write(
+            ("INSERT INTO session_links (namespace, session_id, target_namespace, target_id) VALUES (?, ?, ?, ?)"
+             " ON CONFLICT (namespace, session_id) DO UPDATE SET target_namespace = excluded.target_namespace,"
+             " target_id = excluded.target_id", (namespace, session_id, target_namespace, target_id)),
+        )
+
+    def unlink(self, namespace: str, session_id: int):
+        self._remember_link((namespace, session_id), None)
+        self._write(("DELETE FROM session_links WHERE namespace = ? AND session_id = ?", (namespace, session_id)))
+
+    def resolve(self, namespace: str, session_id: int) -> tuple:
+        """The ``(namespace, session_id)`` a session's reads and writes go to: its link target, or itself."""
+        key = (namespace, session_id)
+        if self.shared:
+            # Another process may have linked it
+            return self._load_link(key) or key
+        if key in self._links:
+            self._links.move_to_end(key)
+        else:
+            self._remember_link(key, self._load_link(key))
+        return self._links[key] or key
+
+    def _remember_link(self, key: tuple, target: tuple | None):
+        self._links[key] = target
+        self._links.move_to_end(key)
+        if len(self._links) > self.max_sessions:
+            self._links.popitem(last=False)
+
+    def _load_link(self, key: tuple) -> tuple | None:
+        if self._db is None:
+            return None
+        return self._db.execute(
+            "SELECT target_namespace, target_id FROM session_links WHERE namespace = ? AND session_id = ?",
+            key).fetchone()
+
+    # Batching
+
+    def _write(self, *statements: tuple):
+        # Statements passed together always commit in the same transaction
+        if self._db is None:
+            return
+        if self.shared:
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                for sql, params in statements:
+                    self._db.execute(sql, params)
+            return
+        self._pending.extend(statements)
+        if len(self._pending) >= self.batch_size:
+            self._try_flush()
+        elif self._flush_handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # No event loop (scripts, benchmarks): nothing would run a timer, write through now
+                self.flush()
+                return
+            self._flush_handle = loop.call_later(self.flush_interval, self._try_flush)
+
+    def _try_flush(self):
+        # Batched writes that fail (e.g. "database is locked" with several processes on one
+        # file) stay queued and are retried after flush_interval
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is None:
+                # Nothing would run a retry timer: let the caller see the error
+                raise
+            print(f"Error writing {len(self._pending)} session change(s), retrying: {e}")
+            if self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.flush_interval, self._try_flush)
+
+    def flush(self):
+        """Commit the queued writes; if the transaction fails they stay queued and the error is raised."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending or self._db is None:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            with self._db:
+                self._db.execute("BEGIN")
+                for sql, params in pending:
+                    self._db.execute(sql, params)
+        except sqlite3.Error:
+            # Rolled back: put the batch back ahead of anything queued since
+            self._pending[:0] = pending
+            self.flush_failures += 1
+            raise
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> dict:
+        return {
+            "live_sessions": len(self._cache),
+            "approx_bytes": self._bytes,
+            "evictions": self.evictions,
+            "loads": self.loads,
+            "pending_writes": len(self._pending),
+            "flush_failures": self.flush_failures,
+        }
@@ -0,0 +1,241 @@
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+from .geocode_cache import normalize_location
+from .llm_cache import _normalize_text
+from .prompt_builder import _budget_range
+
+# Past recommendations at least this similar to a session's preferences are served as they are...
+SIMILARITY_SERVE_THRESHOLD = float(os.getenv("SIMILARITY_SERVE_THRESHOLD", 0.95))
+# ...and at least this similar seed a short refinement prompt instead of a full one (>1 disables)
+SIMILARITY_SEED_THRESHOLD = float(os.getenv("SIMILARITY_SEED_THRESHOLD", 0.8))
+SIMILARITY_CACHE_MAX_ENTRIES = int(os.getenv("SIMILARITY_CACHE_MAX_ENTRIES", 4096))
+SIMILARITY_CACHE_TTL = float(os.getenv("SIMILARITY_CACHE_TTL", 24 * 60 * 60))
+
+# Feature blocks: hashed location trigrams, log-scale budget buckets, months, hashed mode trigrams
+LOCATION_DIMENSIONS = 64
+BUDGET_DIMENSIONS = 16
+MONTH_DIMENSIONS = 12
+MODE_DIMENSIONS = 32
+DIMENSIONS = LOCATION_DIMENSIONS + BUDGET_DIMENSIONS + MONTH_DIMENSIONS + MODE_DIMENSIONS
+# Share of the similarity each block contributes; the destination matters most
+WEIGHTS = {"location": 0.55, "budget": 0.15, "month": 0.15, "mode": 0.15}
+# Budget buckets are half powers of two from here: 100, 141, 200, 283, 400...
+BUDGET_BASE = 100.0
+
+MONTHS = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+_MONTH_NAME = re.compile(r"\b(" + "|".join(MONTHS) + r")[a-z]*\b")
+# "3/10-3/16", "03-10": the leading number is the month
+_NUMERIC_MONTH = re.compile(r"\b(1[0-2]|0?[1-9])[/-]\d")
+# "relaxation" / "relaxing" / "relax", "culture" / "cultural"
+_MODE_SUFFIXES = ("ations", "ation", "ing", "ed", "al", "e", "s")
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _trigrams(text: str, dimensions: int) -> np.ndarray:
+    # Hashed character trigrams, so spelling variants ("Barcelona" / "Barcelonna") stay close
+    vector = np.zeros(dimensions, dtype=np.float32)
+    padded = f"  {text} "
+    for start in range(len(padded) - 2):
+        vector[zlib.crc32(padded[start:start + 3].encode()) % dimensions] += 1
+    return _unit(vector)
+
+
+def _stem(mode: str) -> str:
+    words = []
+    for word in _normalize_text(mode).split():
+        for suffix in _MODE_SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+                word = word[:-len(suffix)]
+                break
+        words.append(word)
+    return " ".join(words)
+
+
+def _budget(budget) -> np.ndarray:
+    # Soft-assigned to the two nearest buckets, so 1,500 and 1,600 land almost together
+    vector = np.zeros(BUDGET_DIMENSIONS, dtype=np.float32)
+    budget = _budget_range(budget)
+    if budget is None or budget[0] + budget[1] <= 0:
+        return vector
+    # A range counts as its midpoint
+    amount = (budget[0] + budget[1]) / 2
+    position = min(max(2 * np.log2(amount / BUDGET_BASE), 0.0), BUDGET_DIMENSIONS - 1.0)
+    low = int(position)
+    high = min(low + 1, BUDGET_DIMENSIONS - 1)
+    vector[low] += 1 - (position - low)
+    vector[high] += position - low
+    return _unit(vector)
+
+
+def _month_set(dates) -> set[int]:
+    text = str(dates).casefold()
+    months = {MONTHS.index(match[:3]) for match in _MONTH_NAME.findall(text)}
+    months.update(int(match) - 1 for match in _NUMERIC_MONTH.findall(text))
+    return months
+
+
+def _months(dates) -> np.ndarray:
+    # Each month mentioned, with half weight on its neighbours (travel dates are rarely exact)
+    vector = np.zeros(MONTH_DIMENSIONS, dtype=np.float32)
+    for month in _month_set(dates):
+        vector[month] += 1
+        vector[(month - 1) % 12] += 0.5
+        vector[(month + 1) % 12] += 0.5
+    return _unit(vector)
+
+
+def preference_vector(preference: dict) -> np.ndarray:
+    # The full location: "Paris, France" and "Paris, Texas" only share part of their trigrams
+    location = normalize_location(str(preference["location"]))
+    return np.concatenate([
+        _trigrams(location, LOCATION_DIMENSIONS) * np.sqrt(WEIGHTS["location"]),
+        _budget(preference["budget"]) * np.sqrt(WEIGHTS["budget"]),
+        _months(preference["dates"]) * np.sqrt(WEIGHTS["month"]),
+        _trigrams(_stem(preference["mode"]), MODE_DIMENSIONS) * np.sqrt(WEIGHTS["mode"]),
+    ]).astype(np.float32)
+
+
+def session_vector(preferences: list[dict]) -> np.ndarray:
+    """Unit vector for a set of preferences; who submitted them and in what order doesn't matter."""
+    return _unit(np.sum([preference_vector(preference) for preference in preferences], axis=0))
+
+
+def session_signature(preferences: list[dict]) -> tuple[frozenset, frozenset]:
+    """The destinations and travel months of a set of preferences, which must match exactly for a
+    stored recommendation to be served as is (a similar vector alone only seeds a refinement)."""
+    locations = frozenset(normalize_location(str(preference["location"])) for preference in preferences)
+    months = frozenset(month for preference in preferences for month in _month_set(preference["dates"]))
+    return locations, months
+
+
+class SimilarMatch:
+    __slots__ = ("trips", "similarity", "latency", "serve")
+
+    def __init__(self, trips: list[dict], similarity: float, latency: float, serve: bool):
+        self.trips = trips
+        # Seconds the stored recommendation took to generate
+        self.latency = latency
+        self.similarity = similarity
+        # False: close enough to seed a refinement prompt, not to serve as is
+        self.serve = serve
+
+
+class SimilarityCache:
+    """Past recommendations indexed by preference vector, for sessions that want nearly the same trip.
+
+    Vectors live in one preallocated NumPy matrix, so a lookup is a single matrix-vector product
+    over every entry. When full, the least recently used (or an expired) entry is replaced.
+    Exact repeats are still answered by the agent's ResponseCache; this one also serves
+    "hawaii, 1,600, Apr, relaxing" for "Hawaii, 1500, April, relaxation". A stored entry is
+    only served when its destinations and months are the same (``session_signature``);
+    otherwise even a very close match just seeds a refinement prompt.
+    """
+
+    def __init__(self, serve_threshold: float = SIMILARITY_SERVE_THRESHOLD,
+                 seed_threshold: float = SIMILARITY_SEED_THRESHOLD, max_entries: int = SIMILARITY_CACHE_MAX_ENTRIES,
+                 ttl: float = SIMILARITY_CACHE_TTL):
+        self.serve_threshold = serve_threshold
+        self.seed_threshold = seed_threshold
+        self.ttl = ttl
+        self._vectors = np.zeros((max_entries, DIMENSIONS), dtype=np.float32)
+        self._last_used = np.zeros(max_entries)
+        self._expires = np.zeros(max_entries)
+        self._entries = [None] * max_entries
+        self._size = 0
+
+        self.hits = 0
+        self.seeded = 0
+        self.misses = 0
+        self.evictions = 0
+        self.latency_saved = 0.0
+        self.lookup_seconds = 0.0
+
+    def _scores(self, vector: np.ndarray, now: float) -> np.ndarray:
+        scores = self._vectors[:self._size] @ vector
+        # Expired entries never match
+        scores[self._expires[:self._size] <= now] = -1.0
+        return scores
+
+    def lookup(self, preferences: list[dict]) -> SimilarMatch | None:
+        """The most similar past recommendation above the seed threshold, or ``None``."""
+        start = time.perf_counter()
+        try:
+            if not preferences or self._size == 0:
+                self.misses += 1
+                return None
+            now = time.monotonic()
+            signature = session_signature(preferences)
+            scores = self._scores(session_vector(preferences), now)
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < self.seed_threshold:
+                self.misses += 1
+                return None
+            self._last_used[best] = now
+            trips, latency, stored_signature = self._entries[best]
+            serve = similarity >= self.serve_threshold and signature == stored_signature
+            if serve:
+                self.hits += 1
+                self.latency_saved += latency
+            else:
+                self.seeded += 1
+            return SimilarMatch(trips, similarity, latency, serve)
+        finally:
+            self.lookup_seconds += time.perf_counter() - start
+
+    def record_refinement(self, match: SimilarMatch, seconds: float):
+        """Count the time a seeded (refinement) call saved against generating from scratch."""
+        self.latency_saved += max(0.0, match.latency - seconds)
+
+    def add(self, preferences: list[dict], trips: list[dict], latency: float):
+        """Remember a session's recommended trips and how many seconds generating them took."""
+        if not preferences or not trips or not len(self._entries):
+            return
+        vector = session_vector(preferences)
+        signature = session_signature(preferences)
+        now = time.monotonic()
+        if self._size:
+            scores = self._scores(vector, now)
+            best = int(np.argmax(scores))
+            # The same preferences again: refresh that entry instead of adding a twin
+            if scores[best] >= 0.999 and self._entries[best][2] == signature:
+                self._store(best, vector, (trips, latency, signature), now)
+                return
+        if self._size < len(self._entries):
+            slot = self._size
+            self._size += 1
+        else:
+            # Expired entries first, then the least recently used
+            slot = int(np.argmin(np.where(self._expires <= now, -np.inf, self._last_used)))
+            self.evictions += 1
+        self._store(slot, vector, (trips, latency, signature), now)
+
+    def _store(self, slot: int, vector: np.ndarray, entry: tuple, now: float):
+        self._vectors[slot] = vector
+        # (trips, generation seconds, signature)
+        self._entries[slot] = entry
+        self._last_used[slot] = now
+        self._expires[slot] = now + self.ttl
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.seeded + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "seeded": self.seeded,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "seed_rate": self.seeded / lookups if lookups else 0.0,
+            "latency_saved_seconds": round(self.latency_saved, 3),
+            "mean_lookup_ms": self.lookup_seconds / lookups * 1000 if lookups else 0.0,
+        }
@@ -0,0 +1,162 @@
+import asyncio
+import functools
+import os
+
+from .vote_engine import Leaderboard
+
+# Opt-in: SPECULATIVE_ITINERARIES=1 pre-generates the leading trip's itinerary while voting is going on
+SPECULATIVE_ITINERARIES = os.getenv("SPECULATIVE_ITINERARIES", "").lower() in ("1", "true", "yes")
+# Start once the leader is this many votes ahead of the runner-up...
+SPECULATION_MARGIN = int(os.getenv("SPECULATION_MARGIN", 2))
+# ...or once it has been in the lead with no new votes for this many seconds
+SPECULATION_QUIET_PERIOD = float(os.getenv("SPECULATION_QUIET_PERIOD", 30))
+# A finished itinerary is held for a finalize this long, then left to the response cache alone
+SPECULATION_RESULT_TTL = float(os.getenv("SPECULATION_RESULT_TTL", 5 * 60))
+
+
+def leading_trip(board: Leaderboard) -> tuple[int | None, int]:
+    """Return ``(leader's trip index, margin over the runner-up)``; no leader while tied or without votes."""
+    leader, _ = board.leader()
+    margin = board.margin()
+    return (leader, margin) if leader is not None and margin > 0 else (None, 0)
+
+
+class _Speculation:
+    __slots__ = ("trip_index", "task", "expiry")
+
+    def __init__(self, trip_index: int, task: asyncio.Task):
+        self.trip_index = trip_index
+        self.task = task
+        # Timer that forgets the finished result
+        self.expiry = None
+
+
+class Speculator:
+    """Generates the itinerary for a session's leading trip in the background while votes come in.
+
+    ``generate(trip)`` is an async callable returning the itinerary text; it should cache its
+    result (e.g. ``run_command`` with the itinerary cache key) so a finalize that misses the
+    speculation still benefits. Sessions are any hashable key, e.g. ``("discord", guild_id)``.
+    Finished results are only held for ``result_ttl`` seconds; call ``reset`` for sessions that
+    go away (e.g. from ``SessionStore.eviction_listeners``).
+    """
+
+    def __init__(self, generate, margin: int = SPECULATION_MARGIN, quiet_period: float = SPECULATION_QUIET_PERIOD,
+                 result_ttl: float = SPECULATION_RESULT_TTL):
+        self.generate = generate
+        self.margin = margin
+        self.quiet_period = quiet_period
+        self.result_ttl = result_ttl
+        self._speculations = {}
+        self._timers = {}
+
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.used = 0
+        # Finished itineraries for a trip that lost the lead, or not finalized within result_ttl
+        self.wasted = 0
+
+    def observe(self, session, board: Leaderboard, trips: list[dict]):
+        """Call after votes are cast with the session's leaderboard and recommended trips."""
+        timer = self._timers.pop(session, None)
+        if timer is not None:
+            timer.cancel()
+
+        leader, margin = leading_trip(board)
+        current = self._speculations.get(session)
+        if current is not None and current.trip_index != leader:
+            self._drop(session)
+        if leader is None or (current is not None and current.trip_index == leader) or leader >= len(trips):
+            return
+
+        if margin >= self.margin:
+            self._start(session, leader, trips[leader])
+        else:
+            # Not a clear lead yet: speculate if nobody else votes for a while
+            self._timers[session] = asyncio.get_running_loop().call_later(
+                self.quiet_period, self._quiet, session, leader, trips[leader])
+
+    def _quiet(self, session, trip_index: int, trip: dict):
+        self._timers.pop(session, None)
+        if session not in self._speculations:
+            self._start(session, trip_index, trip)
+
+    def _start(self, session, trip_index: int, trip: dict):
+        self.started += 1
+        task = asyncio.ensure_future(self.generate(trip))
+        self._speculations[session] = _Speculation(trip_index, task)
+        task.add_done_callback(functools.partial(self._finished, session))
+
+    def _finished(self, session, task: asyncio.Task):
+        if task.cancelled():
+            return
+        speculation = self._speculations.get(session)
+        current = speculation is not None and speculation.task is task
+        if task.exception() is not None:
+            print(f"Speculative itinerary failed: {task.exception()}")
+            if current:
+                del self._speculations[session]
+            return
+        self.completed += 1
+        if current:
+            speculation.expiry = asyncio.get_running_loop().call_later(self.result_ttl, self._expire, session, task)
+
+    def _expire(self, session, task: asyncio.Task):
+        speculation = self._speculations.get(session)
+        if speculation is not None and speculation.task is task:
+            # Still in the response cache, in case the session is finalized later
+            del self._speculations[session]
+            self.wasted += 1
+
+    def _drop(self, session):
+        speculation = self._speculations.pop(session, None)
+        if speculation is None:
+            return
+        if speculation.expiry is not None:
+            speculation.expiry.cancel()
+        if speculation.task.done():
+            # Kept in the response cache in case this trip wins after all
+            if not speculation.task.cancelled() and speculation.task.exception() is None:
+                self.wasted += 1
+        else:
+            speculation.task.cancel()
+            self.cancelled += 1
+
+    def reset(self, session):
+        """Forget a session's speculation, e.g. when new trips are recommended or the session is evicted."""
+        timer = self._timers.pop(session, None)
+        if timer is not None:
+            timer.cancel()
+        self._drop(session)
+
+    async def claim(self, session, trip_index: int) -> str | None:
+        """The speculated itinerary for trip ``trip_index`` (waiting for it if still running), or ``None``."""
+        speculation = self._speculations.get(session)
+        if speculation is None or speculation.trip_index != trip_index:
+            return None
+        try:
+            # Shielded: a finalize that gives up must not kill the shared generation
+            result = await asyncio.shield(speculation.task)
+        except asyncio.CancelledError:
+            if not speculation.task.cancelled():
+                raise
+            return None
+        except Exception:
+            return None
+        if self._speculations.get(session) is speculation:
+            del self._speculations[session]
+            if speculation.expiry is not None:
+                speculation.expiry.cancel()
+        self.used += 1
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "used": self.used,
+            "wasted": self.wasted,
+            "in_flight": sum(1 for s in self._speculations.values() if not s.task.done()),
+        }
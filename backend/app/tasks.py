@@ -0,0 +1,49 @@
+import asyncio
+
+
+class Coalescer:
+    """At most one task per key at a time: concurrent callers for the same key share it
+    (e.g. one upstream request for a geocode, a weather cell or a places tile)."""
+
+    def __init__(self):
+        self._tasks = {}
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def get(self, key) -> asyncio.Future | None:
+        return self._tasks.get(key)
+
+    def start(self, key, factory) -> asyncio.Future:
+        """The running task for ``key``, or a new one for ``factory()`` (a coroutine function)."""
+        task = self._tasks.get(key)
+        if task is not None:
+            return task
+        task = self._tasks[key] = asyncio.ensure_future(factory())
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return task
+
+    async def run(self, key, factory):
+        return await shared(self.start(key, factory))
+
+
+async def shared(task: asyncio.Future):
+    # Shielded so one caller going away doesn't cancel the task for everyone sharing it
+    return await asyncio.shield(task)
+
+
+class BackgroundTasks:
+    """Fire-and-forget tasks, referenced until they finish (the event loop only keeps weak
+    references, so an unreferenced task can be garbage collected mid-flight)."""
+
+    def __init__(self):
+        self._tasks = set()
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
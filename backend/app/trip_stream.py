@@ -0,0 +1,91 @@
+import json
+
+REQUIRED_TRIP_FIELDS = ("name", "dates", "trip_style", "budget", "activities")
+
+
+def validate_trip(trip) -> str | None:
+    """Return an error message if ``trip`` is not a usable recommendation, else ``None``."""
+    if not isinstance(trip, dict):
+        return "Invalid trip data format."
+    for field in REQUIRED_TRIP_FIELDS:
+        if field not in trip:
+            return f"Missing required field '{field}' in trip data."
+    if not isinstance(trip["activities"], list):
+        return "'activities' field must be a list."
+    return None
+
+
+class TripStreamParser:
+    """Incremental parser for a streamed JSON array of trips.
+
+    ``feed()`` takes text chunks as they arrive and returns every trip object whose closing
+    brace has been seen, already validated. Trips are the objects directly inside the first
+    array; anything around it (Markdown fences, "Here are some trips:", a {"trips": ...}
+    wrapper) is ignored, so fenced or prefixed output parses without another round-trip.
+    Invalid trips are collected in ``rejected``.
+    """
+
+    def __init__(self):
+        self.trips = []
+        self.rejected = []
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        # Stack depth at which trip objects open: inside the first array seen
+        self._trip_depth = None
+        self._current = None
+
+    def feed(self, text: str) -> list[dict]:
+        completed = []
+        for char in text:
+            if self._current is not None:
+                self._current.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                # Strings only matter once we're inside the JSON
+                if self._stack:
+                    self._in_string = True
+            elif char in "[{":
+                if char == "[" and self._trip_depth is None:
+                    # Also finds the list inside a wrapper like {"trips": [...]}
+                    self._trip_depth = len(self._stack) + 1
+                self._stack.append(char)
+                if char == "{" and self._trip_depth is not None and len(self._stack) == self._trip_depth + 1:
+                    self._current = [char]
+            elif char in "]}" and self._stack:
+                self._stack.pop()
+                if char == "}" and self._current is not None and len(self._stack) == self._trip_depth:
+                    trip = self._finish_object("".join(self._current))
+                    self._current = None
+                    if trip is not None:
+                        completed.append(trip)
+        return completed
+
+    def _finish_object(self, text: str) -> dict | None:
+        try:
+            trip = json.loads(text)
+        except json.JSONDecodeError as e:
+            self.rejected.append(f"Invalid JSON for a trip: {e}")
+            return None
+        error = validate_trip(trip)
+        if error:
+            self.rejected.append(error)
+            return None
+        self.trips.append(trip)
+        return trip
+
+
+def parse_trips(text: str) -> tuple[list[dict], list[str]]:
+    """Parse a complete response in one go; returns ``(trips, rejected)``."""
+    parser = TripStreamParser()
+    parser.feed(text)
+    return parser.trips, parser.rejected
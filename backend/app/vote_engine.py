@@ -0,0 +1,168 @@
+import asyncio
+import os
+
+# Votes for one session arriving within this many seconds of each other are cast together
+VOTE_BATCH_WINDOW = float(os.getenv("VOTE_BATCH_WINDOW", 0.1))
+
+
+class Leaderboard:
+    """Vote counts per trip index, kept in rank order as votes come and go.
+
+    Trips with equal counts sit next to each other in ``order``. A vote moves its trip to the
+    edge of its group with one swap, and it is then the first (or last) of the neighbouring
+    count, so a vote, the leader and its margin are O(1) and the full ranking is O(k). Ties are
+    broken by the last move: a trip that gains a vote ranks behind the trips already at its new
+    count, and one that loses a vote ranks ahead of them.
+    """
+
+    __slots__ = ("counts", "order", "position", "_first", "_last")
+
+    def __init__(self, trips: int, counts: list[int] | None = None):
+        self.counts = list(counts) if counts is not None else [0] * trips
+        # Trip indexes, most votes first; ties start out in trip order
+        self.order = sorted(range(trips), key=lambda index: (-self.counts[index], index))
+        self.position = [0] * trips
+        # Count -> first and last position holding it
+        self._first = {}
+        self._last = {}
+        for position, index in enumerate(self.order):
+            self.position[index] = position
+            self._first.setdefault(self.counts[index], position)
+            self._last[self.counts[index]] = position
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def _swap(self, a: int, b: int):
+        order = self.order
+        order[a], order[b] = order[b], order[a]
+        self.position[order[a]] = a
+        self.position[order[b]] = b
+
+    def increment(self, index: int) -> int:
+        count = self.counts[index]
+        # Swap to the front of this count's group, which borders the next count up
+        head = self._first[count]
+        self._swap(self.position[index], head)
+        if self._last[count] == head:
+            del self._first[count], self._last[count]
+        else:
+            self._first[count] = head + 1
+        if count + 1 in self._last:
+            self._last[count + 1] = head
+        else:
+            self._first[count + 1] = self._last[count + 1] = head
+        self.counts[index] = count + 1
+        return count + 1
+
+    def decrement(self, index: int) -> int:
+        count = self.counts[index]
+        if count == 0:
+            raise ValueError(f"Trip {index} has no votes to remove")
+        # Swap to the back of this count's group, which borders the next count down
+        tail = self._last[count]
+        self._swap(self.position[index], tail)
+        if self._first[count] == tail:
+            del self._first[count], self._last[count]
+        else:
+            self._last[count] = tail - 1
+        if count - 1 in self._first:
+            self._first[count - 1] = tail
+        else:
+            self._first[count - 1] = self._last[count - 1] = tail
+        self.counts[index] = count - 1
+        return count - 1
+
+    def leader(self) -> tuple[int | None, int]:
+        """``(trip index, votes)`` of the leading trip, or ``(None, 0)`` before any votes."""
+        if not self.order or self.counts[self.order[0]] == 0:
+            return None, 0
+        return self.order[0], self.counts[self.order[0]]
+
+    def margin(self) -> int:
+        """How many votes the leader is ahead of the runner-up (0 while tied)."""
+        if not self.order:
+            return 0
+        runner_up = self.counts[self.order[1]] if len(self.order) > 1 else 0
+        return self.counts[self.order[0]] - runner_up
+
+    def ranking(self) -> list[tuple[int, int]]:
+        return [(index, self.counts[index]) for index in self.order]
+
+
+class BallotBox:
+    """One ballot per voter for a session's trips; voting again moves the voter's ballot."""
+
+    __slots__ = ("ballots", "board")
+
+    def __init__(self, trips: int, ballots: dict | None = None):
+        # Voter -> trip index
+        self.ballots = dict(ballots or {})
+        counts = [0] * trips
+        for index in self.ballots.values():
+            counts[index] += 1
+        self.board = Leaderboard(trips, counts)
+
+    def cast(self, voter: str, index: int) -> dict[int, int]:
+        """Record ``voter``'s ballot for trip ``index``; returns the counts that changed."""
+        if not 0 <= index < len(self.board):
+            raise ValueError(f"No trip {index}")
+        previous = self.ballots.get(voter)
+        if previous == index:
+            return {}
+        changed = {}
+        if previous is not None:
+            changed[previous] = self.board.decrement(previous)
+        self.ballots[voter] = index
+        changed[index] = self.board.increment(index)
+        return changed
+
+
+class VoteBatcher:
+    """Collects the votes for each session for ``window`` seconds and casts them in one call.
+
+    ``cast_votes(session, ballots)`` applies a list of ``(voter, trip index)`` and returns the
+    counts that changed; ``on_cast(session, changed)``, when given, then runs once per batch
+    (broadcasts, speculation). A burst of hundreds of votes on a large server becomes a
+    handful of store transactions and status refreshes instead of one per vote.
+    """
+
+    def __init__(self, cast_votes, on_cast=None, window: float = VOTE_BATCH_WINDOW):
+        self.cast_votes = cast_votes
+        self.on_cast = on_cast
+        self.window = window
+        self._pending = {}
+
+        self.votes = 0
+        self.batches = 0
+
+    async def submit(self, session, voter: str, index: int):
+        """Queue a vote; returns once its batch has been cast (raising if casting failed)."""
+        self.votes += 1
+        pending = self._pending.get(session)
+        if pending is None:
+            pending = self._pending[session] = ([], asyncio.get_running_loop().create_future())
+            asyncio.get_running_loop().call_later(self.window, self._flush, session)
+        ballots, done = pending
+        ballots.append((voter, index))
+        # Shielded: one voter giving up doesn't cancel the batch for everyone else
+        await asyncio.shield(done)
+
+    def _flush(self, session):
+        ballots, done = self._pending.pop(session)
+        self.batches += 1
+        try:
+            changed = self.cast_votes(session, ballots)
+            if self.on_cast is not None and changed:
+                self.on_cast(session, changed)
+        except Exception as e:
+            done.set_exception(e)
+            return
+        done.set_result(changed)
+
+    def stats(self) -> dict:
+        return {
+            "votes": self.votes,
+            "batches": self.batches,
+            "pending_sessions": len(self._pending),
+        }
@@ -0,0 +1,111 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+
+from .http_client import HTTPClient
+from .rate_limit import TokenBucket
+from .tasks import Coalescer
+
+# OpenWeatherMap refreshes current conditions about every 10 minutes
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", 10 * 60))
+# Points in the same cell (~2km) share one upstream call
+WEATHER_CELL_DEGREES = float(os.getenv("WEATHER_CELL_DEGREES", 0.02))
+WEATHER_CACHE_MAX_CELLS = 10_000
+# Free tier: 60 calls per minute
+WEATHER_REQUESTS_PER_SECOND = float(os.getenv("WEATHER_REQUESTS_PER_SECOND", 1.0))
+WEATHER_MAX_CONCURRENCY = 8
+
+
+def weather_cell(lat: float, lon: float, cell_degrees: float = WEATHER_CELL_DEGREES) -> tuple[int, int]:
+    return math.floor(lat / cell_degrees), math.floor(lon / cell_degrees)
+
+
+class WeatherService:
+    """Current weather from OpenWeatherMap, cached per grid cell for ``ttl`` seconds.
+
+    Each cell is fetched for its centre point, so every coordinate inside it gets the same
+    answer. Concurrent requests for a cell share one upstream call.
+    """
+
+    def __init__(self, http_client: HTTPClient, url: str, api_key: str | None,
+                 ttl: float = WEATHER_CACHE_TTL, cell_degrees: float = WEATHER_CELL_DEGREES,
+                 max_cells: int = WEATHER_CACHE_MAX_CELLS, rate_limiter: TokenBucket | None = None):
+        self.http_client = http_client
+        self.url = url
+        self.api_key = api_key
+        self.ttl = ttl
+        self.cell_degrees = cell_degrees
+        self.max_cells = max_cells
+        # A short burst is fine; sustained traffic is held to the provider's rate
+        self.rate_limiter = rate_limiter or TokenBucket(WEATHER_REQUESTS_PER_SECOND, capacity=10)
+        self._semaphore = asyncio.Semaphore(WEATHER_MAX_CONCURRENCY)
+        self._cache = OrderedDict()
+        self._inflight = Coalescer()
+
+        self.hits = 0
+        self.misses = 0
+        self.upstream_requests = 0
+
+    def _cached(self, cell: tuple[int, int]) -> dict | None:
+        entry = self._cache.get(cell)
+        if entry is None:
+            return None
+        data, fetched_at = entry
+        if time.monotonic() - fetched_at > self.ttl:
+            del self._cache[cell]
+            return None
+        self._cache.move_to_end(cell)
+        return data
+
+    async def _fetch(self, cell: tuple[int, int]) -> dict:
+        lat = round((cell[0] + 0.5) * self.cell_degrees, 5)
+        lon = round((cell[1] + 0.5) * self.cell_degrees, 5)
+        params = {"lat": lat, "lon": lon, "appid": self.api_key, "units": "metric"}
+        async with self._semaphore:
+            await self.rate_limiter.acquire()
+            self.upstream_requests += 1
+            data = await self.http_client.get_json(self.url, params=params)
+        self._cache[cell] = (data, time.monotonic())
+        self._cache.move_to_end(cell)
+        if len(self._cache) > self.max_cells:
+            self._cache.popitem(last=False)
+        return data
+
+    async def _cell_weather(self, cell: tuple[int, int]) -> dict:
+        data = self._cached(cell)
+        if data is not None:
+            self.hits += 1
+            return data
+        self.misses += 1
+        return await self._inflight.run(cell, lambda: self._fetch(cell))
+
+    async def current(self, lat: float, lon: float) -> dict:
+        """Current weather at a point; raises httpx.HTTPError if the upstream call fails."""
+        return await self._cell_weather(weather_cell(lat, lon, self.cell_degrees))
+
+    async def current_many(self, points: list[tuple[float, float]]) -> list[dict]:
+        """Weather for every point, in order. Points are deduplicated to cells and the missing
+        cells fetched concurrently; a failed cell yields ``{"error": ...}`` for its points."""
+        cells = [weather_cell(lat, lon, self.cell_degrees) for lat, lon in points]
+        unique = list(dict.fromkeys(cells))
+        results = await asyncio.gather(*(self._cell_weather(cell) for cell in unique), return_exceptions=True)
+        by_cell = {}
+        for cell, result in zip(unique, results):
+            # BaseException: a fetch that was cancelled comes back as a CancelledError
+            if isinstance(result, BaseException):
+                print(f"Error fetching weather data from OpenWeatherMap: {result}")
+                result = {"error": "Error fetching weather data"}
+            by_cell[cell] = result
+        return [by_cell[cell] for cell in cells]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "cells": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "upstream_requests": self.upstream_requests,
+        }
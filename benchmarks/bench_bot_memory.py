@@ -0,0 +1,163 @@
+"""Resident memory and event-handling latency of the Discord bot, lean vs. default configuration.
+
+No gateway connection: each configuration is built with ``bot_config.build_bot`` in its own
+subprocess and fed synthetic gateway payloads through discord.py's own parsers.
+
+- ``--guilds`` GUILD_CREATE events, each with ``--members`` members (plus their presences,
+  which Discord only sends with the presences intent) and ``--channels`` text channels
+- ``--messages`` command messages (MESSAGE_CREATE -> command invoked) timed end to end, each
+  preceded by ``--presences`` PRESENCE_UPDATE events from the same guild, as a busy server
+  sends them; in lean mode they are never subscribed to, so they cost nothing
+
+Reports RSS growth per 1,000 guilds, command latency percentiles and the CPU time spent on
+gateway events per command, as JSON lines.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_bot_memory --guilds 1000 --members 100 --messages 2000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import discord
+
+from bot_config import build_bot
+
+BOT_USER = {"id": "1", "username": "travelbot", "discriminator": "0", "avatar": None, "bot": True}
+TIMESTAMP = "2025-01-01T00:00:00+00:00"
+
+
+def rss_megabytes() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def user(member_id: int) -> dict:
+    return {"id": str(member_id), "username": f"user{member_id}", "discriminator": "0", "avatar": None}
+
+
+def member(member_id: int) -> dict:
+    return {"user": user(member_id), "roles": [], "joined_at": TIMESTAMP, "deaf": False, "mute": False, "flags": 0}
+
+
+def guild_payload(guild_id: int, members: int, channels: int, intents: discord.Intents) -> dict:
+    member_ids = range(guild_id * 10_000, guild_id * 10_000 + members)
+    data = {
+        "id": str(guild_id), "name": f"guild{guild_id}", "owner_id": str(guild_id * 10_000),
+        "member_count": members, "large": members > 250, "features": [], "emojis": [], "stickers": [],
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+                   "hoist": False, "managed": False, "mentionable": False}],
+        "channels": [{"id": str(guild_id * 100 + n), "type": 0, "name": f"channel{n}", "position": n,
+                      "permission_overwrites": []} for n in range(channels)],
+        "voice_states": [], "threads": [], "stage_instances": [], "guild_scheduled_events": [],
+        "soundboard_sounds": [],
+        # Like the gateway: the member list needs the members intent, presences the presences intent
+        "members": [member(m) for m in member_ids] if intents.members else [],
+        "presences": [{"user": {"id": str(m)}, "status": "online", "activities": [],
+                       "client_status": {"desktop": "online"}} for m in member_ids] if intents.presences else [],
+    }
+    return data
+
+
+def message_payload(message_id: int, guild_id: int, member_id: int) -> dict:
+    return {
+        "id": str(message_id), "channel_id": str(guild_id * 100), "guild_id": str(guild_id),
+        "author": user(member_id), "member": {k: v for k, v in member(member_id).items() if k != "user"},
+        "content": "!ping", "timestamp": TIMESTAMP, "edited_timestamp": None, "tts": False,
+        "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [],
+        "pinned": False, "type": 0,
+    }
+
+
+def presence_payload(guild_id: int, member_id: int, n: int) -> dict:
+    return {"user": {"id": str(member_id)}, "guild_id": str(guild_id), "status": ("online", "idle")[n % 2],
+            "activities": [], "client_status": {"desktop": "online"}}
+
+
+async def run_config(lean: bool, guilds: int, members: int, channels: int, messages: int, presences: int) -> dict:
+    gc.collect()
+    baseline = rss_megabytes()
+    bot = build_bot("!", lean=lean, shard_count=1 if lean else None)
+    # Sets up the loop the way login() would, without connecting
+    await bot._async_setup_hook()
+    state = bot._connection
+    state.user = discord.ClientUser(state=state, data=BOT_USER)
+    invoked = asyncio.Event()
+
+    @bot.command(name="ping")
+    async def ping(ctx):
+        invoked.set()
+
+    start = time.perf_counter()
+    for guild_id in range(1, guilds + 1):
+        state.parse_guild_create(guild_payload(guild_id, members, channels, state._intents))
+    load_seconds = time.perf_counter() - start
+    gc.collect()
+    loaded = rss_megabytes()
+
+    rng = random.Random(0)
+    latencies, event_cpu = [], []
+    for n in range(messages):
+        guild_id = rng.randint(1, guilds)
+        member_id = guild_id * 10_000 + rng.randrange(members)
+        cpu = time.process_time()
+        if state._intents.presences:
+            for p in range(presences):
+                state.parse_presence_update(presence_payload(guild_id, guild_id * 10_000 + rng.randrange(members), p))
+        invoked.clear()
+        start = time.perf_counter()
+        state.parse_message_create(message_payload(10**9 + n, guild_id, member_id))
+        await invoked.wait()
+        latencies.append(time.perf_counter() - start)
+        event_cpu.append(time.process_time() - cpu)
+
+    latencies.sort()
+    return {
+        "config": "lean" if lean else "default",
+        "bot": type(bot).__name__,
+        "intents": bot.intents.value,
+        "guilds": guilds,
+        "cached_members": sum(1 for _ in bot.get_all_members()),
+        "guild_load_seconds": round(load_seconds, 2),
+        "rss_mb_per_1k_guilds": round((loaded - baseline) * 1000 / guilds, 1),
+        "rss_mb_total": round(rss_megabytes(), 1),
+        "command_p50_us": round(statistics.median(latencies) * 1e6, 1),
+        "command_p99_us": round(latencies[int(len(latencies) * 0.99) - 1] * 1e6, 1),
+        "gateway_cpu_us_per_command": round(statistics.fmean(event_cpu) * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=1_000)
+    parser.add_argument("--members", type=int, default=100, help="members (and presences) per guild")
+    parser.add_argument("--channels", type=int, default=20, help="text channels per guild")
+    parser.add_argument("--messages", type=int, default=2_000, help="timed commands")
+    parser.add_argument("--presences", type=int, default=10, help="presence updates per command")
+    parser.add_argument("--config", choices=["lean", "default"], help="run one configuration in this process")
+    args = parser.parse_args()
+
+    if args.config:
+        result = asyncio.run(run_config(args.config == "lean", args.guilds, args.members, args.channels,
+                                        args.messages, args.presences))
+        print(json.dumps(result), flush=True)
+        return
+
+    # A fresh interpreter per configuration, so one's memory doesn't inflate the other's RSS
+    for config in ("default", "lean"):
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_bot_memory", "--config", config,
+                        "--guilds", str(args.guilds), "--members", str(args.members),
+                        "--channels", str(args.channels), "--messages", str(args.messages),
+                        "--presences", str(args.presences)], check=True)
+
+
+if __name__ == "__main__":
+    main()
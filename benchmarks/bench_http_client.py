@@ -0,0 +1,95 @@
+"""Concurrent upstream-request throughput: blocking calls vs. the shared async HTTP client.
+
+Starts a local stub server that answers every GET after a fixed delay (simulating a slow
+Nominatim/OpenWeatherMap round-trip), then issues the same number of concurrent requests
+from inside the event loop two ways:
+
+- before: a blocking GET inside an ``async def`` (what the endpoints used to do)
+- after:  ``HTTPClient.get_json`` with keep-alive pooling and per-host limits
+
+Run from the repository root:
+
+    python -m benchmarks.bench_http_client --requests 200 --concurrency 50 --delay 0.05
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backend.app.http_client import HTTPClient
+
+
+def start_stub_server(delay: float) -> ThreadingHTTPServer:
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Allow keep-alive
+        wbufsize = -1 # Send headers and body in one write
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(delay)
+            body = json.dumps([{"lat": "48.8566", "lon": "2.3522"}]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    class StubServer(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024 # Don't drop bursts of new connections
+
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_blocking(url: str, total: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            with urllib.request.urlopen(url) as response:
+                json.loads(response.read())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - start
+
+
+async def run_async(url: str, total: int, concurrency: int) -> float:
+    client = HTTPClient(per_host_limit=concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(*(client.get_json(url) for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.05, help="stub server latency in seconds")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.delay)
+    url = f"http://127.0.0.1:{server.server_address[1]}/search"
+    try:
+        results = {}
+        for name, runner in (("blocking", run_blocking), ("async_pooled", run_async)):
+            elapsed = asyncio.run(runner(url, args.requests, args.concurrency))
+            results[name] = {"seconds": round(elapsed, 3), "requests_per_second": round(args.requests / elapsed, 1)}
+        results["speedup"] = round(results["blocking"]["seconds"] / results["async_pooled"]["seconds"], 1)
+        print(json.dumps(results, indent=2))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""End-to-end load test of the API and the bot's command flow against local fake upstreams.
+
+Starts ``benchmarks.fake_upstreams`` (Mistral, Nominatim, Overpass, OpenWeatherMap) and the
+API (``uvicorn backend.app.main:socket_app``) as subprocesses with temporary databases, then
+runs ``--sessions`` planning sessions, ``--concurrency`` at a time. Each session is what a
+group of ``--users`` planners does:
+
+- api: POST /sessions, POST /chat, POST /submit_preference per user,
+  GET /get_recommendations/{id}, POST /vote_trip per user, GET /finalize_trip/{id}
+- bot: !submit_trips per user, !recommend_trips, !vote_trip per user, !finalize_trip, in a
+  separate process: the bot from ``bot.create_bot`` with its commands called on fake contexts
+  whose channel sends, edits and reactions take ``--discord-latency`` seconds
+
+Prints one JSON line per target with throughput, per-step count, errors and p50/p95/p99
+latency (ms), and peak RSS. ``--output`` saves them; ``--baseline`` compares a run against
+saved results and exits non-zero when p95, throughput or peak RSS regress by more than
+``--tolerance``, or errors appear.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_load --sessions 200 --concurrency 20 --mistral-latency 0.4 --output load.json
+    python -m benchmarks.bench_load --sessions 200 --concurrency 20 --mistral-latency 0.4 --baseline load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import aiohttp
+
+from benchmarks.fake_upstreams import CITIES, add_arguments
+
+MONTHS = ("January", "March", "April", "June", "September", "October", "December")
+MODES = ("adventure", "relaxation", "culture", "food")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    # Nearest rank
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))]
+
+
+class Recorder:
+    """Latencies and errors per step of the flow."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    async def timed(self, step: str, awaitable):
+        start = time.perf_counter()
+        try:
+            result = await awaitable
+        except Exception as e:
+            self.errors[step] = self.errors.get(step, 0) + 1
+            self.latencies.setdefault(step, []).append(time.perf_counter() - start)
+            raise StepFailed(f"{step}: {e!r}") from e
+        self.latencies.setdefault(step, []).append(time.perf_counter() - start)
+        return result
+
+    def report(self, elapsed: float) -> dict:
+        steps = {}
+        for step, values in self.latencies.items():
+            values = sorted(values)
+            steps[step] = {
+                "count": len(values),
+                "errors": self.errors.get(step, 0),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+            }
+        return {"seconds": round(elapsed, 2), "steps": steps}
+
+
+class StepFailed(Exception):
+    pass
+
+
+def session_plan(n: int, users: int) -> dict:
+    # Varied enough that sessions don't all share one cached recommendation
+    rng = random.Random(n)
+    return {
+        "chat": f"Plan a {rng.choice(MODES)} trip to {rng.choice(list(CITIES))} in {rng.choice(MONTHS)}",
+        "preferences": [{"user": f"planner{n}_{u}", "location": rng.choice(list(CITIES)).split(",")[0],
+                         "budget": str(rng.randrange(5, 50) * 100), "dates": rng.choice(MONTHS),
+                         "mode": rng.choice(MODES)} for u in range(users)],
+        "votes": [rng.randrange(3) for _ in range(users)],
+    }
+
+
+async def run_sessions(flow, sessions: int, users: int, concurrency: int, recorder: Recorder) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = []
+
+    async def one(n):
+        async with semaphore:
+            try:
+                await flow(session_plan(n, users))
+            except StepFailed as e:
+                failures.append(str(e))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(sessions)))
+    elapsed = time.perf_counter() - start
+    result = recorder.report(elapsed)
+    result["sessions"] = sessions
+    result["failed_sessions"] = len(failures)
+    result["sessions_per_second"] = round((sessions - len(failures)) / elapsed, 2)
+    result["requests_per_second"] = round(sum(len(v) for v in recorder.latencies.values()) / elapsed, 2)
+    if failures:
+        result["first_failure"] = failures[0]
+    return result
+
+
+# API
+
+async def api_flow(http: aiohttp.ClientSession, base: str, recorder: Recorder, plan: dict):
+    async def call(step, method, path, **kwargs):
+        async def request():
+            async with http.request(method, base + path, **kwargs) as response:
+                response.raise_for_status()
+                body = await response.json()
+            if isinstance(body, dict) and body.get("error"):
+                raise RuntimeError(body["error"])
+            return body
+        return await recorder.timed(step, request())
+
+    session_id = (await call("sessions", "POST", "/sessions"))["session_id"]
+    await call("chat", "POST", "/chat", json={"message": plan["chat"]})
+    await asyncio.gather(*(call("submit_preference", "POST", "/submit_preference",
+                                json={"session_id": session_id, **preference})
+                           for preference in plan["preferences"]))
+    trips = (await call("get_recommendations", "GET", f"/get_recommendations/{session_id}"))["recommendations"]
+    await asyncio.gather(*(call("vote_trip", "POST", "/vote_trip",
+                                json={"session_id": session_id, "user": preference["user"],
+                                      "trip_name": trips[choice % len(trips)]["name"]})
+                           for preference, choice in zip(plan["preferences"], plan["votes"])))
+    await call("finalize_trip", "GET", f"/finalize_trip/{session_id}")
+
+
+def peak_rss_megabytes(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def wait_until_up(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as http:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with status {process.returncode}")
+            try:
+                async with http.get(url) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def run_api(args, env: dict) -> dict:
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "backend.app.main:socket_app", "--port", str(port),
+                               "--log-level", "warning", "--no-access-log"], env=env)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        await wait_until_up(base + "/", server, args.startup_timeout)
+        recorder = Recorder()
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=args.timeout)) as http:
+            result = await run_sessions(lambda plan: api_flow(http, base, recorder, plan), args.sessions, args.users,
+                                        args.concurrency, recorder)
+        result["peak_rss_mb"] = round(peak_rss_megabytes(server.pid), 1)
+        return {"target": "api", **result}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+# Bot
+
+class FakeMessage:
+    def __init__(self, channel, latency: float):
+        self.channel = channel
+        self.latency = latency
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self
+
+    async def add_reaction(self, emoji):
+        await asyncio.sleep(self.latency)
+
+
+class FakeChannel:
+    """Stands in for a guild's text channel: every call takes one Discord round trip."""
+
+    def __init__(self, channel_id: int, latency: float):
+        self.id = channel_id
+        self.latency = latency
+        self.errors = []
+
+    async def send(self, content=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        # The commands report failures as plain-text replies
+        if content and re.search(r"error|no trips|no preferences|not found|invalid", content, re.IGNORECASE):
+            self.errors.append(content)
+        return FakeMessage(self, self.latency)
+
+
+class FakeContext:
+    """What the commands read from a ``commands.Context``: the guild, author, channel and message."""
+
+    def __init__(self, channel: FakeChannel, user: str):
+        self.guild = SimpleNamespace(id=channel.id)
+        self.author = SimpleNamespace(id=user, name=user)
+        self.channel = channel
+        self.message = FakeMessage(channel, channel.latency)
+
+
+async def run_bot(args) -> dict:
+    # Imported here: the bot's modules read MISTRAL_SERVER_URL and the store paths at import time
+    from bot import create_bot
+
+    bot = create_bot()
+    recorder = Recorder()
+    guild_ids = iter(range(1, 10**9))
+
+    async def command(step, name, ctx, *arguments, **keywords):
+        # The command's own callback, as the bot's dispatcher would call it after parsing
+        async def invoke():
+            failed = len(ctx.channel.errors)
+            await bot.get_command(name)(ctx, *arguments, **keywords)
+            if len(ctx.channel.errors) > failed:
+                raise RuntimeError(ctx.channel.errors[-1][:200])
+        await recorder.timed(step, invoke())
+
+    async def flow(plan):
+        channel = FakeChannel(next(guild_ids), args.discord_latency)
+        await asyncio.gather(*(command("submit_trips", "submit_trips", FakeContext(channel, preference["user"]),
+                                       preference["location"], preference["budget"], preference["dates"],
+                                       preference["mode"])
+                               for preference in plan["preferences"]))
+        await command("recommend_trips", "recommend_trips", FakeContext(channel, plan["preferences"][0]["user"]))
+        await asyncio.gather(*(command("vote_trip", "vote_trip", FakeContext(channel, preference["user"]), choice + 1)
+                               for preference, choice in zip(plan["preferences"], plan["votes"])))
+        await command("finalize_trip", "finalize_trip", FakeContext(channel, plan["preferences"][0]["user"]))
+
+    try:
+        result = await run_sessions(flow, args.sessions, args.users, args.concurrency, recorder)
+    finally:
+        bot.session_store.close()
+    result["discord"] = bot.output.stats()
+    # Linux reports ru_maxrss in kilobytes
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return {"target": "bot", **result}
+
+
+def run_bot_process(args, env: dict) -> dict:
+    # Its own interpreter, so the peak RSS is the bot's alone
+    command = [sys.executable, "-m", "benchmarks.bench_load", "--bot-worker", "--sessions", str(args.sessions),
+               "--users", str(args.users), "--concurrency", str(args.concurrency),
+               "--discord-latency", str(args.discord_latency)]
+    completed = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+# Baseline comparison
+
+def regressions(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    found = []
+    previous = {result["target"]: result for result in baseline}
+    for result in results:
+        before = previous.get(result["target"])
+        if before is None:
+            continue
+        target = result["target"]
+        if result["sessions_per_second"] < before["sessions_per_second"] * (1 - tolerance):
+            found.append(f"{target}: sessions/s {before['sessions_per_second']} -> {result['sessions_per_second']}")
+        if result["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance):
+            found.append(f"{target}: peak RSS {before['peak_rss_mb']}MB -> {result['peak_rss_mb']}MB")
+        for step, stats in result["steps"].items():
+            old = before["steps"].get(step)
+            if old is None:
+                continue
+            if stats["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+                found.append(f"{target} {step}: p95 {old['p95_ms']}ms -> {stats['p95_ms']}ms")
+            if stats["errors"] > old["errors"]:
+                found.append(f"{target} {step}: errors {old['errors']} -> {stats['errors']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["api", "bot", "all"], default="all")
+    parser.add_argument("--sessions", type=int, default=100, help="planning sessions to run")
+    parser.add_argument("--users", type=int, default=3, help="planners per session")
+    parser.add_argument("--concurrency", type=int, default=10, help="sessions in progress at once")
+    parser.add_argument("--discord-latency", type=float, default=0.08, help="seconds per Discord send/edit/reaction")
+    parser.add_argument("--llm-rpm", type=float, default=6000,
+                        help="LLM_REQUESTS_PER_MINUTE for the app (the default 60 would measure the limiter)")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds before a request counts as failed")
+    parser.add_argument("--startup-timeout", type=float, default=30)
+    parser.add_argument("--output", help="write the results here (JSON)")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--bot-worker", action="store_true", help=argparse.SUPPRESS)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.bot_worker:
+        print(json.dumps(asyncio.run(run_bot(args))), flush=True)
+        return
+
+    fake_port = free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    fakes = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port),
+                              "--mistral-latency", str(args.mistral_latency),
+                              "--upstream-latency", str(args.upstream_latency), "--sigma", str(args.sigma),
+                              "--error-rate", str(args.error_rate), "--tokens-per-second", str(args.tokens_per_second),
+                              "--itinerary-words", str(args.itinerary_words)])
+    results = []
+    try:
+        asyncio.run(wait_until_up(fake_url + "/stats", fakes, args.startup_timeout))
+        for target in ("api", "bot") if args.target == "all" else (args.target,):
+            # Fresh databases and caches for every target, nothing shared with a real deployment
+            with tempfile.TemporaryDirectory() as data_dir:
+                env = {
+                    **os.environ,
+                    "MISTRAL_API_KEY": "fake",
+                    "MISTRAL_SERVER_URL": fake_url,
+                    "NOMINATIM_URL": fake_url + "/search",
+                    "OVERPASS_URL": fake_url + "/api/interpreter",
+                    "OPENWEATHERMAP_URL": fake_url + "/data/2.5/weather",
+                    "OPENWEATHERMAP_API_KEY": "fake",
+                    "LLM_REQUESTS_PER_MINUTE": str(args.llm_rpm),
+                    "SESSION_DB_PATH": os.path.join(data_dir, "sessions.db"),
+                    "GEOCODE_CACHE_PATH": os.path.join(data_dir, "geocode.db"),
+                    "PLACES_INDEX_DIR": os.path.join(data_dir, "places"),
+                }
+                if target == "api":
+                    result = asyncio.run(run_api(args, env))
+                else:
+                    result = run_bot_process(args, env)
+            print(json.dumps(result), flush=True)
+            results.append(result)
+    finally:
+        fakes.terminate()
+        fakes.wait()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
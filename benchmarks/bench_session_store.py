@@ -0,0 +1,118 @@
+"""Per-command session store latency as the number of stored sessions grows.
+
+Fills a SQLite-backed SessionStore (in a temporary directory) with an increasing number of
+sessions, each holding a few preferences, three recommended trips and their votes. At each
+size it times a mix of bot/API commands against random sessions:
+
+- warm: the session is already in the in-memory cache (once there are more sessions than
+  ``--max-cached``, most are evicted and this degrades to cold)
+- cold: a freshly opened store, so each session is first loaded from SQLite
+
+Run from the repository root:
+
+    python -m benchmarks.bench_session_store --sizes 1000 10000 100000 --commands 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from backend.app.session_store import SESSION_CACHE_MAX_SESSIONS, SessionStore
+
+NAMESPACE = "discord"
+
+
+def make_trips(session_id: int) -> list[dict]:
+    return [
+        {"name": f"Trip {session_id}-{n}", "dates": "3/10-3/16", "trip_style": "relaxing", "budget": "1500",
+         "activities": ["Museum", "Beach", "Food tour"]}
+        for n in range(3)
+    ]
+
+
+def populate(store: SessionStore, start: int, stop: int):
+    for session_id in range(start, stop):
+        for user in ("alice", "bob", "carol"):
+            store.add_preference(NAMESPACE, session_id, {
+                "user": user, "location": "Lisbon", "budget": "1500", "dates": "3/10-3/16", "mode": "relaxing",
+            })
+        store.set_trips(NAMESPACE, session_id, make_trips(session_id))
+
+
+def run_command(store: SessionStore, session_id: int, user: str):
+    # What one submit_trips + vote_trip + finalize_trip round does to the store
+    store.add_preference(NAMESPACE, session_id, {
+        "user": user, "location": "Porto", "budget": "900", "dates": "April", "mode": "adventure",
+    })
+    store.preferences(NAMESPACE, session_id)
+    store.trips(NAMESPACE, session_id)
+    store.cast_vote(NAMESPACE, session_id, user, 0)
+    store.leaderboard(NAMESPACE, session_id).leader()
+
+
+def time_commands(store: SessionStore, session_ids: list[int]) -> dict:
+    samples = []
+    for n, session_id in enumerate(session_ids):
+        start = time.perf_counter()
+        run_command(store, session_id, f"user{n}")
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "p50_us": round(statistics.median(samples) * 1e6, 1),
+        "p99_us": round(samples[int(len(samples) * 0.99) - 1] * 1e6, 1),
+        "mean_us": round(statistics.fmean(samples) * 1e6, 1),
+    }
+
+
+async def bench(path: str, sizes: list[int], commands: int, max_cached: int) -> list[dict]:
+    results = []
+    store = SessionStore(path, max_sessions=max_cached)
+    stored = 0
+    for size in sizes:
+        start = time.perf_counter()
+        populate(store, stored, size)
+        store.flush()
+        populate_seconds = time.perf_counter() - start
+        stored = size
+
+        rng = random.Random(size)
+        warm = time_commands(store, [rng.randrange(size) for _ in range(commands)])
+        store.close()
+
+        # Reopen so every session has to be loaded from SQLite on first touch
+        store = SessionStore(path, max_sessions=max_cached)
+        cold = time_commands(store, rng.sample(range(size), min(commands, size)))
+        store.flush()
+        results.append({
+            "sessions": size,
+            "populate_seconds": round(populate_seconds, 2),
+            "db_megabytes": round(os.path.getsize(path) / 1e6, 1),
+            "warm": warm,
+            "cold": cold,
+            "cache": store.stats(),
+        })
+        print(json.dumps(results[-1]), flush=True)
+    store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--commands", type=int, default=2_000, help="timed commands per size")
+    parser.add_argument("--max-cached", type=int, default=SESSION_CACHE_MAX_SESSIONS,
+                        help="sessions kept in memory")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Run inside an event loop, as the bot and the API do, so writes are batched
+        asyncio.run(bench(os.path.join(directory, "sessions.sqlite3"), sorted(args.sizes), args.commands,
+                          args.max_cached))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Local stand-ins for Mistral, Nominatim, OpenWeatherMap and Overpass.
+
+One aiohttp server answers all four APIs on the paths the app calls, with configurable latency
+(lognormal around a median), error rate and token streaming speed, so the API and the bot can
+be load tested without network access or API keys. Mistral answers are chosen from the
+prompt: chat JSON for ``response_format=json_object``, a trip array for recommendation
+prompts, a day outline for planner skeletons and plain-text itineraries otherwise.
+
+Run from the repository root (``bench_load`` starts it for you):
+
+    python -m benchmarks.fake_upstreams --port 9100 --mistral-latency 0.4 --tokens-per-second 200
+
+then point the app at it:
+
+    MISTRAL_SERVER_URL=http://127.0.0.1:9100 NOMINATIM_URL=http://127.0.0.1:9100/search \\
+    OVERPASS_URL=http://127.0.0.1:9100/api/interpreter \\
+    OPENWEATHERMAP_URL=http://127.0.0.1:9100/data/2.5/weather ...
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+
+from aiohttp import web
+
+CITIES = {
+    "Paris, France": (48.8566, 2.3522),
+    "Lisbon, Portugal": (38.7223, -9.1393),
+    "Kyoto, Japan": (35.0116, 135.7681),
+    "Honolulu, Hawaii": (21.3069, -157.8583),
+    "Cape Town, South Africa": (-33.9249, 18.4241),
+    "Reykjavik, Iceland": (64.1466, -21.9426),
+}
+POI_NAMES = ("Old Town Museum", "Harbour Market", "Cathedral Square", "Botanical Garden", "Riverside Cafe",
+             "City History Museum", "Sunset Viewpoint", "Central Park", "Night Market", "Art Gallery")
+ACTIVITIES = ("Guided walking tour", "Local food market visit", "Sunset boat cruise", "Museum afternoon",
+              "Day hike in the hills", "Cooking class", "Beach day", "Live music evening")
+
+
+class FakeUpstreams:
+    def __init__(self, mistral_latency: float, upstream_latency: float, sigma: float, error_rate: float,
+                 tokens_per_second: float, itinerary_words: int, seed: int = 0):
+        self.mistral_latency = mistral_latency
+        self.upstream_latency = upstream_latency
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.tokens_per_second = tokens_per_second
+        self.itinerary_words = itinerary_words
+        self.rng = random.Random(seed)
+        self.requests = {}
+
+    # Behaviour
+
+    def _delay(self, median: float) -> float:
+        if median <= 0:
+            return 0.0
+        return median * math.exp(self.rng.gauss(0, self.sigma))
+
+    def _count(self, service: str):
+        self.requests[service] = self.requests.get(service, 0) + 1
+
+    def _fail(self) -> web.Response | None:
+        if self.rng.random() >= self.error_rate:
+            return None
+        # Rate limiting and server errors both happen upstream; the app retries the former
+        if self.rng.random() < 0.5:
+            return web.json_response({"message": "Requests rate limit exceeded"}, status=429)
+        return web.json_response({"message": "Internal server error"}, status=500)
+
+    @staticmethod
+    def _seeded(text: str) -> random.Random:
+        # Same prompt, same answer: caches behave as they would against the real API
+        return random.Random(hashlib.sha256(text.encode()).digest())
+
+    def _chat_json(self, prompt: str) -> str:
+        rng = self._seeded(prompt)
+        city = rng.choice(list(CITIES))
+        lat, lon = CITIES[city]
+        pois = [{"name": name, "type": "attraction", "latitude": round(lat + rng.uniform(-0.03, 0.03), 5),
+                 "longitude": round(lon + rng.uniform(-0.03, 0.03), 5)} for name in rng.sample(POI_NAMES, 4)]
+        return json.dumps({"recommended_trip": f"A relaxed week in {city} with food, culture and walks.",
+                           "location": city, "points_of_interest": pois})
+
+    def _trips(self, prompt: str) -> str:
+        rng = self._seeded(prompt)
+        trips = [{"name": f"{city.split(',')[0]} {style}", "dates": "April 10-16", "trip_style": style,
+                  "budget": f"{rng.randrange(8, 30) * 100} USD", "activities": rng.sample(ACTIVITIES, 4)}
+                 for city, style in zip(rng.sample(list(CITIES), 3), ("Getaway", "Adventure", "Discovery"))]
+        return json.dumps(trips, indent=2)
+
+    def _skeleton(self, prompt: str) -> str:
+        match = re.search(r"exactly (\d+) days", prompt)
+        days = int(match.group(1)) if match else 5
+        return json.dumps([{"day": n, "title": f"Day {n} highlights", "focus": ACTIVITIES[n % len(ACTIVITIES)]}
+                           for n in range(1, days + 1)])
+
+    def _itinerary(self, prompt: str) -> str:
+        rng = self._seeded(prompt)
+        lines, words = [], 0
+        day = 1
+        while words < self.itinerary_words:
+            line = f"Day {day}: " + ", ".join(rng.sample(ACTIVITIES, 3)) + ". " + " ".join(
+                rng.choice(("stroll", "lunch", "visit", "explore", "relax", "dinner", "transfer")) for _ in range(30))
+            lines.append(line)
+            words += len(line.split())
+            day += 1
+        return "\n\n".join(lines)
+
+    def _answer(self, body: dict) -> str:
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            return self._chat_json(prompt)
+        if "Outline a day-by-day plan" in prompt:
+            return self._skeleton(prompt)
+        # Full recommendation prompts and refinements of a similar session's trips
+        if "suggest a few trip options" in prompt or "trip options were suggested" in prompt:
+            return self._trips(prompt)
+        return self._itinerary(prompt)
+
+    # Mistral
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self._count("mistral")
+        body = await request.json()
+        await asyncio.sleep(self._delay(self.mistral_latency))
+        failure = self._fail()
+        if failure is not None:
+            return failure
+
+        content = self._answer(body)
+        # ~4 characters per token, like the app's own estimates
+        tokens = [content[i:i + 4] for i in range(0, len(content), 4)]
+        usage = {"prompt_tokens": sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4,
+                 "completion_tokens": len(tokens)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        model = body.get("model", "mistral-large-latest")
+        created = int(time.time())
+
+        if not body.get("stream"):
+            if self.tokens_per_second > 0:
+                await asyncio.sleep(len(tokens) / self.tokens_per_second)
+            return web.json_response({
+                "id": "cmpl-fake", "object": "chat.completion", "model": model, "created": created, "usage": usage,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        # Send roughly every 50ms whatever the token rate has produced since the last chunk
+        per_chunk = max(1, int(self.tokens_per_second * 0.05)) if self.tokens_per_second > 0 else len(tokens)
+        for start in range(0, len(tokens), per_chunk):
+            chunk = {"id": "cmpl-fake", "object": "chat.completion.chunk", "model": model, "created": created,
+                     "choices": [{"index": 0, "delta": {"content": "".join(tokens[start:start + per_chunk])},
+                                  "finish_reason": None}]}
+            if start + per_chunk >= len(tokens):
+                chunk["choices"][0]["finish_reason"] = "stop"
+                chunk["usage"] = usage
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            if self.tokens_per_second > 0:
+                await asyncio.sleep(per_chunk / self.tokens_per_second)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    # OpenStreetMap and OpenWeatherMap
+
+    async def nominatim(self, request: web.Request) -> web.Response:
+        self._count("nominatim")
+        await asyncio.sleep(self._delay(self.upstream_latency))
+        failure = self._fail()
+        if failure is not None:
+            return failure
+        query = request.query.get("q", "")
+        city = next((name for name in CITIES if name.split(",")[0].lower() in query.lower()), None)
+        if city is None:
+            # Unknown places still resolve, somewhere stable
+            rng = self._seeded(query)
+            lat, lon = rng.uniform(-60, 60), rng.uniform(-180, 180)
+        else:
+            lat, lon = CITIES[city]
+        return web.json_response([{"lat": str(lat), "lon": str(lon), "display_name": query}])
+
+    async def overpass(self, request: web.Request) -> web.Response:
+        self._count("overpass")
+        await asyncio.sleep(self._delay(self.upstream_latency * 4))
+        failure = self._fail()
+        if failure is not None:
+            return failure
+        match = re.search(r"\(([-\d.]+),([-\d.]+),([-\d.]+),([-\d.]+)\)", request.query.get("data", ""))
+        south, west, north, east = map(float, match.groups()) if match else (0.0, 0.0, 0.25, 0.25)
+        rng = self._seeded(f"{south},{west}")
+        elements = [{"type": "node", "id": n, "lat": rng.uniform(south, north), "lon": rng.uniform(west, east),
+                     "tags": {"tourism": "attraction", "name": f"{rng.choice(POI_NAMES)} {n}"}} for n in range(200)]
+        return web.json_response({"elements": elements})
+
+    async def weather(self, request: web.Request) -> web.Response:
+        self._count("openweathermap")
+        await asyncio.sleep(self._delay(self.upstream_latency))
+        failure = self._fail()
+        if failure is not None:
+            return failure
+        return web.json_response({"weather": [{"main": "Clear", "description": "clear sky"}],
+                                  "main": {"temp": 21.5, "humidity": 60}, "name": "Fake City"})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.requests)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_get("/search", self.nominatim)
+        app.router.add_get("/api/interpreter", self.overpass)
+        app.router.add_get("/data/2.5/weather", self.weather)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--mistral-latency", type=float, default=0.4, help="median seconds before a Mistral answer starts")
+    parser.add_argument("--upstream-latency", type=float, default=0.05,
+                        help="median seconds for Nominatim/OpenWeatherMap (Overpass takes 4x)")
+    parser.add_argument("--sigma", type=float, default=0.5, help="lognormal spread of every latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 429/500")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Mistral output speed (0: instant)")
+    parser.add_argument("--itinerary-words", type=int, default=600)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    fakes = FakeUpstreams(args.mistral_latency, args.upstream_latency, args.sigma, args.error_rate,
+                          args.tokens_per_second, args.itinerary_words)
+    web.run_app(fakes.app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,28 @@
+import asyncio
+import functools
 import os
 import discord
 import logging
 import json
 import re
+import time
 
-from discord.ext import commands
+from discord.ext import commands, tasks
 from dotenv import load_dotenv
-from agent import MistralAgent
+from backend.app.agent import MistralAgent
+from backend.app.llm_cache import recommendation_cache_key, itinerary_cache_key
+from backend.app.itinerary_planner import ItineraryPlanner
+from backend.app.llm_scheduler import Priority
+from backend.app.hedging import is_json_array
+from backend.app.trip_stream import TripStreamParser
+from backend.app.session_store import SessionStore
+from backend.app.prompt_builder import aggregate_preferences, recommendation_prompt, refinement_prompt
+from backend.app.similarity_cache import SimilarityCache
+from backend.app.speculation import SPECULATIVE_ITINERARIES, Speculator
+from backend.app.vote_engine import VoteBatcher
+from backend.app.metrics import DISCORD_SEND_SECONDS, JSON_PARSE_SECONDS, REGISTRY, monitor_event_loop, start_exporter
+from bot_config import build_bot
+from discord_output import EMBED_COLOR, EMBED_DESCRIPTION_LIMIT, OutputPipeline, truncate
 
 PREFIX = "!"
 
@@ -16,274 +32,437 @@ logger = logging.getLogger("discord")
 # Load the environment variables
 load_dotenv()
 
-# Create the bot with all intents
-# The message content and members intent must be enabled in the Discord Developer Portal for the bot to work.
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix=PREFIX, intents=intents)
+# Discord's per-message character limit
+DISCORD_MESSAGE_LIMIT = 2000
+# Discord's per-field character limit in embeds
+EMBED_FIELD_LIMIT = 1024
 
-# Import the Mistral agent from the agent.py file
-agent = MistralAgent()
+SESSION_NAMESPACE = "discord"
+# Web sessions (backend/app/main.py) a guild can join with !link_session
+WEB_SESSION_NAMESPACE = "web"
+# Minutes between idle-session sweeps
+SESSION_SWEEP_INTERVAL = 5
 
-# Get the token from the environment variables
-token = os.getenv("DISCORD_TOKEN")
-if not token:
-    logger.error("DISCORD_TOKEN environment variable not found. Please check your .env file.")
-    raise ValueError("DISCORD_TOKEN environment variable is required")
+# Prometheus metrics on http://<host>:BOT_METRICS_PORT/metrics when set
+BOT_METRICS_PORT = int(os.getenv("BOT_METRICS_PORT", 0))
 
-# Dictionary to store trip preferences
-trip_preferences = {}
-# Dictionary to store trip votes
-trip_votes = {}
+def itinerary_prompt(trip):
+    trip_json = json.dumps(trip, indent=2)
+    return f"Generate a detailed and descriptive travel itinerary for the following trip. Ensure a daily schedule based on the details provided.\nTrip Details:\n{trip_json}"
 
-@bot.event
-async def on_ready():
-    """
-    Called when the client is done preparing the data received from Discord.
-    Prints message on terminal when bot successfully connects to discord.
+def format_trip(number, trip):
+    return (f"{number}. **{trip['name']}**\n"
+            f"Dates: {trip['dates']}\n"
+            f"Style: {trip['trip_style']}\n"
+            f"Budget: {trip['budget']}\n"
+            f"Activities: {', '.join(trip['activities'])}\n")
+
+def create_bot(agent: MistralAgent | None = None, session_store: SessionStore | None = None,
+               speculator: Speculator | None = None, broadcaster=None, output: OutputPipeline | None = None,
+               similarity_cache: SimilarityCache | None = None):
+    """The bot with its commands, built on the given components or fresh ones.
 
-    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_ready
+    Nothing connects until the bot is started. Pass the API's agent, session store, speculator,
+    similarity cache and ``broadcaster`` (see run_all.py) to run both on one event loop with one connection pool,
+    response cache and rate limiter; guilds linked to a web session then update its Socket.IO
+    room too. The components are available as ``bot.agent``, ``bot.session_store`` and
+    ``bot.output``.
     """
-    logger.info(f"{bot.user} has connected to Discord!")
+    # Create the bot: every intent by default, or DISCORD_LEAN=1 for minimal intents and caches with
+    # sharding (DISCORD_SHARD_COUNT / DISCORD_SHARD_IDS run a range of shards per process, see bot_config.py)
+    # The message content intent must be enabled in the Discord Developer Portal for the bot to work.
+    bot = build_bot(PREFIX)
 
-# Commands
-# Clear preferences command
-@bot.command(name="clear_preferences", help="Remove a user's trip preferences")
-async def clear_preferences(ctx, *, arg=None):
-    try:
-        # Initialize if not exists
-        if ctx.guild.id not in trip_preferences:
-            trip_preferences[ctx.guild.id] = []
+    # The same agent as the API (backend/app/agent.py); the Mistral client is created on first use
+    if agent is None:
+        agent = MistralAgent()
+    # Planner mode for finalize_trip: day skeleton first, then every day generated concurrently
+    itinerary_planner = ItineraryPlanner(functools.partial(agent.run_command, structured=False), cache=agent.cache)
+
+    # Per-channel rate limiting, a live status message per guild and paginated embeds
+    if output is None:
+        output = OutputPipeline()
+
+    # Preferences, recommended trips and votes per guild, persisted across restarts
+    # Idle guilds are evicted from memory (SESSION_CACHE_TTL / SESSION_CACHE_MAX_SESSIONS) and reloaded on demand
+    if session_store is None:
+        session_store = SessionStore()
+
+    # Recommendations for similar preference sets, shared with the API when running together
+    if similarity_cache is None:
+        similarity_cache = SimilarityCache()
+
+    async def speculate_itinerary(trip):
+        # Same prompt and cache key as finalize_trip, so finalizing finds the result in the cache
+        return await agent.run_command(itinerary_prompt(trip), cache_key=itinerary_cache_key(trip), structured=False,
+                                       priority=Priority.BULK)
+
+    # Opt-in (SPECULATIVE_ITINERARIES=1): generate the leading trip's itinerary while votes come in
+    if speculator is None and SPECULATIVE_ITINERARIES:
+        speculator = Speculator(speculate_itinerary)
+    # An evicted (idle) session won't be finalized from memory; its speculation goes with it
+    # (the API registers the same pair already when both run together)
+    if speculator and speculator.reset not in session_store.eviction_listeners:
+        session_store.eviction_listeners.append(speculator.reset)
+
+    def votes_cast(key, changed):
+        # Once per batch of votes: live tallies for a linked web session, then speculation
+        if broadcaster is not None and key[0] == WEB_SESSION_NAMESPACE:
+            for index, count in changed.items():
+                broadcaster.vote(key[1], index, count)
+        if speculator:
+            speculator.observe(key, session_store.leaderboard(*key), session_store.trips(*key))
+
+    # One ballot per member; a burst of votes in a guild is cast (and persisted) together
+    vote_batcher = VoteBatcher(lambda key, ballots: session_store.cast_votes(*key, ballots), on_cast=votes_cast)
+
+    bot.agent = agent
+    bot.session_store = session_store
+    bot.output = output
+
+    REGISTRY.stats("llm_scheduler", "Mistral scheduler", agent.scheduler.stats)
+    REGISTRY.stats("llm_cache", "Mistral response cache", agent.cache.stats)
+    if agent.hedger:
+        REGISTRY.stats("llm_hedging", "Hedged Mistral requests", agent.hedger.stats)
+    if speculator:
+        REGISTRY.stats("speculation", "Speculative itineraries", speculator.stats)
+    REGISTRY.stats("session_store", "Session store", session_store.stats)
+    REGISTRY.stats("discord_output", "Discord output pipeline", output.stats)
+    REGISTRY.stats("discord_votes", "Batched Discord votes", vote_batcher.stats)
+    REGISTRY.stats("similarity_cache", "Recommendations served or seeded from similar sessions", similarity_cache.stats)
+    background_tasks = []
+
+    @bot.event
+    async def on_ready():
+        """
+        Called when the client is done preparing the data received from Discord.
+        Prints message on terminal when bot successfully connects to discord.
+
+        https://discordpy.readthedocs.io/en/latest/api.html#discord.on_ready
+        """
+        logger.info(f"{bot.user} has connected to Discord!")
+        if bot.shard_count:
+            logger.info(f"Running shards {bot.shard_ids or 'all'} of {bot.shard_count} for {len(bot.guilds)} guilds")
+        if not sweep_sessions.is_running():
+            sweep_sessions.start()
+        # on_ready fires again after reconnects; start the metrics side once
+        if not background_tasks:
+            background_tasks.append(asyncio.ensure_future(monitor_event_loop()))
+            if BOT_METRICS_PORT:
+                background_tasks.append(await start_exporter(BOT_METRICS_PORT))
+                logger.info(f"Serving metrics on port {BOT_METRICS_PORT}")
+
+    @tasks.loop(minutes=SESSION_SWEEP_INTERVAL)
+    async def sweep_sessions():
+        # Drop idle guilds from memory even when no commands arrive, and log the gauges
+        session_store.evict_idle()
+        logger.info(f"Session store: {session_store.stats()}")
+        logger.info(f"Discord output: {output.stats()}")
+        if speculator:
+            logger.info(f"Speculative itineraries: {speculator.stats()}")
+
+    def session_key(ctx):
+        # The guild's own session, or the web session it is linked to
+        return session_store.resolve(SESSION_NAMESPACE, ctx.guild.id)
+
+    async def publish(key, event, data):
+        # Web planners of a linked session see the guild's changes live
+        if broadcaster is not None and key[0] == WEB_SESSION_NAMESPACE:
+            await broadcaster.emit(event, key[1], data)
+
+    def render_status(key):
+        """The session's live status: grouped preferences, then the recommended trips and their votes."""
+        preferences = session_store.preferences(*key)
+        trips = session_store.trips(*key)
+        title = "Trip Planning Status"
+        if key[0] == WEB_SESSION_NAMESPACE:
+            title += f" (web session {key[1]})"
+        embed = discord.Embed(title=title, color=EMBED_COLOR)
+        if preferences:
+            groups = "".join(group.describe() for group in aggregate_preferences(preferences))
+            embed.description = truncate(f"**{len(preferences)} preference(s) submitted:**\n{groups}",
+                                         EMBED_DESCRIPTION_LIMIT)
         else:
-            trip_preferences[ctx.guild.id] = []
-        await ctx.send(f"Removed {ctx.author.name}'s trip preferences")
-    except Exception as e:
-        logger.error(f"Error clearing preferences: {e}")
-        await ctx.send("An error occurred while clearing preferences.")
+            embed.description = "No preferences yet. Use `!submit_trips` to add yours."
+        if trips:
+            tallies = "\n".join(f"{number}. {trip['name']}: {count} votes"
+                                 for number, (trip, count) in enumerate(zip(trips, session_store.tallies(*key)), 1))
+            embed.add_field(name="Votes (`!vote_trip <number>`)", value=truncate(tallies, EMBED_FIELD_LIMIT), inline=False)
+        return embed
 
-# Submit Trips
-@bot.command(name="submit_trips", help="Users submit trip ideas and preferences")
-async def submit_trips(ctx, location: str = None, budget: str = None, dates: str = None, mode: str = None):
-    try:
-        # Validate inputs
-        if not location or not budget or not dates or not mode:
-            await ctx.send("All fields (location, budget, dates, mode) are required.")
-            return
-        
-        # Validate budget is a number
-        # Remove commas and spaces for validation
-        clean_budget = budget.replace(",", "").replace(" ", "")
-        if not clean_budget.replace(".", "").isdigit():
-            await ctx.send("Budget must be a number (e.g., 1000 or 1,000).")
-            return
-        
-        # Validate dates is either a month or a number format
-        months = ["january", "february", "march", "april", "may", "june", "july", 
-                 "august", "september", "october", "november", "december",
-                 "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
-        
-        # Check if dates contains a month name
-        is_month = any(month in dates.lower() for month in months)
-        # Check if dates contains numbers (like MM/DD-MM/DD or just a number)
-        has_numbers = any(char.isdigit() for char in dates)
-        
-        if not (is_month or has_numbers):
-            await ctx.send("Dates must be either a month name (e.g., 'January', 'Feb') or a date format (e.g., '3/10-3/16', '15').")
-            return
-        # Initialize if not exists
-        if ctx.guild.id not in trip_preferences:
-            trip_preferences[ctx.guild.id] = []
-        
-        trip_preferences[ctx.guild.id].append({
-            "user": ctx.author.name,
-            "location": location,
-            "budget": budget,
-            "dates": dates,
-            "mode": mode.lower()
-        })
-        
-        # Display all submitted preferences
-        preferences_message = "**Current Trip Preferences:**\n"
-        for pref in trip_preferences[ctx.guild.id]:
-            preferences_message += (f"- {pref['user']}: Location - {pref['location']}, Budget - {pref['budget']}, "
-                                    f"Dates - {pref['dates']}, Mode - {pref['mode'].capitalize()}\n")
-        await ctx.send(f"{ctx.author.name} submitted travel preferences: Location - {location}, Budget - {budget}, Dates - {dates}, Mode - {mode.capitalize()}.")
-        await ctx.send(preferences_message)
-    except Exception as e:
-        logger.error(f"Error submitting trip preferences: {e}")
-        await ctx.send("An error occurred while submitting your preferences. Please try again.")
-
-# Recommend Trips
-@bot.command(name="recommend_trips", help="AI recommends trips")
-async def recommend_trips(ctx, *, arg=None):
-    # Should we add a certain number of recommendations?
-    prompt = "Based on the following travel preferences, suggest a few trip options that balances everyone's inputs. Make sure the activity list is descriptive."
-    
-    # Add user preferences to the prompt
-    for user_prefs in trip_preferences.values():
-        for pref in user_prefs:
-            prompt += f"- {pref['user']} wants to travel to {pref['location']} on a {pref['mode']} trip with a budget of {pref['budget']} during {pref['dates']}.\n"
-
-    # AI answer is formatted as JSON
-    prompt += "Please format the response in JSON with this structure. Return ONLY a raw JSON array. Do NOT use Markdown formatting, triple backticks, or any extra text, again just the raw JSON array:\n"
-    prompt += """"
-                [
-                {
-                    "name": "Trip Name",
-                    "dates": "Trip Dates",
-                    "trip_style": "Trip Style",
-                    "budget": "Budget",
-                    "activities": ["Activity 1", "Activity 2", "Activity 3"]
-                },
-                ...
-                ]
-                """
-    try:
-        response = await agent.run_command(prompt)
-        # Remove markdown
-        if response.startswith("```json"):
-            response = response[7:-3].strip()
-        elif response.startswith("```"):
-            response = response[3:-3].strip()
-        # Try and parse the JSON
+    def refresh_status(ctx):
+        # Coalesced: a burst of submissions or votes becomes one edit of the status message
+        key = session_key(ctx)
+        output.update_status(ctx.guild.id, ctx, lambda: render_status(key))
+
+    async def acknowledge(ctx):
+        # A reaction instead of a reply; the status message carries the details
         try:
-            trips = json.loads(response)
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}")
-            await ctx.send("Error: AI response is not valid JSON. Here is what was returned:\n" + response)
-            return
-    except Exception as e:
-        logger.error(f"Error calling AI service: {e}")
-        await ctx.send("Error: Failed to get recommendations from AI service. Please try again later.")
-        return
+            with DISCORD_SEND_SECONDS.time("reaction"):
+                await ctx.message.add_reaction("\N{WHITE HEAVY CHECK MARK}")
+        except discord.HTTPException as e:
+            logger.error(f"Error acknowledging command: {e}")
 
-    # Add options to trip_votes
-    try:
-        # Validate trip data structure
-        for trip in trips:
-            if not isinstance(trip, dict):
-                await ctx.send("Error: Invalid trip data format.")
+    # Commands
+    # Clear preferences command
+    @bot.command(name="clear_preferences", help="Remove a user's trip preferences")
+    async def clear_preferences(ctx, *, arg=None):
+        try:
+            session_store.clear_preferences(*session_key(ctx), user=ctx.author.name)
+            await acknowledge(ctx)
+            refresh_status(ctx)
+        except Exception as e:
+            logger.error(f"Error clearing preferences: {e}")
+            await output.send(ctx, "An error occurred while clearing preferences.")
+
+    # Submit Trips
+    @bot.command(name="submit_trips", help="Users submit trip ideas and preferences")
+    async def submit_trips(ctx, location: str = None, budget: str = None, dates: str = None, mode: str = None):
+        try:
+            # Validate inputs
+            if not location or not budget or not dates or not mode:
+                await output.send(ctx, "All fields (location, budget, dates, mode) are required.")
                 return
-                
-            required_fields = ["name", "dates", "trip_style", "budget", "activities"]
-            for field in required_fields:
-                if field not in trip:
-                    await ctx.send(f"Error: Missing required field '{field}' in trip data.")
-                    return
-                    
-            if not isinstance(trip["activities"], list):
-                await ctx.send("Error: 'activities' field must be a list.")
+
+            # Validate budget is a number
+            # Remove commas and spaces for validation
+            clean_budget = budget.replace(",", "").replace(" ", "")
+            if not clean_budget.replace(".", "").isdigit():
+                await output.send(ctx, "Budget must be a number (e.g., 1000 or 1,000).")
                 return
-                
-        # Initialize trip_votes for this guild
-        trip_votes[ctx.guild.id] = {"trips": trips, "votes": {trip["name"]: 0 for trip in trips}}
-    except Exception as e:
-        logger.error(f"Error initializing trip votes: {e}")
-        await ctx.send("An error occurred while processing trip data.")
-        return
-
-    # Print to the channel the recommended trip options
-    full_response = "**AI-Recommended Trips:**\n"
-    for i, trip in enumerate(trips, start=1):
-        full_response += f"{i}. **{trip['name']}**\n"
-        full_response += f"Dates: {trip['dates']}\n"
-        full_response += f"Style: {trip['trip_style']}\n"
-        full_response += f"Budget: {trip['budget']}\n"
-        full_response += f"Activities: {', '.join(trip['activities'])}\n\n"
-    await ctx.send(full_response)
-
-# Vote trips command
-@bot.command(name="vote_trip", help="Users vote for trips based on the number")
-async def vote_trip(ctx, trip_number:int):
-    try:
-        if ctx.guild.id not in trip_votes or "trips" not in trip_votes[ctx.guild.id]:
-            await ctx.send("No trips available to vote on. Use `!recommend_trips` first.")
-            return
-        
-        trip_list = trip_votes[ctx.guild.id]["trips"]
-        if trip_number < 1 or trip_number > len(trip_list):
-            await ctx.send(f"Invalid trip number! Please choose a number between 1 and {len(trip_list)}.")
-            return
-            
-        selected_trip = trip_list[trip_number - 1]["name"]
-        
-        # Initialize votes for this trip if not already present
-        if selected_trip not in trip_votes[ctx.guild.id]["votes"]:
-            trip_votes[ctx.guild.id]["votes"][selected_trip] = 0
-            
-        trip_votes[ctx.guild.id]["votes"][selected_trip] += 1
-        vote_counts = "\n".join([f"{name}: {count} votes" for name, count in trip_votes[ctx.guild.id]["votes"].items()])
-        await ctx.send(f"{ctx.author.name} voted for: {selected_trip}\n \n**Current Vote Count:**\n{vote_counts}")
-    except Exception as e:
-        logger.error(f"Error in vote_trip command: {e}")
-        await ctx.send("An error occurred while processing your vote. Please try again.")
 
-# Finalize a trip and get the full itinerary
-@bot.command(name="finalize_trip", help="Generate a full itinerary for the trip with the most votes")
-async def finalize_trip(ctx, *, arg=None):
-    try:
-        if ctx.guild.id not in trip_votes or not trip_votes[ctx.guild.id]["votes"]:
-            await ctx.send("No trips have been voted on yet! Use `!vote_trip` to cast your votes.")
-            return
-            
-        best_trip = max(trip_votes[ctx.guild.id]["votes"], key=trip_votes[ctx.guild.id]["votes"].get, default=None)
-        if not best_trip or trip_votes[ctx.guild.id]["votes"][best_trip] == 0:
-            await ctx.send("No votes have been cast yet!")
-            return
-        
-        # Include full trip details in the prompt
-        selected_trip_data = next((trip for trip in trip_votes[ctx.guild.id]["trips"] if trip["name"] == best_trip), None)
-        if not selected_trip_data:
-            await ctx.send("Error: Selected trip details not found.")
+            # Validate dates is either a month or a number format
+            months = ["january", "february", "march", "april", "may", "june", "july",
+                     "august", "september", "october", "november", "december",
+                     "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+
+            # Check if dates contains a month name
+            is_month = any(month in dates.lower() for month in months)
+            # Check if dates contains numbers (like MM/DD-MM/DD or just a number)
+            has_numbers = any(char.isdigit() for char in dates)
+
+            if not (is_month or has_numbers):
+                await output.send(ctx, "Dates must be either a month name (e.g., 'January', 'Feb') or a date format (e.g., '3/10-3/16', '15').")
+                return
+            key = session_key(ctx)
+            preference = {
+                "user": ctx.author.name,
+                "location": location,
+                "budget": budget,
+                "dates": dates,
+                "mode": mode.lower()
+            }
+            session_store.add_preference(*key, preference)
+            await publish(key, 'preference', preference)
+
+            # The guild's status message lists all preferences; it is edited rather than re-sent
+            await acknowledge(ctx)
+            refresh_status(ctx)
+        except Exception as e:
+            logger.error(f"Error submitting trip preferences: {e}")
+            await output.send(ctx, "An error occurred while submitting your preferences. Please try again.")
+
+    async def generate_trips(ctx, prompt_preferences, similar):
+        # AI answer is formatted as JSON; a similar session's trips, if any, are refined instead
+        if similar:
+            prompt = refinement_prompt(prompt_preferences, similar.trips)
+        else:
+            prompt = recommendation_prompt(prompt_preferences)
+        cache_key = recommendation_cache_key(prompt_preferences)
+        # Parse the streamed JSON incrementally so each trip is shown as soon as it is complete
+        parser = TripStreamParser()
+        raw_response = []
+        start = time.perf_counter()
+        try:
+            chunks = agent.stream_command(prompt, cache_key=cache_key, priority=Priority.BULK, validate=is_json_array)
+            async for chunk in chunks:
+                raw_response.append(chunk)
+                with JSON_PARSE_SECONDS.time("recommend_trips"):
+                    trips = parser.feed(chunk)
+                for trip in trips:
+                    header = "**AI-Recommended Trips:**\n" if len(parser.trips) == 1 else ""
+                    await output.send(ctx, header + format_trip(len(parser.trips), trip))
+        except Exception as e:
+            logger.error(f"Error calling AI service: {e}")
+            agent.discard(cache_key, structured=False)
+            await output.send(ctx, "Error: Failed to get recommendations from AI service. Please try again later.")
+            return None
+        elapsed = time.perf_counter() - start
+
+        trips = parser.trips
+        if parser.rejected or not trips:
+            # Don't serve the same broken response on retry
+            agent.discard(cache_key, structured=False)
+            logger.error(f"Invalid trips in AI response: {parser.rejected}")
+        if not trips:
+            response = "".join(raw_response)
+            await output.send(ctx, ("Error: AI response is not valid JSON. Here is what was returned:\n" + response)[:DISCORD_MESSAGE_LIMIT])
+            return None
+        if parser.rejected:
+            await output.send(ctx, f"Skipped {len(parser.rejected)} invalid trip(s): {'; '.join(parser.rejected)}"[:DISCORD_MESSAGE_LIMIT])
+
+        # A refined answer is stored at the cost of the full one it stands in for
+        if similar:
+            similarity_cache.record_refinement(similar, elapsed)
+            elapsed = max(elapsed, similar.latency)
+        similarity_cache.add(prompt_preferences, trips, elapsed)
+        return trips
+
+    # Recommend Trips
+    @bot.command(name="recommend_trips", help="AI recommends trips")
+    async def recommend_trips(ctx, *, arg=None):
+        # Only this guild's preferences; duplicates are aggregated and the prompt size is capped
+        key = session_key(ctx)
+        prompt_preferences = session_store.preferences(*key)
+        if not prompt_preferences:
+            await output.send(ctx, "No preferences submitted yet! Use `!submit_trips` first.")
             return
-            
-        trip_json = json.dumps(selected_trip_data, indent=2)
-        prompt = f"Generate a detailed and descriptive travel itinerary for the following trip. Ensure a daily schedule based on the details provided.\nTrip Details:\n{trip_json}"
-        
+        similar = similarity_cache.lookup(prompt_preferences)
+        if similar and similar.serve:
+            # A near-identical group was already answered
+            trips = similar.trips
+            try:
+                for number, trip in enumerate(trips, start=1):
+                    header = "**AI-Recommended Trips:**\n" if number == 1 else ""
+                    await output.send(ctx, header + format_trip(number, trip))
+            except Exception as e:
+                logger.error(f"Error sending recommended trips: {e}")
+                await output.send(ctx, "An error occurred while sending the recommended trips. Please try again.")
+                return
+        else:
+            trips = await generate_trips(ctx, prompt_preferences, similar)
+            if not trips:
+                return
+
+        # Store the trips for this session and reset its votes
+        session_store.set_trips(*key, trips)
+        if speculator:
+            speculator.reset(key)
+        await publish(key, 'recommendations', {"trips": trips})
+        # Post a fresh status below the trips so the tallies are in view while voting
+        output.forget(ctx.guild.id)
+        refresh_status(ctx)
+
+    # Vote trips command
+    @bot.command(name="vote_trip", help="Users vote for trips based on the number")
+    async def vote_trip(ctx, trip_number:int):
+        try:
+            key = session_key(ctx)
+            trip_list = session_store.trips(*key)
+            if not trip_list:
+                await output.send(ctx, "No trips available to vote on. Use `!recommend_trips` first.")
+                return
+
+            if trip_number < 1 or trip_number > len(trip_list):
+                await output.send(ctx, f"Invalid trip number! Please choose a number between 1 and {len(trip_list)}.")
+                return
+
+            # One ballot per member: voting again moves it to the new trip
+            await vote_batcher.submit(key, str(ctx.author.id), trip_number - 1)
+            # Tallies live in the status message, so a flurry of votes costs one edit
+            await acknowledge(ctx)
+            refresh_status(ctx)
+        except Exception as e:
+            logger.error(f"Error in vote_trip command: {e}")
+            await output.send(ctx, "An error occurred while processing your vote. Please try again.")
+
+    # Finalize a trip and get the full itinerary
+    @bot.command(name="finalize_trip", help="Generate a full itinerary for the trip with the most votes (add 'planner' to generate days in parallel)")
+    async def finalize_trip(ctx, *, arg=None):
         try:
-            response = await agent.run_command(prompt)
-            
-            # Remove excess blank lines and fix encoding issues
-            response = response.replace("\n\n\n", "\n").strip()
-            
-            # Ensure messages do not exceed Discord's 2000 character limit
-            if not response:
-                await ctx.send("Error: Received empty response from AI service.")
+            key = session_key(ctx)
+            board = session_store.leaderboard(*key)
+            if board is None:
+                await output.send(ctx, "No trips have been voted on yet! Use `!vote_trip` to cast your votes.")
                 return
-                
-            response_chunks = [response[i:i+1900] for i in range(0, len(response), 1900)]
-            await ctx.send("Finalized Trip Itinerary:")
-            for chunk in response_chunks:
-                await ctx.send(chunk)
-                
+
+            # The leaderboard is kept ranked as votes arrive
+            best_index, _ = board.leader()
+            if best_index is None:
+                await output.send(ctx, "No votes have been cast yet!")
+                return
+
+            # Include full trip details in the prompt
+            selected_trip_data = session_store.trips(*key)[best_index]
+            best_trip = selected_trip_data["name"]
+
+            prompt = itinerary_prompt(selected_trip_data)
+
+            try:
+                # Stream the itinerary into progressively edited embed pages
+                if arg and arg.strip().lower() == "planner":
+                    chunks = itinerary_planner.stream(selected_trip_data)
+                else:
+                    if speculator:
+                        # Waits for a speculative run still in progress; once it's done the itinerary is cached
+                        await speculator.claim(key, best_index)
+                    chunks = agent.stream_command(prompt, cache_key=itinerary_cache_key(selected_trip_data))
+                written = await output.stream(ctx, chunks, title=f"Finalized Trip Itinerary: {best_trip}")
+                if not written:
+                    await output.send(ctx, "Error: Received empty response from AI service.")
+                    return
+                await publish(key, 'finalized', {"trip_name": best_trip})
+
+            except Exception as e:
+                logger.error(f"Error calling AI service for itinerary: {e}")
+                await output.send(ctx, "Error: Failed to generate itinerary. Please try again later.")
+
         except Exception as e:
-            logger.error(f"Error calling AI service for itinerary: {e}")
-            await ctx.send("Error: Failed to generate itinerary. Please try again later.")
-            
+            logger.error(f"Error in finalize_trip command: {e}")
+            await output.send(ctx, "An error occurred while finalizing the trip. Please try again.")
+
+    # Plan together with a web session
+    @bot.command(name="link_session", help="Share preferences, trips and votes with a web session (no id: unlink)")
+    async def link_session(ctx, session_id: int = None):
+        if session_id is None:
+            session_store.unlink(SESSION_NAMESPACE, ctx.guild.id)
+        elif not session_store.exists(WEB_SESSION_NAMESPACE, session_id):
+            await output.send(ctx, f"Web session {session_id} not found.")
+            return
+        else:
+            session_store.link(SESSION_NAMESPACE, ctx.guild.id, WEB_SESSION_NAMESPACE, session_id)
+        await acknowledge(ctx)
+        # A fresh status for the session the guild now plans in
+        output.forget(ctx.guild.id)
+        refresh_status(ctx)
+
+    # Command to list all available commands
+    @bot.command(name="commands", help="Lists all available commands")
+    async def list_commands(ctx):
+        command_list = "".join(f"- !{command.name}: {command.help}\n" for command in bot.commands)
+        await output.send_pages(ctx, command_list, title="Available Commands")
+
+    # Global error handler for command not found
+    @bot.event
+    async def on_command_error(ctx, error):
+        if isinstance(error, commands.CommandNotFound):
+            # Extract the command name from the error message
+            command_name = ctx.message.content.split()[0][len(PREFIX):]
+            logger.error(f"Command not found: {command_name}")
+            await output.send(ctx, f"Error: Command '{command_name}' not found. Use !commands to see all available commands.")
+
+    return bot
+
+def discord_token():
+    # Get the token from the environment variables
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        logger.error("DISCORD_TOKEN environment variable not found. Please check your .env file.")
+        raise ValueError("DISCORD_TOKEN environment variable is required")
+    return token
+
+def main():
+    # Start the bot on its own, connecting it to the gateway (run_all.py runs it alongside the API)
+    token = discord_token()
+    bot = create_bot()
+    try:
+        bot.run(token)
+    except discord.errors.LoginFailure:
+        logger.error("Invalid Discord token. Please check your DISCORD_TOKEN in the .env file.")
     except Exception as e:
-        logger.error(f"Error in finalize_trip command: {e}")
-        await ctx.send("An error occurred while finalizing the trip. Please try again.")
-
-
-# Command to list all available commands
-@bot.command(name="commands", help="Lists all available commands")
-async def list_commands(ctx):
-    command_list = "**Available Commands:**\n"
-    for command in bot.commands:
-        command_list += f"- !{command.name}: {command.help}\n"
-    await ctx.send(command_list)
-
-# Global error handler for command not found
-@bot.event
-async def on_command_error(ctx, error):
-    if isinstance(error, commands.CommandNotFound):
-        # Extract the command name from the error message
-        command_name = ctx.message.content.split()[0][len(PREFIX):]
-        logger.error(f"Command not found: {command_name}")
-        await ctx.send(f"Error: Command '{command_name}' not found. Use !commands to see all available commands.")
-# Start the bot, connecting it to the gateway
-try:
-    bot.run(token)
-except discord.errors.LoginFailure:
-    logger.error("Invalid Discord token. Please check your DISCORD_TOKEN in the .env file.")
-except Exception as e:
-    logger.error(f"Error starting the bot: {e}")
+        logger.error(f"Error starting the bot: {e}")
+    finally:
+        bot.session_store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+
+import discord
+from discord.ext import commands
+
+# Read when the bot is built, after bot.py has loaded .env:
+# DISCORD_LEAN=1          only the intents and caches the commands need, on an AutoShardedBot
+# DISCORD_SHARD_COUNT=N   total shards across all processes (unset: Discord's recommendation in
+#                         lean mode, no sharding otherwise)
+# DISCORD_SHARD_IDS=0-3   shards this process runs, e.g. "0-3" or "0,2,4" (unset: all of them)
+
+
+def parse_shard_ids(spec: str | None) -> list[int] | None:
+    """``"0-3,8"`` -> ``[0, 1, 2, 3, 8]``; ``None`` or empty means every shard.
+
+    Raises ``ValueError`` for anything else, e.g. ``"3-1"``, ``"0,,2"`` or ``"a"``.
+    """
+    if not spec or not spec.strip():
+        return None
+    shard_ids = []
+    for part in spec.split(","):
+        start, dash, stop = part.strip().partition("-")
+        try:
+            first, last = int(start), int(stop if dash else start)
+        except ValueError:
+            raise ValueError(f"Invalid shard ids {spec!r}: {part.strip()!r} is not a number or range") from None
+        if first < 0 or last < first:
+            raise ValueError(f"Invalid shard ids {spec!r}: {part.strip()!r} is an empty range")
+        shard_ids.extend(range(first, last + 1))
+    return sorted(set(shard_ids))
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """The shard Discord routes a guild's events to, and so the process that owns its state."""
+    return (guild_id >> 22) % shard_count
+
+
+def lean_intents() -> discord.Intents:
+    # Commands read message content and the author's name from the message itself; no member
+    # list, presences, typing or voice events are needed
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.message_content = True
+    return intents
+
+
+def build_bot(command_prefix: str, lean: bool | None = None, shard_count: int | None = None,
+              shard_ids: list[int] | None = None) -> commands.Bot:
+    """The bot as configured for this process.
+
+    Default: today's single-connection bot with every intent. ``lean``: minimal intents, no
+    member cache, no guild chunking and no message cache, sharded automatically. Either mode
+    shards when ``shard_count`` is given; ``shard_ids`` limits this process to a range, so a
+    large deployment runs e.g. shards 0-3 and 4-7 in two processes. Each guild's events only
+    reach the process running ``shard_for_guild(guild_id, shard_count)``, so per-guild state
+    (session cache, status messages, speculations) never needs to be shared between them.
+    Arguments left as ``None`` come from the environment.
+    """
+    if lean is None:
+        lean = os.getenv("DISCORD_LEAN", "").lower() in ("1", "true", "yes")
+    if shard_count is None and os.getenv("DISCORD_SHARD_COUNT"):
+        shard_count = int(os.getenv("DISCORD_SHARD_COUNT"))
+    if shard_ids is None:
+        shard_ids = parse_shard_ids(os.getenv("DISCORD_SHARD_IDS"))
+    if shard_ids is not None and shard_count is None:
+        raise ValueError("DISCORD_SHARD_IDS requires DISCORD_SHARD_COUNT")
+    if lean:
+        return commands.AutoShardedBot(
+            command_prefix=command_prefix,
+            intents=lean_intents(),
+            member_cache_flags=discord.MemberCacheFlags.none(),
+            chunk_guilds_at_startup=False,
+            max_messages=None,
+            shard_count=shard_count,
+            shard_ids=shard_ids,
+        )
+    # The message content and members intent must be enabled in the Discord Developer Portal for the bot to work.
+    if shard_count is not None:
+        return commands.AutoShardedBot(command_prefix=command_prefix, intents=discord.Intents.all(),
+                                       shard_count=shard_count, shard_ids=shard_ids)
+    return commands.Bot(command_prefix=command_prefix, intents=discord.Intents.all())
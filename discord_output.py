@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import os
+import time
+
+import discord
+
+from backend.app.metrics import DISCORD_SEND_SECONDS
+from backend.app.rate_limit import TokenBucket
+from backend.app.tasks import BackgroundTasks
+
+logger = logging.getLogger("discord")
+
+# Discord limits: embed description, all embeds of one message together, embeds per message
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_TOTAL_LIMIT = 6000
+EMBEDS_PER_MESSAGE = 10
+EMBED_COLOR = 0xF4A7B9
+# Pages small enough that two fit in one message (titles and footers included)
+PAGE_SIZE = (EMBED_TOTAL_LIMIT - 200) // 2
+# Discord allows about 5 messages per 5 seconds per channel; stay inside it instead of hitting 429s
+CHANNEL_MESSAGES_PER_SECOND = 1.0
+CHANNEL_BURST = 5
+# Status changes within this many seconds of each other become one edit
+STATUS_DEBOUNCE = float(os.getenv("DISCORD_STATUS_DEBOUNCE", 1.5))
+# Minimum seconds between progressive edits of a streamed message
+STREAM_EDIT_INTERVAL = 1.0
+
+
+def paginate(text: str, limit: int = EMBED_DESCRIPTION_LIMIT) -> list[str]:
+    """Split text into pages of at most ``limit`` characters, preferring line breaks."""
+    pages = []
+    text = text.strip()
+    while len(text) > limit:
+        split = text.rfind("\n", 0, limit)
+        if split <= 0:
+            split = limit
+        pages.append(text[:split].rstrip())
+        text = text[split:].lstrip("\n")
+    if text:
+        pages.append(text)
+    return pages
+
+
+def truncate(text: str, limit: int) -> str:
+    """The first page of ``text`` that fits in ``limit`` characters, marked when something was cut."""
+    pages = paginate(text, limit - 2)
+    if len(pages) <= 1:
+        return pages[0] if pages else ""
+    return pages[0] + "\n…"
+
+
+def page_embeds(title: str | None, text: str, page_size: int = PAGE_SIZE) -> list[discord.Embed]:
+    """One embed per page, titled on the first page and numbered when there is more than one."""
+    pages = paginate(text, page_size)
+    embeds = []
+    for number, page in enumerate(pages, 1):
+        embed = discord.Embed(title=title if number == 1 else None, description=page, color=EMBED_COLOR)
+        if len(pages) > 1:
+            embed.set_footer(text=f"Page {number}/{len(pages)}")
+        embeds.append(embed)
+    return embeds
+
+
+def _channel(target):
+    # Commands pass their Context; everything else is already a channel
+    return getattr(target, "channel", target)
+
+
+class _Status:
+    __slots__ = ("channel", "message", "render", "scheduled", "lock")
+
+    def __init__(self, channel, render):
+        self.channel = channel
+        self.message = None
+        self.render = render
+        self.scheduled = False
+        self.lock = asyncio.Lock()
+
+
+class OutputPipeline:
+    """Everything the bot writes to Discord goes through here.
+
+    Sends and edits wait on a per-channel token bucket, so bursts queue locally instead of
+    running into Discord's rate limits. Each guild has one live status message (preferences and
+    vote tallies) that is edited in place; updates within ``debounce`` seconds are coalesced
+    into a single edit. Long text goes out as numbered embed pages, several per message.
+    """
+
+    def __init__(self, debounce: float = STATUS_DEBOUNCE, rate: float = CHANNEL_MESSAGES_PER_SECOND,
+                 burst: int = CHANNEL_BURST):
+        self.debounce = debounce
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._statuses = {}
+        self._tasks = BackgroundTasks()
+
+        self.messages_sent = 0
+        self.edits = 0
+        self.status_updates = 0
+        self.status_edits = 0
+
+    def _bucket(self, channel) -> TokenBucket:
+        bucket = self._buckets.get(channel.id)
+        if bucket is None:
+            bucket = self._buckets[channel.id] = TokenBucket(self.rate, capacity=self.burst)
+        return bucket
+
+    async def send(self, target, content: str | None = None, **kwargs) -> discord.Message:
+        channel = _channel(target)
+        with DISCORD_SEND_SECONDS.time("send"):
+            await self._bucket(channel).acquire()
+            self.messages_sent += 1
+            return await channel.send(content, **kwargs)
+
+    async def edit(self, message: discord.Message, **kwargs) -> discord.Message:
+        with DISCORD_SEND_SECONDS.time("edit"):
+            await self._bucket(message.channel).acquire()
+            self.edits += 1
+            return await message.edit(**kwargs)
+
+    async def send_pages(self, target, text: str, title: str | None = None):
+        """Send long text as embed pages, packing as many pages into each message as Discord allows."""
+        batch, size = [], 0
+        for embed in page_embeds(title, text):
+            if batch and (len(batch) == EMBEDS_PER_MESSAGE or size + len(embed) > EMBED_TOTAL_LIMIT):
+                await self.send(target, embeds=batch)
+                batch, size = [], 0
+            batch.append(embed)
+            size += len(embed)
+        if batch:
+            await self.send(target, embeds=batch)
+
+    async def stream(self, target, chunks, title: str | None = None) -> int:
+        """
+        Writes a stream of text chunks into embeds, editing the latest one as text arrives and
+        starting a new page whenever the description limit is reached.
+        Returns the number of characters written.
+        """
+        message = None
+        pending = ""
+        written = 0
+        last_edit = 0.0
+        page = 1
+        limit = EMBED_DESCRIPTION_LIMIT - 100
+
+        def embed(text):
+            return discord.Embed(title=title if page == 1 else None, description=text, color=EMBED_COLOR)
+
+        async def show(text):
+            nonlocal message
+            if message is None:
+                message = await self.send(target, embed=embed(text))
+            else:
+                await self.edit(message, embed=embed(text))
+
+        async for chunk in chunks:
+            pending = (pending + chunk).replace("\n\n\n", "\n")
+            written += len(chunk)
+
+            # Roll over to a new page at the limit, preferring a line break
+            while len(pending) > limit:
+                split = pending.rfind("\n", 0, limit)
+                if split <= 0:
+                    split = limit
+                head, pending = pending[:split], pending[split:].lstrip("\n")
+                await show(head)
+                message = None
+                page += 1
+
+            now = time.monotonic()
+            if pending.strip() and now - last_edit >= STREAM_EDIT_INTERVAL:
+                await show(pending)
+                last_edit = now
+
+        # Flush whatever arrived since the last edit
+        if pending.strip():
+            await show(pending.strip())
+        return written
+
+    def update_status(self, guild_id, target, render):
+        """Schedule a refresh of the guild's status message.
+
+        ``render()`` returns the ``discord.Embed`` to show and is called once per debounce
+        window, however many updates arrived in it. A status moved to another channel is
+        posted there as a new message.
+        """
+        channel = _channel(target)
+        self.status_updates += 1
+        status = self._statuses.get(guild_id)
+        if status is None or status.channel.id != channel.id:
+            status = self._statuses[guild_id] = _Status(channel, render)
+        status.render = render
+        if status.scheduled:
+            return
+        status.scheduled = True
+        asyncio.get_running_loop().call_later(self.debounce, self._start_flush, status)
+
+    def _start_flush(self, status: _Status):
+        self._tasks.spawn(self._flush_status(status))
+
+    async def _flush_status(self, status: _Status):
+        async with status.lock:
+            status.scheduled = False
+            try:
+                embed = status.render()
+                if status.message is not None:
+                    try:
+                        await self.edit(status.message, embed=embed)
+                        self.status_edits += 1
+                        return
+                    except discord.NotFound:
+                        # Someone deleted it; post a fresh one
+                        status.message = None
+                status.message = await self.send(status.channel, embed=embed)
+            except Exception as e:
+                logger.error(f"Error updating status message: {e!r}")
+
+    def forget(self, guild_id):
+        """Stop editing the guild's current status message; the next update posts a new one."""
+        self._statuses.pop(guild_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "messages_sent": self.messages_sent,
+            "edits": self.edits,
+            "status_updates": self.status_updates,
+            "status_edits": self.status_edits,
+            "channels": len(self._buckets),
+        }
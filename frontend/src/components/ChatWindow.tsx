@@ -3,7 +3,17 @@ import io from 'socket.io-client';
 import MapView from './MapView'; // Import MapView
 import ItineraryDisplay from './ItineraryDisplay'; // Import ItineraryDisplay
 
-const socket = io('http://localhost:8000'); // Keep WebSocket for potential future use
+// Live session updates (preferences, recommendations, vote counts, finalize) and POI job results
+const socket = io('http://localhost:8000', { transports: ['websocket'] });
+
+// One ballot per voter: a stable id per browser, so voting again moves the vote instead of adding one
+const voterId = (() => {
+  const stored = localStorage.getItem('voterId');
+  if (stored) return stored;
+  const id = `web_${Math.random().toString(36).slice(2)}${Date.now().toString(36)}`;
+  localStorage.setItem('voterId', id);
+  return id;
+})();
 
 const ChatWindow: React.FC = () => {
   const [message, setMessage] = useState('');
@@ -11,36 +21,64 @@ const ChatWindow: React.FC = () => {
   const [mapCenter, setMapCenter] = useState<[number, number] | null>(null); // State for map center
   const [weatherData, setWeatherData] = useState<any>(null); // State for weather data
   const [pointsOfInterest, setPointsOfInterest] = useState<any[]>([]); // State for points of interest
+  const [poiWeather, setPoiWeather] = useState<any[]>([]); // Weather for each point of interest, same order
   const [recommendedTrips, setRecommendedTrips] = useState<any[]>([]); // State for recommended trips
+  const [votes, setVotes] = useState<Record<number, number>>({}); // Vote count per trip index, kept current over the socket
   const [sessionId, setSessionId] = useState<number | null>(null); // State for session ID
-  const [itinerary, setItinerary] = useState<string | null>(null); // State for itinerary
+  const [itineraryStreamUrl, setItineraryStreamUrl] = useState<string | null>(null); // SSE URL for the streamed itinerary
 
-  // Optional: Keep WebSocket connection open for real-time features later
   useEffect(() => {
-    // Generate a simple session ID on component mount
+    // Get a session ID from the backend on component mount (unique across backend workers)
     if (sessionId === null) {
-        setSessionId(Math.floor(Math.random() * 1000000)); // Simple random ID for now
+        fetch('http://localhost:8000/sessions', { method: 'POST' })
+            .then((response) => response.json())
+            .then((data) => setSessionId(data.session_id))
+            .catch((error) => console.error('Error creating session:', error));
     }
+  }, [sessionId]);
 
-    socket.on('connect', () => {
-      console.log('WebSocket connected');
-    });
+  // Everyone in the session's room sees each other's preferences and votes as they happen
+  useEffect(() => {
+    if (sessionId === null) return;
 
-    socket.on('disconnect', () => {
-      console.log('WebSocket disconnected');
-    });
+    const joinSession = () => {
+      // The join reply carries the current tallies; 'votes' events then only carry changed counts
+      socket.emit('join_session', { session_id: sessionId }, (reply: any) => {
+        if (reply && reply.votes) setVotes(reply.votes);
+      });
+    };
 
-    // Example of receiving a message via WebSocket (if backend sends any)
-    socket.on('message', (msg: string) => {
-       console.log('Received WebSocket message:', msg);
-       // setMessages((prevMessages) => [...prevMessages, { text: `WebSocket: ${msg}`, sender: 'ai' }]);
-    });
+    const onPreference = (data: any) => {
+      console.log('Preference submitted:', data);
+    };
+    const onRecommendations = (data: any) => {
+      setRecommendedTrips(data.trips);
+      setVotes({});
+    };
+    const onVotes = (data: any) => {
+      setVotes((prevVotes) => ({ ...prevVotes, ...data.votes }));
+    };
+    const onFinalized = () => {
+      // Whoever finalized is already streaming; everyone else opens the (now cached) itinerary
+      setItineraryStreamUrl((prevUrl) => prevUrl ?? `http://localhost:8000/finalize_trip/${sessionId}/stream?t=${Date.now()}`);
+    };
 
+    socket.on('connect', joinSession); // Rooms don't survive a reconnect
+    socket.on('preference', onPreference);
+    socket.on('recommendations', onRecommendations);
+    socket.on('votes', onVotes);
+    socket.on('finalized', onFinalized);
+    if (socket.connected) joinSession();
 
     return () => {
-      socket.disconnect();
+      socket.emit('leave_session', { session_id: sessionId });
+      socket.off('connect', joinSession);
+      socket.off('preference', onPreference);
+      socket.off('recommendations', onRecommendations);
+      socket.off('votes', onVotes);
+      socket.off('finalized', onFinalized);
     };
-  }, [sessionId]); // Add sessionId to dependency array
+  }, [sessionId]);
 
   const sendMessage = async () => {
     if (message.trim()) {
@@ -77,8 +115,13 @@ const ChatWindow: React.FC = () => {
           if (placesData && Array.isArray(placesData)) {
             setPointsOfInterest(placesData); // Set points of interest data
             console.log("Received points of interest:", placesData);
+            fetchPoiWeather(placesData);
+            if (data.poi_job_id) {
+              watchPoiJob(data.poi_job_id); // Coordinates for the unverified points arrive in the background
+            }
           } else {
              setPointsOfInterest([]); // Clear previous points of interest if no data or invalid format
+             setPoiWeather([]);
           }
 
           // Handle recommended trips from chat endpoint (if AI provides them here)
@@ -119,6 +162,78 @@ const ChatWindow: React.FC = () => {
     }
   };
 
+  const showResolvedPois = (places: any[]) => {
+    setPointsOfInterest(places);
+    fetchPoiWeather(places);
+  };
+
+  // The backend pushes the POI job's result over the socket; poll only when it isn't connected
+  const watchPoiJob = (jobId: string) => {
+    if (!socket.connected) {
+      pollPoiJob(jobId);
+      return;
+    }
+    const onPoiJob = (data: any) => {
+      if (data.job_id !== jobId) return;
+      socket.off('poi_job', onPoiJob);
+      showResolvedPois(data.points_of_interest);
+    };
+    socket.on('poi_job', onPoiJob);
+    socket.emit('watch_poi_job', { job_id: jobId }, (reply: any) => {
+      if (!reply || reply.status === 'pending') return;
+      // Already finished (or expired) before we started watching
+      socket.off('poi_job', onPoiJob);
+      if (reply.points_of_interest) showResolvedPois(reply.points_of_interest);
+    });
+  };
+
+  // Poll the backend's POI resolution job until it settles, then show the resolved coordinates
+  const pollPoiJob = async (jobId: string) => {
+    const deadline = Date.now() + 30000;
+    while (Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, 1500));
+      try {
+        const response = await fetch(`http://localhost:8000/geocode/jobs/${jobId}`);
+        const data = await response.json();
+        if (data.error) {
+          console.error("POI job error:", data.error);
+          return;
+        }
+        if (data.status !== 'pending') {
+          showResolvedPois(data.points_of_interest);
+          return;
+        }
+      } catch (error) {
+        console.error("Error polling points of interest:", error);
+        return;
+      }
+    }
+  };
+
+  // Weather for every point of interest in one request; the backend dedupes nearby points
+  const fetchPoiWeather = async (places: any[]) => {
+    setPoiWeather([]);
+    const located = places.filter((poi) => typeof poi.latitude === 'number' && typeof poi.longitude === 'number');
+    if (located.length === 0) return;
+    try {
+      const response = await fetch('http://localhost:8000/weather/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ points: located.map((poi) => ({ lat: poi.latitude, lon: poi.longitude })) }),
+      });
+      const data = await response.json();
+      if (data.results) {
+        // Line results back up with the full list, including points without coordinates
+        const results = [...data.results];
+        setPoiWeather(places.map((poi) => (located.includes(poi) ? results.shift() : null)));
+      } else {
+        console.error("Weather batch error:", data.error);
+      }
+    } catch (error) {
+      console.error("Error fetching weather for points of interest:", error);
+    }
+  };
+
   const fetchWeatherData = async (lat: number, lon: number) => {
     try {
       const response = await fetch(`http://localhost:8000/weather?lat=${lat}&lon=${lon}`);
@@ -167,31 +282,34 @@ const ChatWindow: React.FC = () => {
   };
 
   // Function to fetch recommendations
-  const fetchRecommendations = async (sessionId: number) => {
-      try {
-          const response = await fetch(`http://localhost:8000/get_recommendations/${sessionId}`);
-          if (response.ok) {
-              const data = await response.json();
-              if (data.recommendations) {
-                  setRecommendedTrips(data.recommendations);
-                  setMessages((prevMessages) => [...prevMessages, { text: "Here are some trip recommendations:", sender: 'ai' }]);
-                  // TODO: Display recommendations in a user-friendly format in chat
-              } else if (data.error) {
-                  console.error("Error fetching recommendations:", data.error);
-                  setRecommendedTrips([]);
-              }
-          } else {
-              console.error("Error fetching recommendations:", response.statusText);
-              setRecommendedTrips([]);
+  // Streams over Server-Sent Events so each trip renders as soon as the backend has parsed it
+  const fetchRecommendations = (sessionId: number) => {
+      setRecommendedTrips([]);
+      const source = new EventSource(`http://localhost:8000/get_recommendations/${sessionId}/stream`);
+      let tripsReceived = 0;
+
+      source.addEventListener('trip', (event) => {
+          const trip = JSON.parse((event as MessageEvent).data);
+          if (tripsReceived === 0) {
+              setMessages((prevMessages) => [...prevMessages, { text: "Here are some trip recommendations:", sender: 'ai' }]);
           }
-      } catch (error) {
-          console.error("Error fetching recommendations:", error);
-          setRecommendedTrips([]);
-      }
+          tripsReceived += 1;
+          setRecommendedTrips((prevTrips) => [...prevTrips, trip]);
+      });
+
+      source.addEventListener('done', () => {
+          source.close();
+      });
+
+      source.addEventListener('error', (event) => {
+          const messageEvent = event as MessageEvent;
+          console.error("Error fetching recommendations:", messageEvent.data ? JSON.parse(messageEvent.data).error : 'stream closed');
+          source.close();
+      });
   };
 
   // Function to vote for a trip (example)
-  const voteForTrip = async (tripName: string) => {
+  const voteForTrip = async (tripIndex: number) => {
        if (sessionId === null) return;
 
        try {
@@ -200,13 +318,12 @@ const ChatWindow: React.FC = () => {
                headers: {
                    'Content-Type': 'application/json',
                },
-               body: JSON.stringify({ session_id: sessionId, user: "web_user", trip_name: tripName }),
+               body: JSON.stringify({ session_id: sessionId, user: voterId, trip_index: tripIndex }),
            });
 
            if (response.ok) {
                const data = await response.json();
-               console.log(data.message);
-               // TODO: Update vote count display
+               console.log(data.message); // The new count arrives with the session's next 'votes' event
            } else {
                console.error("Error voting for trip:", response.statusText);
            }
@@ -216,29 +333,12 @@ const ChatWindow: React.FC = () => {
   };
 
   // Function to finalize a trip (example)
-  const finalizeTrip = async () => {
+  const finalizeTrip = () => {
       if (sessionId === null) return;
 
-      try {
-          const response = await fetch(`http://localhost:8000/finalize_trip/${sessionId}`);
-          if (response.ok) {
-              const data = await response.json();
-              if (data.itinerary) {
-                  setItinerary(data.itinerary); // Set itinerary state
-                  setMessages((prevMessages) => [...prevMessages, { text: "Here is the finalized itinerary:", sender: 'ai' }]);
-                  // TODO: Display finalized trip and itinerary in a user-friendly format
-              } else if (data.error) {
-                  console.error("Error finalizing trip:", data.error);
-                  setMessages((prevMessages) => [...prevMessages, { text: `Error finalizing trip: ${data.error}`, sender: 'ai' }]);
-              }
-          } else {
-              console.error("Error finalizing trip:", response.statusText);
-              setMessages((prevMessages) => [...prevMessages, { text: 'Error finalizing trip.', sender: 'ai' }]);
-          }
-      } catch (error) {
-          console.error("Error finalizing trip:", error);
-          setMessages((prevMessages) => [...prevMessages, { text: 'Error finalizing trip.', sender: 'ai' }]);
-      }
+      // ItineraryDisplay consumes the Server-Sent Events stream, so text shows up as it is generated
+      setItineraryStreamUrl(`http://localhost:8000/finalize_trip/${sessionId}/stream?t=${Date.now()}`);
+      setMessages((prevMessages) => [...prevMessages, { text: "Here is the finalized itinerary:", sender: 'ai' }]);
   };
 
 
@@ -281,6 +381,7 @@ const ChatWindow: React.FC = () => {
                                 {(poi.tags && poi.tags.tourism) && <span> ({poi.tags.tourism})</span>}
                                 {(poi.tags && poi.tags.amenity) && <span> ({poi.tags.amenity})</span>}
                                 {(poi.tags && poi.tags.shop) && <span> ({poi.tags.shop})</span>}
+                                {poiWeather[index] && poiWeather[index].main && <span> - {poiWeather[index].main.temp}°C</span>}
                             </li>
                         ))}
                     </ul>
@@ -296,8 +397,8 @@ const ChatWindow: React.FC = () => {
                     <ul className="list-disc list-inside">
                         {recommendedTrips.map((trip, index) => (
                             <li key={index}>
-                                <strong>{trip.name}</strong> ({trip.trip_style})
-                                <button onClick={() => voteForTrip(trip.name)} className="ml-2 px-2 py-1 bg-white text-primary-pink rounded">Vote</button>
+                                <strong>{trip.name}</strong> ({trip.trip_style}) - {votes[index] || 0} votes
+                                <button onClick={() => voteForTrip(index)} className="ml-2 px-2 py-1 bg-white text-primary-pink rounded">Vote</button>
                             </li>
                         ))}
                     </ul>
@@ -307,9 +408,9 @@ const ChatWindow: React.FC = () => {
         )}
 
         {/* Display Itinerary */}
-        {itinerary && (
+        {itineraryStreamUrl && (
             <div className="mb-4">
-                <ItineraryDisplay itinerary={itinerary} />
+                <ItineraryDisplay streamUrl={itineraryStreamUrl} />
             </div>
         )}
 
@@ -1,12 +1,53 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 
 interface ItineraryDisplayProps {
-  itinerary: string;
+  itinerary?: string;
+  streamUrl?: string; // Server-Sent Events endpoint, e.g. /finalize_trip/{sessionId}/stream
 }
 
-const ItineraryDisplay: React.FC<ItineraryDisplayProps> = ({ itinerary }) => {
+const ItineraryDisplay: React.FC<ItineraryDisplayProps> = ({ itinerary, streamUrl }) => {
+  const [streamedText, setStreamedText] = useState('');
+  const [streamError, setStreamError] = useState<string | null>(null);
+  const [isStreaming, setIsStreaming] = useState(false);
+
+  // Append text deltas as the backend streams them, so the itinerary shows up token by token
+  useEffect(() => {
+    if (!streamUrl) return;
+
+    setStreamedText('');
+    setStreamError(null);
+    setIsStreaming(true);
+    const source = new EventSource(streamUrl);
+
+    source.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.delta) {
+        setStreamedText((prevText) => prevText + data.delta);
+      }
+    };
+
+    source.addEventListener('done', () => {
+      setIsStreaming(false);
+      source.close();
+    });
+
+    source.addEventListener('error', (event) => {
+      // Named "error" events carry a payload; connection errors don't
+      const messageEvent = event as MessageEvent;
+      setStreamError(messageEvent.data ? JSON.parse(messageEvent.data).error : 'Connection to the itinerary stream was lost.');
+      setIsStreaming(false);
+      source.close();
+    });
+
+    return () => {
+      source.close();
+    };
+  }, [streamUrl]);
+
+  const text = streamUrl ? streamedText : itinerary || '';
+
   // Basic formatting: split by lines and display as paragraphs or list items
-  const formattedItinerary = itinerary.split('\n').map((line, index) => {
+  const formattedItinerary = text.replace(/\n\n\n/g, '\n').split('\n').map((line, index) => {
     // Simple heuristic to detect potential list items or headings
     if (line.trim().startsWith('- ')) {
       return <li key={index} className="ml-4">{line.trim().substring(2)}</li>;
@@ -21,6 +62,8 @@ const ItineraryDisplay: React.FC<ItineraryDisplayProps> = ({ itinerary }) => {
   return (
     <div className="bg-soft-pink text-text-gray p-3 rounded-lg max-w-xs overflow-y-auto">
       <strong>Detailed Itinerary:</strong>
+      {isStreaming && !text && <p className="mt-1 italic">Generating itinerary...</p>}
+      {streamError && <p className="mt-1 text-primary-pink">{streamError}</p>}
       <ul className="list-none p-0 m-0">
         {formattedItinerary}
       </ul>
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import os
+
+import discord
+import uvicorn
+from dotenv import load_dotenv
+
+logger = logging.getLogger("discord")
+
+# The API and the Discord bot in one process, on one event loop. They share the Mistral agent
+# (one connection pool, response cache and rate limiter), the session store, the speculator and
+# the Socket.IO server, so a guild that ran `!link_session <id>` plans in the same session as
+# the web planners, who see its preferences and votes live.
+#
+#   python run_all.py           API on API_HOST:API_PORT (default 0.0.0.0:8000), bot on DISCORD_TOKEN
+#
+# Both can still run separately: `uvicorn backend.app.main:socket_app` and `python bot.py`
+# (with SESSION_STORE=shared and one SESSION_DB_PATH, linked guilds work across processes too).
+API_HOST = "0.0.0.0"
+API_PORT = 8000
+
+
+async def serve(token: str, host: str, port: int):
+    # Imported here so .env is loaded before the modules read their settings
+    from backend.app import main as api
+    from bot import create_bot
+
+    bot = create_bot(agent=api.mistral_agent, session_store=api.session_store, speculator=api.speculator,
+                     broadcaster=api.broadcaster, similarity_cache=api.similarity_cache)
+    # Disconnect the bot before the API's shutdown handler closes the shared store and clients
+    api.app.router.on_shutdown.insert(0, bot.close)
+    server = uvicorn.Server(uvicorn.Config(api.socket_app, host=host, port=port))
+
+    bot_task = asyncio.ensure_future(bot.start(token))
+    # A bot that can't run (bad token, fatal gateway error) takes the API down with it
+    bot_task.add_done_callback(lambda task: setattr(server, "should_exit", True))
+    try:
+        await server.serve()
+    finally:
+        if not bot.is_closed():
+            await bot.close()
+        try:
+            await bot_task
+        except discord.errors.LoginFailure:
+            logger.error("Invalid Discord token. Please check your DISCORD_TOKEN in the .env file.")
+        except Exception as e:
+            logger.error(f"Error running the bot: {e}")
+
+
+def main():
+    load_dotenv()
+    from bot import discord_token
+
+    token = discord_token()
+    discord.utils.setup_logging()
+    asyncio.run(serve(token, os.getenv("API_HOST", API_HOST), int(os.getenv("API_PORT", API_PORT))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import asyncio
+from types import SimpleNamespace
+
+from backend.app.session_store import SessionStore
+from backend.app.similarity_cache import SimilarityCache
+from bot import create_bot
+from discord_output import OutputPipeline
+
+PREFERENCE = {"user": "ana", "location": "Lisbon", "budget": "1500", "dates": "May", "mode": "food"}
+TRIPS = [{"name": "Lisbon", "dates": "May", "trip_style": "food", "budget": "1500", "activities": ["tascas"]}]
+
+
+class FakeChannel:
+    """A text channel whose first ``failures`` sends raise, like a missing permission."""
+
+    def __init__(self, channel_id, failures=0):
+        self.id = channel_id
+        self.failures = failures
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Missing Permissions")
+        self.sent.append(content)
+        return SimpleNamespace(channel=self)
+
+
+def context(channel):
+    return SimpleNamespace(guild=SimpleNamespace(id=channel.id), author=SimpleNamespace(id="ana", name="ana"),
+                           channel=channel)
+
+
+def test_failing_to_send_similar_trips_is_reported_not_raised():
+    async def run():
+        store = SessionStore(path=None)
+        similar = SimilarityCache()
+        similar.add([PREFERENCE], TRIPS, latency=5.0)
+        bot = create_bot(session_store=store, similarity_cache=similar,
+                         output=OutputPipeline(debounce=0.01, rate=1000, burst=1000))
+        channel = FakeChannel(channel_id=3, failures=1)
+        store.add_preference("discord", channel.id, PREFERENCE)
+        await bot.get_command("recommend_trips")(context(channel))
+        return channel, store
+
+    channel, store = asyncio.run(run())
+    assert channel.sent == [
+        "An error occurred while sending the recommended trips. Please try again."]
+    assert store.trips("discord", 3) is None
@@ -0,0 +1,58 @@
+import discord
+import pytest
+from discord.ext import commands
+
+from bot_config import build_bot, parse_shard_ids, shard_for_guild
+
+
+@pytest.mark.parametrize("spec, shard_ids", [
+    ("0-3", [0, 1, 2, 3]),
+    ("0-3,8", [0, 1, 2, 3, 8]),
+    (" 4 , 2-3, 3 ", [2, 3, 4]),
+    ("5", [5]),
+    ("7-7", [7]),
+])
+def test_parse_shard_ids(spec, shard_ids):
+    assert parse_shard_ids(spec) == shard_ids
+
+
+@pytest.mark.parametrize("spec", [None, "", "   "])
+def test_no_shard_ids_means_every_shard(spec):
+    assert parse_shard_ids(spec) is None
+
+
+@pytest.mark.parametrize("spec", ["a", "0,,2", "1-", "-1", "3-1", "0-x", "0;1"])
+def test_malformed_shard_ids_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_shard_ids(spec)
+
+
+def test_guilds_map_to_the_shard_discord_uses():
+    assert shard_for_guild(0, 4) == 0
+    assert shard_for_guild(5 << 22, 4) == 1
+
+
+def test_lean_bot_caches_nothing_it_does_not_need():
+    bot = build_bot("!", lean=True, shard_count=8, shard_ids=[0, 1, 2, 3])
+    assert isinstance(bot, commands.AutoShardedBot)
+    assert bot.shard_count == 8 and bot.shard_ids == [0, 1, 2, 3]
+    assert bot.intents.message_content and bot.intents.guild_messages
+    assert not bot.intents.members and not bot.intents.presences
+    assert bot._connection.max_messages is None
+
+
+def test_default_bot_is_unsharded_with_every_intent(monkeypatch):
+    for name in ("DISCORD_LEAN", "DISCORD_SHARD_COUNT", "DISCORD_SHARD_IDS"):
+        monkeypatch.delenv(name, raising=False)
+    bot = build_bot("!")
+    assert type(bot) is commands.Bot
+    assert bot.intents == discord.Intents.all()
+
+
+def test_shard_ids_from_the_environment_need_a_shard_count(monkeypatch):
+    monkeypatch.setenv("DISCORD_SHARD_IDS", "0-1")
+    monkeypatch.delenv("DISCORD_SHARD_COUNT", raising=False)
+    with pytest.raises(ValueError):
+        build_bot("!")
+    monkeypatch.setenv("DISCORD_SHARD_COUNT", "2")
+    assert build_bot("!").shard_ids == [0, 1]
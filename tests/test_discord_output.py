@@ -0,0 +1,111 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import discord
+
+from discord_output import EMBED_DESCRIPTION_LIMIT, OutputPipeline, paginate
+
+
+class FakeMessage:
+    def __init__(self, channel, kwargs):
+        self.channel = channel
+        self.kwargs = kwargs
+        self.edits = []
+
+    async def edit(self, **kwargs):
+        self.edits.append(kwargs)
+        self.kwargs = kwargs
+        return self
+
+
+class FakeChannel:
+    def __init__(self, channel_id=1, failures=0):
+        self.id = channel_id
+        self.failures = failures
+        self.messages = []
+        self.sent_at = []
+
+    async def send(self, content=None, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Missing Permissions")
+        self.sent_at.append(time.monotonic())
+        message = FakeMessage(self, {"content": content, **kwargs})
+        self.messages.append(message)
+        return message
+
+
+def description(message) -> str:
+    return message.kwargs["embed"].description
+
+
+def test_paginate_prefers_line_breaks_and_keeps_every_line():
+    lines = [f"line {number} " + "x" * (number % 50) for number in range(400)]
+    pages = paginate("\n".join(lines), limit=500)
+    assert all(len(page) <= 500 for page in pages)
+    assert "\n".join(pages).split("\n") == lines
+    # A single line longer than the limit is cut at the limit
+    assert [len(page) for page in paginate("y" * 1200, limit=500)] == [500, 500, 200]
+
+
+def test_stream_rolls_over_to_a_new_message_at_the_limit():
+    async def run():
+        channel = FakeChannel()
+        output = OutputPipeline(rate=1000, burst=1000)
+        lines = [f"Day {number}:" + " walk" * 40 for number in range(60)]
+
+        async def chunks():
+            for line in lines:
+                yield line + "\n"
+
+        written = await output.stream(channel, chunks(), title="Itinerary")
+        return channel, lines, written
+
+    channel, lines, written = asyncio.run(run())
+    assert len(channel.messages) > 1
+    assert written == sum(len(line) + 1 for line in lines)
+    assert all(len(description(message)) <= EMBED_DESCRIPTION_LIMIT for message in channel.messages)
+    assert "\n".join(description(message) for message in channel.messages).split("\n") == lines
+    # Only the first page carries the title
+    assert [message.kwargs["embed"].title for message in channel.messages][:2] == ["Itinerary", None]
+
+
+def test_status_updates_within_the_window_become_one_edit():
+    async def run():
+        channel = FakeChannel()
+        output = OutputPipeline(debounce=0.02, rate=1000, burst=1000)
+        renders = []
+
+        def render(text):
+            def embed():
+                renders.append(text)
+                return discord.Embed(description=text)
+            return embed
+
+        for text in ("a", "b", "c"):
+            output.update_status(7, channel, render(text))
+        await asyncio.sleep(0.05)
+        for text in ("d", "e"):
+            output.update_status(7, SimpleNamespace(channel=channel), render(text))
+        await asyncio.sleep(0.05)
+        return channel, renders, output.stats()
+
+    channel, renders, stats = asyncio.run(run())
+    assert renders == ["c", "e"]
+    assert len(channel.messages) == 1 and len(channel.messages[0].edits) == 1
+    assert description(channel.messages[0]) == "e"
+    assert stats["status_updates"] == 5 and stats["status_edits"] == 1
+
+
+def test_sends_beyond_the_burst_wait_for_the_channel_rate():
+    async def run():
+        channel = FakeChannel()
+        output = OutputPipeline(rate=50, burst=2)
+        await asyncio.gather(*(output.send(channel, f"message {number}") for number in range(6)))
+        return channel
+
+    channel = asyncio.run(run())
+    assert len(channel.messages) == 6
+    # Two go out at once, the other four at 50 per second
+    assert channel.sent_at[-1] - channel.sent_at[0] >= 4 / 50 * 0.9
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.app import main
+from backend.app.agent import MistralAgent
+from backend.app.llm_cache import ResponseCache
+from backend.app.session_store import SessionStore
+from backend.app.speculation import Speculator
+
+TRIPS = [{"name": "Lisbon"}, {"name": "Tokyo"}]
+
+
+class FakeAgent(MistralAgent):
+    def __init__(self):
+        super().__init__(cache=ResponseCache(), hedger=None)
+        self.calls = 0
+
+    async def _complete(self, prompt_messages, priority, validate=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if kwargs.get("response_format"):
+            return json.dumps({"recommended_trip": "Day 1: Shibuya", "location": "Tokyo"})
+        return "Day 1: Shibuya"
+
+
+@pytest.fixture
+def app(monkeypatch):
+    store = SessionStore(path=None)
+    agent = FakeAgent()
+    monkeypatch.setattr(main, "session_store", store)
+    monkeypatch.setattr(main, "mistral_agent", agent)
+    monkeypatch.setattr(main, "speculator", None)
+    session_id = store.create_session(main.SESSION_NAMESPACE)
+    store.set_trips(main.SESSION_NAMESPACE, session_id, TRIPS)
+    store.cast_votes(main.SESSION_NAMESPACE, session_id, [("ana", 1), ("ben", 1)])
+    return session_id, agent
+
+
+def speculate(monkeypatch, session_id, **kwargs):
+    speculator = Speculator(main._speculate_itinerary, margin=1, **kwargs)
+    monkeypatch.setattr(main, "speculator", speculator)
+    board = main.session_store.leaderboard(main.SESSION_NAMESPACE, session_id)
+    speculator.observe((main.SESSION_NAMESPACE, session_id), board, TRIPS)
+    return speculator
+
+
+def test_speculated_and_generated_itineraries_are_identical(app, monkeypatch):
+    session_id, agent = app
+
+    async def run():
+        generated = await main.finalize_trip_endpoint(session_id)
+        # The same itinerary again, this time produced by a speculation
+        agent.cache = ResponseCache()
+        speculator = speculate(monkeypatch, session_id)
+        speculated = await main.finalize_trip_endpoint(session_id)
+        return generated, speculated, speculator.stats()
+
+    generated, speculated, stats = asyncio.run(run())
+    assert generated == speculated
+    assert generated["itinerary"] == "Day 1: Shibuya"
+    assert stats["used"] == 1 and agent.calls == 2
+
+
+def test_expired_speculation_is_still_served_from_the_cache(app, monkeypatch):
+    session_id, agent = app
+
+    async def run():
+        speculator = speculate(monkeypatch, session_id, result_ttl=0.01)
+        await asyncio.sleep(0.1)
+        expired = speculator.stats()["wasted"]
+        return expired, await main.finalize_trip_endpoint(session_id)
+
+    expired, response = asyncio.run(run())
+    assert expired == 1
+    assert response["itinerary"] == "Day 1: Shibuya" and agent.calls == 1
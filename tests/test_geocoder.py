@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from backend.app.geocode_cache import GeocodeCache, Geocoder
+from backend.app.rate_limit import TokenBucket
+
+
+class RecordingClient:
+    def __init__(self):
+        self.queries = []
+
+    async def get_json(self, url, params=None):
+        self.queries.append(params["q"])
+        return [{"lat": "1.0", "lon": "2.0"}]
+
+
+def make_geocoder(rate=20.0):
+    client = RecordingClient()
+    return Geocoder(client, "http://nominatim.test", cache=GeocodeCache(path=None), rate_limiter=TokenBucket(rate)), client
+
+
+def test_interactive_lookup_goes_before_queued_background_lookups():
+    async def run():
+        geocoder, client = make_geocoder()
+        background = asyncio.ensure_future(geocoder.geocode_many([f"poi {n}" for n in range(8)], timeout=5))
+        await asyncio.sleep(0.01)
+        start = time.monotonic()
+        assert await geocoder.geocode("Lisbon") == {"latitude": 1.0, "longitude": 2.0}
+        waited = time.monotonic() - start
+        await background
+        return waited, client.queries
+
+    waited, queries = asyncio.run(run())
+    # One token interval at most, not eight
+    assert waited < 0.1
+    assert queries.index("lisbon") <= 2
+
+
+def test_queued_background_lookup_is_dropped_after_its_timeout():
+    async def run():
+        geocoder, client = make_geocoder(rate=2.0)
+        results = await geocoder.geocode_many(["a", "b", "c", "d"], timeout=0.6)
+        await asyncio.sleep(1.0)
+        return results, client.queries, geocoder.stats()
+
+    results, queries, stats = asyncio.run(run())
+    assert [result["status"] for result in results].count("timeout") == 2
+    # The dropped lookups never reached the upstream, even later
+    assert len(queries) == 2
+    assert stats["expired"] == 2 and stats["queued"] == 0
+
+
+def test_token_bucket_is_fifo_within_a_priority():
+    async def run():
+        bucket = TokenBucket(50.0)
+        order = []
+
+        async def take(name, priority):
+            await bucket.acquire(priority=priority)
+            order.append(name)
+
+        await asyncio.gather(take("a", 1), take("b", 1), take("c", 0), take("d", 1), take("e", 0))
+        return order
+
+    # "a" takes the initial token straight away
+    assert asyncio.run(run()) == ["a", "c", "e", "b", "d"]
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from backend.app.hedging import MIN_SAMPLES, Hedger
+
+
+def slow_history(hedger, model, seconds=1.0):
+    for _ in range(MIN_SAMPLES):
+        hedger.histogram(model).record(seconds)
+
+
+def test_degraded_mode_probes_the_primary():
+    async def run():
+        hedger = Hedger(fallback_model="small", latency_budget=0.05, probe_interval=60)
+        slow_history(hedger, "large")
+        models = []
+
+        async def call(model):
+            models.append(model)
+            return "ok"
+
+        for _ in range(5):
+            await hedger.run(call, "large")
+        return models, hedger.stats()
+
+    models, stats = asyncio.run(run())
+    assert models == ["large", "small", "small", "small", "small"]
+    assert stats["probes"] == 1 and stats["degraded"] == 4
+
+
+def test_old_samples_expire_so_a_recovered_primary_is_used_again():
+    async def run():
+        hedger = Hedger(fallback_model="small", latency_budget=0.05, probe_interval=60)
+        hedger._last_probe = time.monotonic()
+        slow_history(hedger, "large")
+        hedger.histogram("large").max_age = 0.05
+        models = []
+
+        async def call(model):
+            models.append(model)
+            return "ok"
+
+        await hedger.run(call, "large")
+        await asyncio.sleep(0.1)
+        await hedger.run(call, "large")
+        return models
+
+    assert asyncio.run(run()) == ["small", "large"]
+
+
+def test_cancelled_losers_are_not_recorded():
+    async def run():
+        hedger = Hedger(fallback_model="small")
+        for _ in range(MIN_SAMPLES):
+            hedger.histogram("large").record(0.01)
+
+        async def call(model):
+            await asyncio.sleep(10 if model == "large" else 0.01)
+            return model
+
+        result = await hedger.run(call, "large")
+        return result, len(hedger.histogram("large")), hedger.stats()
+
+    result, samples, stats = asyncio.run(run())
+    assert result == "small" and stats["hedges_won"] == 1
+    assert samples == MIN_SAMPLES
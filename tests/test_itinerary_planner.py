@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.app.itinerary_planner import DEFAULT_TRIP_DAYS, MAX_TRIP_DAYS, ItineraryPlanner, estimate_trip_days
+from backend.app.llm_cache import ResponseCache
+
+TRIP = {"name": "Lisbon", "dates": "3/10-3/12", "trip_style": "relaxed", "budget": "1500", "activities": ["food"]}
+OUTLINE = [{"day": 1, "title": "Alfama", "focus": "Old town"}, {"day": 2, "title": "Belem", "focus": "Riverside"},
+           {"day": 3, "title": "Sintra", "focus": "Day trip"}]
+
+
+@pytest.mark.parametrize("dates, days", [
+    ("3/10-3/16", 7),
+    ("3/10/2025 - 3/16/2025", 7),
+    ("12/28 to 1/3", 7),
+    ("12/30/25-1/2/26", 4),
+    ("2/28-3/1", 3),
+    ("5 days in May", 5),
+    ("4 nights", 5),
+    ("2 weeks", MAX_TRIP_DAYS),
+    ("1/1-3/1", MAX_TRIP_DAYS),
+    ("0 days", 1),
+    ("13/40-14/2", None),
+    ("sometime in spring", None),
+])
+def test_estimate_trip_days(dates, days):
+    assert estimate_trip_days(dates) == days
+
+
+class FakeComplete:
+    """Stands in for MistralAgent.run_command: skeleton answers in order, then one text per day."""
+
+    def __init__(self, skeletons, failing_days=()):
+        self.skeletons = list(skeletons)
+        self.failing_days = set(failing_days)
+        self.prompts = []
+
+    async def __call__(self, prompt, cache_key=None):
+        self.prompts.append(prompt)
+        if prompt.startswith("Outline"):
+            return self.skeletons.pop(0)
+        day = int(prompt.split("Write a detailed and descriptive schedule for Day ")[1].split()[0])
+        if day in self.failing_days:
+            raise RuntimeError("upstream error")
+        await asyncio.sleep(0.01 * (4 - day))
+        return f"Day {day}: {OUTLINE[day - 1]['title']}\n\n\nDetails"
+
+
+def test_days_are_joined_in_order_though_generated_concurrently():
+    complete = FakeComplete([json.dumps(OUTLINE)])
+    itinerary = asyncio.run(ItineraryPlanner(complete).plan(TRIP))
+    assert itinerary == "Day 1: Alfama\nDetails\n\nDay 2: Belem\nDetails\n\nDay 3: Sintra\nDetails"
+    assert "exactly 3 days" in complete.prompts[0]
+
+
+def test_unparseable_dates_ask_for_the_default_length():
+    complete = FakeComplete([json.dumps(OUTLINE)])
+    asyncio.run(ItineraryPlanner(complete).skeleton({**TRIP, "dates": "whenever"}))
+    assert f"exactly {DEFAULT_TRIP_DAYS} days" in complete.prompts[0]
+
+
+def test_invalid_skeleton_is_retried_and_the_valid_one_cached():
+    cache = ResponseCache()
+    complete = FakeComplete(["Sure! Here it is:", "[{\"day\": 1}]", "```json\n" + json.dumps(OUTLINE) + "\n```"])
+    planner = ItineraryPlanner(complete, cache=cache, retries=2)
+    assert asyncio.run(planner.skeleton(TRIP)) == OUTLINE
+    assert len(complete.prompts) == 3
+    # A retried finalize reuses the same outline without asking again
+    assert asyncio.run(planner.skeleton(TRIP)) == OUTLINE
+    assert len(complete.prompts) == 3
+
+
+def test_skeleton_gives_up_after_the_retries():
+    planner = ItineraryPlanner(FakeComplete(["no", "still no"]), retries=1)
+    with pytest.raises(ValueError):
+        asyncio.run(planner.skeleton(TRIP))
+
+
+def test_a_failed_day_falls_back_to_its_outline():
+    complete = FakeComplete([json.dumps(OUTLINE)], failing_days={2})
+    itinerary = asyncio.run(ItineraryPlanner(complete, retries=1).plan(TRIP))
+    assert "Day 2: Belem\nDetails for this day could not be generated. Riverside" in itinerary
+    assert itinerary.startswith("Day 1: Alfama") and itinerary.endswith("Day 3: Sintra\nDetails")
+    # The first call plus one retry for the failing day
+    assert sum("for Day 2 only" in prompt for prompt in complete.prompts) == 2
@@ -0,0 +1,29 @@
+from backend.app.llm_cache import _normalize_budget, recommendation_cache_key
+
+
+def test_budget_formats_share_a_key():
+    assert {_normalize_budget(budget) for budget in ("$1,500", "1500", "1 500.00", "1.5k", "about 1500 EUR")} == {"1500"}
+
+
+def test_budget_ranges_keep_both_ends():
+    assert _normalize_budget("1000-2000") == "1000-2000"
+    assert _normalize_budget("$1,000 to $2,000") == "1000-2000"
+    assert _normalize_budget("1000-2004") == "1000-2004"
+    assert _normalize_budget("10,002,000") == "10002000"
+
+
+def test_budgets_differing_in_any_digit_differ():
+    assert _normalize_budget("1234567") != _normalize_budget("1234568")
+    assert _normalize_budget("0.1") != _normalize_budget("0.10001")
+
+
+def test_unclear_budgets_fall_back_to_text():
+    assert _normalize_budget("1000 or 2000") == "1000 or 2000"
+    assert _normalize_budget("Cheap") == "cheap"
+
+
+def test_recommendation_key_ignores_users_and_order():
+    a = {"user": "ana", "location": "Lisbon", "budget": "1,500", "dates": "May", "mode": "Food"}
+    b = {"user": "ben", "location": "Tokyo", "budget": "1000-2000", "dates": "June", "mode": "culture"}
+    assert recommendation_cache_key([a, b]) == recommendation_cache_key([{**b, "user": "x"}, {**a, "budget": "1500"}])
+    assert recommendation_cache_key([a, b]) != recommendation_cache_key([a, {**b, "budget": "1000-2004"}])
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from backend.app.llm_scheduler import LLMScheduler, Priority
+
+
+class RetryableError(Exception):
+    status_code = 503
+
+
+def scheduler(**kwargs):
+    return LLMScheduler(requests_per_minute=60_000, tokens_per_minute=10_000_000, **kwargs)
+
+
+def test_concurrency_is_capped_and_interactive_goes_first():
+    async def run():
+        llm = scheduler(max_concurrency=1)
+        order = []
+
+        def call(name):
+            async def request():
+                order.append(name)
+                await asyncio.sleep(0.01)
+                return name
+            return request
+
+        first = asyncio.ensure_future(llm.submit(call("first"), Priority.BULK))
+        await asyncio.sleep(0)
+        bulk = asyncio.ensure_future(llm.submit(call("bulk"), Priority.BULK))
+        interactive = asyncio.ensure_future(llm.submit(call("interactive"), Priority.INTERACTIVE))
+        await asyncio.gather(first, bulk, interactive)
+        return order, llm.stats()
+
+    order, stats = asyncio.run(run())
+    assert order == ["first", "interactive", "bulk"]
+    assert stats["completed"] == 3 and stats["in_flight"] == 0
+
+
+def test_retryable_errors_are_retried(monkeypatch):
+    async def run():
+        llm = scheduler(max_retries=2)
+        monkeypatch.setattr(llm, "backoff_delay", lambda attempt, error=None: 0)
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RetryableError()
+            return "ok"
+
+        return await llm.submit(flaky), len(attempts), llm.stats()
+
+    result, attempts, stats = asyncio.run(run())
+    assert (result, attempts, stats["retries"]) == ("ok", 3, 2)
+
+
+def test_queued_request_times_out():
+    async def run():
+        llm = scheduler(max_concurrency=1)
+        blocker = asyncio.ensure_future(llm.submit(lambda: asyncio.sleep(0.2)))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await llm.submit(lambda: asyncio.sleep(0), timeout=0.05)
+        await blocker
+        return llm.stats()
+
+    stats = asyncio.run(run())
+    assert stats["timeouts"] == 1 and stats["in_flight"] == 0
+
+
+class Events:
+    def __init__(self, count):
+        self.items = iter(range(count))
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(0.01)
+        try:
+            return next(self.items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+
+def test_stream_holds_its_slot_until_read_to_the_end():
+    async def run():
+        llm = scheduler(max_concurrency=1)
+        events = Events(3)
+
+        async def open_stream():
+            return events
+
+        stream = llm.stream(open_stream)
+        first = await anext(stream)
+        in_flight_while_reading = llm.stats()["in_flight"]
+        waiting = asyncio.ensure_future(llm.submit(lambda: asyncio.sleep(0, "next")))
+        await asyncio.sleep(0.02)
+        blocked = not waiting.done()
+        rest = [item async for item in stream]
+        return first, rest, in_flight_while_reading, blocked, await waiting, events.closed
+
+    first, rest, in_flight, blocked, next_result, closed = asyncio.run(run())
+    assert (first, rest) == (0, [1, 2])
+    assert in_flight == 1 and blocked and next_result == "next" and closed
+
+
+def test_closing_a_stream_early_frees_its_slot():
+    async def run():
+        llm = scheduler(max_concurrency=1)
+        events = Events(100)
+
+        async def open_stream():
+            return events
+
+        stream = llm.stream(open_stream)
+        await anext(stream)
+        await stream.aclose()
+        return llm.stats()["in_flight"], events.closed
+
+    assert asyncio.run(run()) == (0, True)
@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from backend.app.agent import MISTRAL_MODEL, MistralAgent
+from backend.app.llm_cache import ResponseCache
+from backend.app.llm_scheduler import Priority
+from backend.app.metrics import LLM_REQUEST_SECONDS, Registry
+
+
+def test_registry_renders_the_prometheus_text_format():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    requests.inc('/a"b')
+    requests.inc('/a"b', amount=2)
+    registry.gauge("in_flight", "In flight").set(3)
+    latency = registry.histogram("latency_seconds", "Latency", ("kind",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, "x")
+
+    lines = registry.render().splitlines()
+    assert lines[:3] == ["# HELP requests_total Requests", "# TYPE requests_total counter",
+                         'requests_total{route="/a\\"b"} 3']
+    assert "in_flight 3" in lines
+    assert lines[-5:] == [
+        'latency_seconds_bucket{kind="x",le="0.1"} 1',
+        'latency_seconds_bucket{kind="x",le="1.0"} 2',
+        'latency_seconds_bucket{kind="x",le="+Inf"} 3',
+        'latency_seconds_sum{kind="x"} 5.55',
+        'latency_seconds_count{kind="x"} 3',
+    ]
+
+
+def test_stats_become_gauges_and_a_failing_component_is_skipped():
+    registry = Registry()
+    registry.stats("cache", "Cache", lambda: {"hits": 4, "hit_rate": 0.5, "enabled": True, "name": "lru"})
+
+    def broken():
+        raise RuntimeError("closed")
+
+    registry.stats("store", "Store", broken)
+    lines = registry.render().splitlines()
+    assert "cache_hits 4" in lines and "cache_hit_rate 0.5" in lines
+    assert not any(line.startswith(("cache_enabled", "cache_name", "store")) for line in lines)
+
+
+class FakeScheduler:
+    def __init__(self, error=None):
+        self.error = error
+
+    async def submit(self, call, priority, tokens):
+        await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))], usage=None)
+
+
+def completed_calls() -> int:
+    series = LLM_REQUEST_SECONDS._values.get((MISTRAL_MODEL, "complete"))
+    return sum(series[:-1]) if series else 0
+
+
+def test_llm_latency_is_recorded_for_completed_calls_only():
+    messages = [{"role": "user", "content": "hi"}]
+
+    async def run(scheduler, cancel=False):
+        agent = MistralAgent(cache=ResponseCache(), scheduler=scheduler, hedger=None)
+        task = asyncio.ensure_future(agent._complete(messages, Priority.INTERACTIVE))
+        if cancel:
+            await asyncio.sleep(0)
+            task.cancel()
+        return await task
+
+    before = completed_calls()
+    assert asyncio.run(run(FakeScheduler())) == "ok"
+    assert completed_calls() == before + 1
+    with pytest.raises(RuntimeError):
+        asyncio.run(run(FakeScheduler(RuntimeError("503"))))
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run(FakeScheduler(), cancel=True))
+    assert completed_calls() == before + 1
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from backend.app.places_index import OverpassError, PlacesIndex, TILE_DEGREES
+
+
+class OverpassStub:
+    def __init__(self, data):
+        self.data = data
+        self.timeouts = []
+
+    async def get_json(self, url, params=None, timeout=None):
+        self.timeouts.append(timeout)
+        return self.data
+
+
+def element(lat, lon, name):
+    return {"lat": lat, "lon": lon, "tags": {"name": name, "tourism": "museum"}}
+
+
+def test_truncated_tile_is_a_failure_and_not_saved(tmp_path):
+    client = OverpassStub({"remark": "runtime error: Query timed out", "elements": [element(38.71, -9.14, "Half")]})
+    index = PlacesIndex(client, "http://overpass.test", directory=str(tmp_path))
+    with pytest.raises(OverpassError):
+        asyncio.run(index.ensure_area(38.71, -9.14, 1.0))
+    assert len(index) == 0 and not list(tmp_path.iterdir())
+    assert index.stats()["tiles_failed"] >= 1
+    # The read timeout outlasts the query's own [timeout:60]
+    assert all(timeout > 60 for timeout in client.timeouts)
+
+
+def test_least_recently_used_tiles_are_evicted():
+    index = PlacesIndex(None, "http://overpass.test", directory=None, max_tiles=4)
+    for n in range(4):
+        index._add_tile((n, 0), [[n * TILE_DEGREES + 0.1, 0.1, "tourism=museum", f"Museum {n}"]])
+    index.load_area(0.1, 0.1, 0.5)  # Touches tile (0, 0)
+    index._add_tile((9, 0), [[9 * TILE_DEGREES + 0.1, 0.1, "tourism=museum", "Museum 9"]])
+    assert sorted(index._tiles) == [(0, 0), (3, 0), (9, 0)]
+    assert sorted(index.names) == ["Museum 0", "Museum 3", "Museum 9"]
+    assert index.find("Museum 3", 3 * TILE_DEGREES + 0.1, 0.1)["name"] == "Museum 3"
+    assert index.nearby(0.1, 0.1, 1.0)[0]["name"] == "Museum 0"
+    assert index.stats()["tiles_evicted"] == 2
@@ -0,0 +1,62 @@
+import asyncio
+
+from backend.app.poi_resolver import PoiResolver
+
+LISBON = [38.72, -9.14]
+
+
+class FakeGeocoder:
+    """Knows a few places; everything else is not found."""
+
+    def __init__(self, places):
+        self.places = places
+        self.queries = []
+
+    async def geocode_many(self, queries, timeout=None):
+        self.queries.extend(queries)
+        await asyncio.sleep(0.01)
+        return [{"status": "ok", "latitude": self.places[query][0], "longitude": self.places[query][1]}
+                if query in self.places else {"status": "not_found"} for query in queries]
+
+
+def test_points_are_returned_at_once_and_resolved_in_the_background():
+    async def run():
+        geocoder = FakeGeocoder({
+            "Belem Tower, Lisbon": (38.69, -9.22),
+            # Same name, another continent: not the place the model meant
+            "Praca do Comercio, Lisbon": (-22.9, -43.2),
+        })
+        resolver = PoiResolver(geocoder)
+        finished = []
+
+        async def listener(job_id, job):
+            finished.append((job_id, job["status"]))
+
+        resolver.listeners.append(listener)
+        points, job_id = resolver.start([
+            {"name": "Belem Tower", "latitude": 0.0, "longitude": 0.0},
+            {"name": "Praca do Comercio", "latitude": 38.71, "longitude": -9.14},
+            {"name": "Nowhere", "latitude": 0.0, "longitude": 0.0},
+            "not a point",
+        ], "Lisbon", LISBON)
+        pending = resolver.job(job_id)
+        await asyncio.sleep(0.05)
+        return points, job_id, pending, resolver.job(job_id), finished, resolver.stats()
+
+    points, job_id, pending, job, finished, stats = asyncio.run(run())
+    assert [point["name"] for point in points] == ["Belem Tower", "Praca do Comercio", "Nowhere"]
+    assert pending["status"] == "pending"
+    assert job["status"] == "done" and finished == [(job_id, "done")]
+    belem, praca, nowhere = job["points_of_interest"]
+    assert belem == {"name": "Belem Tower", "latitude": 38.69, "longitude": -9.22, "verified": True}
+    # The model's own coordinates are kept when the geocode is too far away...
+    assert praca == {"name": "Praca do Comercio", "latitude": 38.71, "longitude": -9.14, "verified": False}
+    # ...and 0/0 placeholders are cleared
+    assert nowhere == {"name": "Nowhere", "latitude": None, "longitude": None, "verified": False}
+    assert stats == {"jobs_started": 1, "jobs_pending": 0, "points_geocoded": 1, "points_unresolved": 2}
+
+
+def test_nothing_to_resolve_starts_no_job():
+    resolver = PoiResolver(FakeGeocoder({}))
+    assert resolver.start([], "Lisbon", LISBON) == ([], None)
+    assert resolver.stats()["jobs_started"] == 0
@@ -0,0 +1,28 @@
+from backend.app.prompt_builder import aggregate_preferences, preference_summary
+
+
+def preference(user, location, budget, dates="May", mode="relaxing"):
+    return {"user": user, "location": location, "budget": budget, "dates": dates, "mode": mode}
+
+
+def test_budget_ranges_are_parsed_per_number():
+    summary = preference_summary([preference("ana", "Lisbon", "1000-2000"), preference("ben", "lisbon", "about 1500 EUR")])
+    assert "budget 1,000-2,000" in summary
+    assert "10,002,000" not in summary
+
+
+def test_unclear_budgets_are_passed_on_as_written():
+    summary = preference_summary([preference("ana", "Lisbon", "1,200"), preference("ben", "Lisbon", "1000 or 2000")])
+    assert "budget 1,200" in summary
+    assert "budget as stated: 1000 or 2000" in summary
+
+
+def test_near_duplicate_locations_are_grouped():
+    groups = aggregate_preferences([
+        preference("ana", "Barcelona", "900"),
+        preference("ben", "barcelonna", "1200"),
+        preference("cy", "Barcelona, Spain", "1000"),
+        preference("dee", "Tokyo", "3000"),
+    ])
+    assert [(group.location, group.count) for group in groups] == [("Barcelona", 3), ("Tokyo", 1)]
+    assert (groups[0].budget_low, groups[0].budget_high) == (900, 1200)
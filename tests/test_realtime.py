@@ -0,0 +1,52 @@
+import asyncio
+
+from backend.app.realtime import SessionBroadcaster, session_room
+
+
+class FakeServer:
+    def __init__(self, fail=False):
+        self.emitted = []
+        self.fail = fail
+
+    async def emit(self, event, data, room=None):
+        if self.fail:
+            raise ConnectionError("message queue down")
+        self.emitted.append((event, data, room))
+
+
+def test_a_burst_of_votes_is_one_event_per_room():
+    async def run():
+        sio = FakeServer()
+        broadcaster = SessionBroadcaster(sio, window=0.02)
+        for count in range(1, 6):
+            broadcaster.vote(1, 0, count)
+        broadcaster.vote(1, 2, 1)
+        broadcaster.vote(2, 1, 3)
+        await broadcaster.emit("preference", 1, {"user": "ana"})
+        await asyncio.sleep(0.05)
+        return sio.emitted, broadcaster.stats()
+
+    emitted, stats = asyncio.run(run())
+    assert emitted[0] == ("preference", {"session_id": 1, "user": "ana"}, session_room(1))
+    assert sorted(emitted[1:], key=lambda event: event[2]) == [
+        ("votes", {"session_id": 1, "votes": {0: 5, 2: 1}}, session_room(1)),
+        ("votes", {"session_id": 2, "votes": {1: 3}}, session_room(2)),
+    ]
+    assert stats == {"votes_received": 7, "vote_events": 2, "events": 3, "pending_sessions": 0}
+
+
+def test_failed_broadcasts_are_logged_not_raised(capsys):
+    async def run():
+        broadcaster = SessionBroadcaster(FakeServer(fail=True), window=0.01)
+        broadcaster.vote(1, 0, 1)
+        await asyncio.sleep(0.03)
+        return broadcaster.stats()
+
+    assert asyncio.run(run())["pending_sessions"] == 0
+    assert "Error broadcasting votes" in capsys.readouterr().out
+
+
+def test_votes_outside_an_event_loop_are_dropped():
+    broadcaster = SessionBroadcaster(FakeServer())
+    broadcaster.vote(1, 0, 1)
+    assert broadcaster.stats()["pending_sessions"] == 0
@@ -0,0 +1,139 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from backend.app.session_store import SessionStore
+
+TRIPS = [{"name": "Lisbon"}, {"name": "Tokyo"}, {"name": "Nairobi"}]
+
+
+def preference(user, location="Lisbon"):
+    return {"user": user, "location": location, "budget": "1500", "dates": "May", "mode": "food"}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "sessions.sqlite3")
+
+
+def test_state_survives_a_restart(path):
+    store = SessionStore(path)
+    session_id = store.create_session("web")
+    store.add_preference("web", session_id, preference("ana"))
+    store.set_trips("web", session_id, TRIPS)
+    store.cast_votes("web", session_id, [("ana", 1), ("ben", 1), ("cy", 2), ("ana", 2)])
+    store.close()
+
+    reopened = SessionStore(path)
+    assert reopened.preferences("web", session_id) == [preference("ana")]
+    assert reopened.trips("web", session_id) == TRIPS
+    assert reopened.tallies("web", session_id) == [0, 1, 2]
+    assert reopened.create_session("web") == session_id + 1
+
+
+def test_shared_and_cached_stores_agree(path):
+    cached = SessionStore(path)
+    shared = SessionStore(path, shared=True)
+    session_id = cached.create_session("web")
+    cached.set_trips("web", session_id, TRIPS)
+    cached.flush()
+    changed = shared.cast_votes("web", session_id, [("ana", 0), ("ben", 0), ("ana", 1)])
+    assert changed == {0: 1, 1: 1}
+    assert shared.tallies("web", session_id) == [1, 1, 0]
+    assert cached.cast_votes("web", session_id, [("cy", 0)]) == {0: 1}
+
+
+def test_evicted_sessions_reload_from_disk(path):
+    store = SessionStore(path, max_sessions=1)
+    first = store.create_session("web")
+    store.add_preference("web", first, preference("ana"))
+    second = store.create_session("web")
+    store.add_preference("web", second, preference("ben"))
+    assert store.stats()["evictions"] >= 1
+    assert store.preferences("web", first) == [preference("ana")]
+    assert store.stats()["loads"] >= 1
+
+
+class LockedConnection:
+    """Forwards to a real connection, failing the first ``failures`` BEGINs like a locked database."""
+
+    def __init__(self, db, failures):
+        self.db = db
+        self.failures = failures
+
+    def execute(self, sql, *params):
+        if sql == "BEGIN" and self.failures:
+            self.failures -= 1
+            self.db.execute("BEGIN")
+            raise sqlite3.OperationalError("database is locked")
+        return self.db.execute(sql, *params)
+
+    def __enter__(self):
+        return self.db.__enter__()
+
+    def __exit__(self, *exc):
+        return self.db.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def test_failed_flush_keeps_the_batch_and_retries(path):
+    async def run():
+        store = SessionStore(path, flush_interval=0.01)
+        session_id = store.create_session("web")
+        store.flush()
+        store._db = LockedConnection(store._db, failures=1)
+        store.add_preference("web", session_id, preference("ana"))
+        await asyncio.sleep(0.05)
+        stats = store.stats()
+        store._db = store._db.db
+        store.close()
+        return session_id, stats
+
+    session_id, stats = asyncio.run(run())
+    assert stats["flush_failures"] == 1 and stats["pending_writes"] == 0
+    assert SessionStore(path).preferences("web", session_id) == [preference("ana")]
+
+
+def test_link_cache_is_bounded(path):
+    store = SessionStore(path, max_sessions=2)
+    for guild in range(5):
+        store.link("discord", guild, "web", 1)
+    assert len(store._links) == 2
+    assert store.resolve("discord", 0) == ("web", 1)
+    assert store.resolve("discord", 99) == ("discord", 99)
+
+
+def test_create_session_skips_ids_already_written_to(path):
+    store = SessionStore(path)
+    assert store.create_session("web") == 1
+    store.add_preference("web", 2, preference("ana"))
+    assert store.create_session("web") == 3
+    assert store.exists("web", 3) and not store.exists("web", 4)
+
+    memory = SessionStore(path=None)
+    memory.add_preference("web", 1, preference("ben"))
+    assert memory.create_session("web") == 2
+
+
+def test_memory_gauge_tracks_cached_sessions_only(path):
+    cached = SessionStore(path, ttl=0.05)
+    session_id = cached.create_session("web")
+    for user in range(50):
+        cached.add_preference("web", session_id, preference(f"user{user}"))
+    full = cached.stats()["approx_bytes"]
+    cached.clear_preferences("web", session_id)
+    assert 0 < cached.stats()["approx_bytes"] < full / 10
+    time.sleep(0.1)
+    cached.evict_idle()
+    assert cached.stats()["live_sessions"] == 0 and cached.stats()["approx_bytes"] == 0
+
+    shared = SessionStore(path, shared=True)
+    for user in range(50):
+        shared.add_preference("web", session_id, preference(f"user{user}"))
+    shared.set_trips("web", session_id, TRIPS)
+    shared.clear_preferences("web", session_id)
+    assert shared.stats()["live_sessions"] == 0 and shared.stats()["approx_bytes"] == 0
@@ -0,0 +1,48 @@
+from backend.app.similarity_cache import SimilarityCache
+
+TRIPS = [{"name": "Beach week", "dates": "April 10-16", "trip_style": "relax", "budget": "1500", "activities": ["swim"]}]
+
+
+def preference(location, budget="1500", dates="April", mode="relaxation", user="ana"):
+    return {"user": user, "location": location, "budget": budget, "dates": dates, "mode": mode}
+
+
+def cache_with(preferences):
+    cache = SimilarityCache(max_entries=8)
+    cache.add(preferences, TRIPS, 2.0)
+    return cache
+
+
+def test_near_identical_preferences_are_served():
+    cache = cache_with([preference("Hawaii")])
+    match = cache.lookup([preference("hawaii", budget="1,600", dates="Apr", mode="relaxing")])
+    assert match.serve and match.trips == TRIPS
+    assert cache.stats()["latency_saved_seconds"] == 2.0
+
+
+def test_same_city_name_in_another_region_is_never_served():
+    for stored, asked in (("Paris, Texas", "Paris, France"), ("Portland, Oregon", "Portland, Maine")):
+        match = cache_with([preference(stored)]).lookup([preference(asked)])
+        assert match is None or not match.serve
+
+
+def test_other_month_only_seeds_a_refinement():
+    match = cache_with([preference("Hawaii")]).lookup([preference("Hawaii", dates="May")])
+    assert match is not None and not match.serve
+
+
+def test_extra_destination_only_seeds_a_refinement():
+    group = [preference("Hawaii", user=f"user{n}") for n in range(4)] + [preference("Tokyo", user="kenji")]
+    match = cache_with([preference("Hawaii")]).lookup(group)
+    assert match is not None and not match.serve
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SimilarityCache(max_entries=2)
+    cache.add([preference("Lisbon")], TRIPS, 1.0)
+    cache.add([preference("Tokyo")], TRIPS, 1.0)
+    assert cache.lookup([preference("Lisbon")]).serve
+    cache.add([preference("Nairobi")], TRIPS, 1.0)
+    assert cache.lookup([preference("Tokyo")]) is None
+    assert cache.lookup([preference("Lisbon")]).serve
+    assert cache.stats()["evictions"] == 1
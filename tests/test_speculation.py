@@ -0,0 +1,56 @@
+import asyncio
+
+from backend.app.session_store import SessionStore
+from backend.app.speculation import Speculator
+from backend.app.vote_engine import Leaderboard
+
+TRIPS = [{"name": "Lisbon"}, {"name": "Tokyo"}]
+
+
+def leading(index, margin=3):
+    board = Leaderboard(len(TRIPS))
+    for _ in range(margin):
+        board.increment(index)
+    return board
+
+
+async def generate(trip):
+    return f"itinerary for {trip['name']}"
+
+
+def test_finished_speculation_is_claimed():
+    async def run():
+        speculator = Speculator(generate, margin=2)
+        speculator.observe("s", leading(1), TRIPS)
+        return await speculator.claim("s", 1), speculator.stats()
+
+    result, stats = asyncio.run(run())
+    assert result == "itinerary for Tokyo"
+    assert stats["used"] == 1 and stats["wasted"] == 0
+
+
+def test_unclaimed_result_expires_and_counts_as_wasted():
+    async def run():
+        speculator = Speculator(generate, margin=2, result_ttl=0.05)
+        speculator.observe("s", leading(0), TRIPS)
+        await asyncio.sleep(0.1)
+        return await speculator.claim("s", 0), speculator.stats(), speculator._speculations
+
+    result, stats, held = asyncio.run(run())
+    assert result is None and not held
+    assert stats["completed"] == 1 and stats["wasted"] == 1
+
+
+def test_session_eviction_drops_its_speculation():
+    async def run():
+        store = SessionStore(path=None, max_sessions=1)
+        speculator = Speculator(generate, margin=2)
+        store.eviction_listeners.append(speculator.reset)
+        store.set_trips("web", 1, TRIPS)
+        speculator.observe(("web", 1), leading(0), TRIPS)
+        await asyncio.sleep(0)
+        store.set_trips("web", 2, TRIPS)
+        return speculator._speculations, speculator.stats()
+
+    held, stats = asyncio.run(run())
+    assert not held and stats["wasted"] + stats["cancelled"] == 1
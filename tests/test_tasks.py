@@ -0,0 +1,51 @@
+import asyncio
+
+from backend.app.tasks import BackgroundTasks, Coalescer
+
+
+def test_concurrent_callers_share_one_task_and_survive_a_cancelled_one():
+    async def run():
+        inflight = Coalescer()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+
+        first = asyncio.ensure_future(inflight.run("key", fetch))
+        second = asyncio.ensure_future(inflight.run("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        result = await second
+        await asyncio.sleep(0)
+        return calls, result, first.cancelled(), len(inflight)
+
+    calls, result, cancelled, pending = asyncio.run(run())
+    assert calls == [1] and result == "value"
+    assert cancelled and pending == 0
+
+
+def test_finished_keys_start_a_new_task():
+    async def run():
+        inflight = Coalescer()
+        counter = iter(range(10))
+
+        async def fetch():
+            return next(counter)
+
+        return [await inflight.run("key", fetch), await inflight.run("key", fetch)]
+
+    assert asyncio.run(run()) == [0, 1]
+
+
+def test_background_tasks_are_held_until_done():
+    async def run():
+        tasks = BackgroundTasks()
+        task = tasks.spawn(asyncio.sleep(0.01))
+        held = len(tasks)
+        await task
+        await asyncio.sleep(0)
+        return held, len(tasks)
+
+    assert asyncio.run(run()) == (1, 0)
@@ -0,0 +1,45 @@
+import json
+
+from backend.app.trip_stream import TripStreamParser, parse_trips
+
+
+def trip(name, **fields):
+    return {"name": name, "dates": "May 1-7", "trip_style": "relaxed", "budget": "$1,500",
+            "activities": ["walk {the} [old] town", 'say "hi"'], **fields}
+
+
+TRIPS = [trip("Lisbon"), trip("Tokyo", notes="braces } and \\\" escapes")]
+
+
+def test_trips_are_emitted_as_their_objects_close_whatever_the_chunking():
+    text = "Here are some trips:\n```json\n" + json.dumps(TRIPS, indent=2) + "\n```"
+    for size in (1, 3, 17, len(text)):
+        parser = TripStreamParser()
+        emitted = []
+        for start in range(0, len(text), size):
+            emitted.extend(parser.feed(text[start:start + size]))
+        assert emitted == TRIPS
+        assert parser.trips == TRIPS and parser.rejected == []
+
+
+def test_a_trip_is_emitted_before_the_array_ends():
+    parser = TripStreamParser()
+    text = json.dumps(TRIPS)
+    first_end = text.index("}, {") + 1
+    assert parser.feed(text[:first_end]) == [TRIPS[0]]
+    assert parser.feed(text[first_end:]) == [TRIPS[1]]
+
+
+def test_wrapped_list_and_invalid_trips():
+    bad = {"name": "Nowhere", "dates": "June", "trip_style": "any", "budget": "0", "activities": "none"}
+    missing = {"name": "Half"}
+    text = json.dumps({"trips": [TRIPS[0], bad, missing, TRIPS[1]], "note": "{not a trip}"})
+    trips, rejected = parse_trips(text)
+    assert trips == TRIPS
+    assert rejected == ["'activities' field must be a list.", "Missing required field 'dates' in trip data."]
+
+
+def test_unparseable_objects_are_rejected():
+    trips, rejected = parse_trips('[{"name": "Lisbon",}, ' + json.dumps(TRIPS[1]) + "]")
+    assert trips == [TRIPS[1]]
+    assert len(rejected) == 1 and rejected[0].startswith("Invalid JSON for a trip")
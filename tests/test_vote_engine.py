@@ -0,0 +1,78 @@
+import random
+
+import pytest
+from pydantic import ValidationError
+
+from backend.app.main import Vote
+from backend.app.vote_engine import BallotBox, Leaderboard
+
+
+def assert_consistent(board: Leaderboard):
+    counts = [count for _, count in board.ranking()]
+    assert counts == sorted(counts, reverse=True)
+    assert sorted(board.order) == list(range(len(board)))
+    for position, index in enumerate(board.order):
+        assert board.position[index] == position
+
+
+def test_random_votes_keep_the_ranking_sorted():
+    rng = random.Random(7)
+    board = Leaderboard(6)
+    expected = [0] * 6
+    for _ in range(2000):
+        index = rng.randrange(6)
+        if expected[index] and rng.random() < 0.45:
+            expected[index] -= 1
+            assert board.decrement(index) == expected[index]
+        else:
+            expected[index] += 1
+            assert board.increment(index) == expected[index]
+        assert_consistent(board)
+        assert board.counts == expected
+        top = max(expected)
+        leader, votes = board.leader()
+        assert votes == top and (leader is None) == (top == 0)
+        assert board.margin() == top - sorted(expected)[-2]
+
+
+def test_ties_are_broken_by_the_last_move():
+    board = Leaderboard(3, [1, 1, 0])
+    assert board.order == [0, 1, 2]
+    # Gaining a vote ranks behind the trips already at the new count...
+    board.increment(2)
+    assert board.order == [0, 1, 2]
+    # ...losing one ranks ahead of them
+    board.increment(0)
+    board.decrement(0)
+    assert board.order == [0, 1, 2]
+    board.increment(1)
+    board.decrement(1)
+    assert board.order == [1, 0, 2]
+
+
+def test_no_votes_to_remove():
+    board = Leaderboard(2)
+    assert board.leader() == (None, 0)
+    with pytest.raises(ValueError):
+        board.decrement(0)
+
+
+def test_voting_again_moves_the_ballot():
+    box = BallotBox(3)
+    assert box.cast("ana", 0) == {0: 1}
+    assert box.cast("ben", 0) == {0: 2}
+    assert box.cast("ana", 0) == {}
+    assert box.cast("ana", 2) == {0: 1, 2: 1}
+    assert box.board.counts == [1, 0, 1]
+    with pytest.raises(ValueError):
+        box.cast("cy", 3)
+
+    reloaded = BallotBox(3, box.ballots)
+    assert reloaded.board.counts == [1, 0, 1]
+
+
+def test_a_vote_must_name_a_trip():
+    assert Vote(session_id=1, user="ana", trip_name="Lisbon").trip_index is None
+    assert Vote(session_id=1, user="ana", trip_index=0).trip_index == 0
+    with pytest.raises(ValidationError):
+        Vote(session_id=1, user="ana")
@@ -0,0 +1,71 @@
+import asyncio
+
+import httpx
+
+from backend.app.rate_limit import TokenBucket
+from backend.app.weather_cache import WeatherService
+
+
+class FakeClient:
+    """Answers with the requested point; ``failures`` maps a latitude to the exception it raises."""
+
+    def __init__(self, failures=None):
+        self.requests = []
+        self.failures = failures or {}
+
+    async def get_json(self, url, params=None):
+        self.requests.append((params["lat"], params["lon"]))
+        await asyncio.sleep(0.01)
+        failure = self.failures.get(params["lat"])
+        if failure is not None:
+            raise failure
+        return {"lat": params["lat"], "lon": params["lon"]}
+
+
+def service(client, **kwargs):
+    return WeatherService(client, "http://weather.test", "key", cell_degrees=1.0,
+                          rate_limiter=TokenBucket(1000, capacity=1000), **kwargs)
+
+
+def test_points_in_one_cell_share_one_request():
+    async def run():
+        client = FakeClient()
+        weather = service(client)
+        results = await asyncio.gather(
+            weather.current_many([(10.1, 20.1), (10.9, 20.9), (11.5, 20.5)]),
+            weather.current(10.5, 20.5),
+        )
+        return results, client.requests, weather.stats()
+
+    (many, single), requests, stats = asyncio.run(run())
+    # Every point gets its cell centre's weather
+    assert many == [{"lat": 10.5, "lon": 20.5}, {"lat": 10.5, "lon": 20.5}, {"lat": 11.5, "lon": 20.5}]
+    assert single == many[0]
+    assert sorted(requests) == [(10.5, 20.5), (11.5, 20.5)]
+    assert stats["cells"] == 2
+
+
+def test_cells_are_refetched_after_the_ttl():
+    async def run():
+        client = FakeClient()
+        weather = service(client, ttl=0.05)
+        await weather.current(10.5, 20.5)
+        await weather.current(10.5, 20.5)
+        fresh = len(client.requests)
+        await asyncio.sleep(0.1)
+        await weather.current(10.5, 20.5)
+        return fresh, len(client.requests), weather.stats()
+
+    fresh, total, stats = asyncio.run(run())
+    assert (fresh, total) == (1, 2)
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+
+def test_failed_and_cancelled_cells_become_errors():
+    async def run():
+        client = FakeClient({10.5: httpx.ConnectError("down"), 11.5: asyncio.CancelledError()})
+        return await service(client).current_many([(10.5, 20.5), (11.5, 20.5), (12.5, 20.5)])
+
+    results = asyncio.run(run())
+    assert results == [{"error": "Error fetching weather data"}, {"error": "Error fetching weather data"},
+                       {"lat": 12.5, "lon": 20.5}]